@@ -0,0 +1,216 @@
+"""Asyncio client for the Mail API: watch many addresses in one process.
+
+Mirrors MailClient's create_address/list_messages/fetch_message over a pooled
+aiohttp session, fetches new bodies concurrently and hands save_mail to a
+worker thread so disk I/O never blocks the event loop.
+
+Usage:
+    python AsyncMailClient.py --service guerrillamail --count 5
+    python AsyncMailClient.py --watch EMAIL:SERVICE:TOKEN --watch ...
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import aiohttp
+
+from MailClient import API_BASE, ensure_dir, save_mail
+from MailService import lifecycle
+
+
+class AsyncMailClient:
+    """Async counterpart of the MailClient functions sharing one connection pool.
+
+    Requests shed by the gateway (429) are retried up to max_retries times,
+    after sleeping for the Retry-After the gateway sent.
+    """
+
+    def __init__(self, base_url: str = API_BASE, max_connections: int = 32, timeout: float = 20,
+                 client_id: Optional[str] = None, max_retries: int = 3):
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.client_id = client_id or os.environ.get("MAIL_CLIENT_ID") or f"asyncmailclient-{os.getpid()}"
+        self.max_retries = max_retries
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            # Let the gateway give up (and free upstream work) just before we do
+            headers = {
+                "X-Request-Timeout": str(max(self.timeout.total - 1, 1)),
+                "X-Client-Id": self.client_id,
+            }
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, headers=headers)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, method: str, path: str, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            async with self._session.request(method, f"{self.base_url}{path}", **kwargs) as r:
+                if r.status == 429 and attempt < self.max_retries:
+                    delay = retry_after(r.headers.get("Retry-After"))
+                else:
+                    r.raise_for_status()
+                    return await r.json()
+            await asyncio.sleep(delay)
+
+    async def _get(self, path: str, params: Optional[Dict] = None):
+        return await self._request("GET", path, params=params)
+
+    async def list_services(self):
+        return await self._get("/services")
+
+    async def create_address(self, service: str, domain: str | None = None):
+        payload = {"service": service}
+        if domain:
+            payload["domain"] = domain
+        return await self._request("POST", "/address", json=payload)
+
+    async def list_messages(self, service: str, token: str):
+        return await self._get("/messages", {"service": service, "token": token})
+
+    async def fetch_message(self, service: str, token: str, message_id: str):
+        return await self._get(f"/messages/{message_id}", {"service": service, "token": token})
+
+
+def retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Seconds to wait from a Retry-After header (the gateway sends whole seconds)"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class MailWatcher:
+    """Polls many addresses concurrently and archives new mails."""
+
+    def __init__(self, client: AsyncMailClient, base_dir: str, interval: float = 5,
+                 max_concurrent_fetches: int = 8, on_mail: Optional[Callable[[str, Dict, str], None]] = None):
+        self.client = client
+        self.base_dir = base_dir
+        self.interval = interval
+        self.on_mail = on_mail or print_mail
+        self._fetch_slots = asyncio.Semaphore(max_concurrent_fetches)
+        self.seen: Dict[str, set] = {}
+        self.expiry = lifecycle.index()
+
+    async def _fetch_and_save(self, email: str, service: str, token: str, mid: str):
+        async with self._fetch_slots:
+            full = await self.client.fetch_message(service, token, mid)
+        body = full.get("mail_body", "")
+        meta = {
+            "subject": full.get("subject"),
+            "from": full.get("mail_from"),
+            "service": service,
+            "received_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        await asyncio.to_thread(save_mail, self.base_dir, email, mid, meta, body)
+        # Only mark as seen once archived, so failed fetches are retried next poll
+        self.seen[email].add(mid)
+        self.on_mail(email, meta, body)
+
+    async def poll_once(self, email: str, service: str, token: str) -> int:
+        """Fetch and archive unseen messages of one address; returns how many"""
+        seen = self.seen.setdefault(email, set())
+        msgs = await self.client.list_messages(service, token) or []
+        new_ids = [str(m.get("mail_id")) for m in msgs if str(m.get("mail_id")) not in seen]
+        results = await asyncio.gather(
+            *(self._fetch_and_save(email, service, token, mid) for mid in new_ids),
+            return_exceptions=True,
+        )
+        for mid, res in zip(new_ids, results):
+            if isinstance(res, Exception):
+                print(f"Fetch failed for {email}/{mid}: {res}")
+        return len(new_ids)
+
+    async def watch(self, email: str, service: str, token: str):
+        """Poll one address until it expires"""
+        if email not in self.expiry:
+            self.expiry.track(email, service)
+        while not self.expiry.is_expired(email):
+            started = time.monotonic()
+            try:
+                await self.poll_once(email, service, token)
+            except aiohttp.ClientResponseError as ex:
+                if ex.status == 410:
+                    break
+                print(f"Poll error for {email}: {ex}")
+            except Exception as ex:
+                print(f"Poll error for {email}: {ex}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        self.expiry.discard(email)
+        self.seen.pop(email, None)
+        print(f"{email} expired; stopped watching")
+
+    async def run(self, addresses: Iterable[Tuple[str, str, str]]):
+        """Watch every (email, service, token) until cancelled or expired"""
+        await asyncio.gather(*(self.watch(*addr) for addr in addresses))
+
+
+def print_mail(email: str, meta: Dict, body: str):
+    print("------------------------")
+    print(f"To     : {email}")
+    print(f"From   : {meta['from']}")
+    print(f"Subject: {meta['subject']}")
+    print("Body:")
+    print(body if isinstance(body, str) else str(body))
+    print("\n")
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch many temp mail addresses concurrently")
+    parser.add_argument("--service", default="guerrillamail", help="Service for new addresses")
+    parser.add_argument("--count", type=int, default=0, help="Number of new addresses to create")
+    parser.add_argument("--watch", action="append", default=[], metavar="EMAIL:SERVICE:TOKEN",
+                        help="Existing address to watch (repeatable)")
+    parser.add_argument("--interval", type=float, default=5, help="Poll interval in seconds")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max concurrent body fetches")
+    parser.add_argument("--out", default=os.path.join(os.getcwd(), "mails"), help="Archive directory")
+    args = parser.parse_args(argv)
+
+    ensure_dir(args.out)
+    addresses = []
+    for spec in args.watch:
+        email, service, token = spec.split(":", 2)
+        addresses.append((email, service, token))
+
+    async with AsyncMailClient() as client:
+        if args.count or not addresses:
+            created = await asyncio.gather(
+                *(client.create_address(args.service) for _ in range(max(args.count, 1)))
+            )
+            addresses.extend((c["email"], c["service"], c["token"]) for c in created)
+            for c in created:
+                lifecycle.index().track_created(c["email"], c)
+
+        print("\n========================")
+        print("        ACTIVE         ")
+        print("========================")
+        for email, service, _ in addresses:
+            print(f"{service:<14}{email}")
+        print("Polling… Press Ctrl+C to stop.\n")
+
+        watcher = MailWatcher(client, args.out, interval=args.interval,
+                              max_concurrent_fetches=args.concurrency)
+        await watcher.run(addresses)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("Stopped.")
@@ -15,7 +15,7 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from Browser.browser.session import BrowserSession
-from MailClient import create_address
+from MailClient import create_address, get_mode
 
 
 logger = logging.getLogger(__name__)
@@ -62,28 +62,31 @@ def obtain_temp_email(service: str = MAIL_SERVICE_DEFAULT) -> tuple[str, str, st
     return info["email"], info["token"], info["service"]
 
 
+def _probe(url: str, timeout: float) -> bool:
+    try:
+        return requests.get(url, timeout=timeout).ok
+    except Exception:
+        return False
+
+
 def ensure_mail_api_running(host: str = "127.0.0.1", port: int = 8000, timeout: int = 30) -> None:
     base = f"http://{host}:{port}"
-    try:
-        requests.get(f"{base}/", timeout=2)
+    if _probe(f"{base}/readyz", timeout=2):
         return
-    except Exception:
-        pass
-    # Start uvicorn server
-    logger.info("Mail API nicht erreichbar – starte uvicorn…")
-    proc = subprocess.Popen([
-        sys.executable, "-m", "uvicorn", "MailService.api_server:app",
-        "--host", host, "--port", str(port), "--log-level", "warning"
-    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    # Wait until ready
+    # Start uvicorn server unless one is already up and still warming
+    if not _probe(f"{base}/healthz", timeout=2):
+        logger.info("Mail API nicht erreichbar – starte uvicorn…")
+        proc = subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "MailService.api_server:app",
+            "--host", host, "--port", str(port), "--log-level", "warning"
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Wait until ready; poll often so we don't waste time after startup completes
     start = time.time()
     while time.time() - start < timeout:
-        try:
-            requests.get(f"{base}/", timeout=1)
+        if _probe(f"{base}/readyz", timeout=1):
             logger.info("Mail API bereit.")
             return
-        except Exception:
-            time.sleep(1)
+        time.sleep(0.1)
     raise RuntimeError("Mail API konnte nicht gestartet werden")
 
 
@@ -101,8 +104,9 @@ def click_when_clickable(driver, by, selector: str, timeout: int = 30):
 
 
 def create_cursor_account(signup_url: str = SIGNUP_URL, mail_service: str = MAIL_SERVICE_DEFAULT) -> Optional[AccountData]:
-    # Ensure Mail API is available for temp email
-    ensure_mail_api_running()
+    # Ensure Mail API is available for temp email (not needed when embedded)
+    if get_mode() != "embedded":
+        ensure_mail_api_running()
     first_name, last_name, full_name, password = generate_identity()
     email, token, service = obtain_temp_email(mail_service)
     logger.info(f"Generated user: {full_name}, email: {email} via {service}")
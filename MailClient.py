@@ -1,64 +1,111 @@
+import json
 import os
 import time
-import json
 import requests
 
+from MailService import lifecycle
+from MailService.archive import open_archive
+
 API_BASE = "http://127.0.0.1:8000"
 
+# "http" talks to a running api_server; "embedded" runs the gateway in-process
+MODE = os.environ.get("MAIL_CLIENT_MODE", "http")
+
+# Per-call timeout in seconds. The gateway gets a slightly smaller deadline so
+# it cancels upstream work and answers before the client gives up.
+REQUEST_TIMEOUT = 20
+
+# Sent as X-Client-Id so the gateway rate-limits each process on its own,
+# instead of lumping every client on this host into one per-IP bucket
+CLIENT_ID = os.environ.get("MAIL_CLIENT_ID") or f"mailclient-{os.getpid()}"
+
+# Shared session so repeated calls reuse pooled keep-alive connections
+_session = requests.Session()
+_session.headers["X-Request-Timeout"] = str(REQUEST_TIMEOUT - 1)
+_session.headers["X-Client-Id"] = CLIENT_ID
+
+
+def set_mode(mode: str):
+    global MODE
+    if mode not in ("http", "embedded"):
+        raise ValueError(f"Unknown mode '{mode}'")
+    MODE = mode
+
+
+def get_mode() -> str:
+    return MODE
+
+
+def _embedded(method: str, *args):
+    # Imported lazily: pulls in FastAPI and the adapters
+    from MailService.embedded import GatewayError, get_gateway
+    try:
+        return getattr(get_gateway(), method)(*args)
+    except GatewayError as e:
+        # Surface errors like the HTTP mode does (raise_for_status), status code included
+        response = requests.Response()
+        response.status_code = e.status_code
+        response._content = json.dumps({"detail": e.detail}).encode("utf-8")
+        raise requests.HTTPError(str(e), response=response) from e
+
+
+def list_services():
+    if MODE == "embedded":
+        return _embedded("list_services")
+    r = _session.get(f"{API_BASE}/services", timeout=10)
+    r.raise_for_status()
+    return r.json()
+
 
 def create_address(service: str, domain: str | None = None):
+    if MODE == "embedded":
+        return _embedded("create_address", service, domain)
     payload = {"service": service}
     if domain:
         payload["domain"] = domain
-    r = requests.post(f"{API_BASE}/address", json=payload, timeout=20)
+    r = _session.post(f"{API_BASE}/address", json=payload, timeout=REQUEST_TIMEOUT)
     r.raise_for_status()
     return r.json()
 
 
 def list_messages(service: str, token: str):
-    r = requests.get(
+    if MODE == "embedded":
+        return _embedded("list_messages", service, token)
+    r = _session.get(
         f"{API_BASE}/messages",
         params={"service": service, "token": token},
-        timeout=20,
+        timeout=REQUEST_TIMEOUT,
     )
     r.raise_for_status()
     return r.json()
 
 
 def fetch_message(service: str, token: str, message_id: str):
-    r = requests.get(
+    if MODE == "embedded":
+        return _embedded("fetch_message", service, token, message_id)
+    r = _session.get(
         f"{API_BASE}/messages/{message_id}",
         params={"service": service, "token": token},
-        timeout=20,
+        timeout=REQUEST_TIMEOUT,
     )
     r.raise_for_status()
     return r.json()
 
 
+def is_gone(error: Exception) -> bool:
+    """Whether the gateway reported the address as expired (410)"""
+    return isinstance(error, requests.HTTPError) and getattr(error.response, "status_code", None) == 410
+
+
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
 
 
 def save_mail(base_dir: str, email: str, message_id: str | int, meta: dict, body: str):
-    email_dir = os.path.join(base_dir, email)
-    ensure_dir(email_dir)
-    # Save HTML if it looks like HTML, otherwise .txt
-    ext = "html" if isinstance(body, str) and "<" in body and ">" in body else "txt"
-    body_path = os.path.join(email_dir, f"{message_id}.{ext}")
-    meta_path = os.path.join(email_dir, f"{message_id}.json")
-    try:
-        with open(body_path, "w", encoding="utf-8") as f:
-            f.write(body or "")
-    except Exception:
-        # Fallback to txt
-        body_path = os.path.join(email_dir, f"{message_id}.txt")
-        with open(body_path, "w", encoding="utf-8") as f:
-            f.write(str(body) if body is not None else "")
-    # include body in the JSON too
-    meta_with_body = dict(meta)
-    meta_with_body["body"] = body
-    with open(meta_path, "w", encoding="utf-8") as f:
-        json.dump(meta_with_body, f, ensure_ascii=False, indent=2)
+    # Bodies are deduplicated by content hash and stored compressed; the
+    # per-message {id}.json only holds metadata plus the body digest.
+    # Saving also updates the archive's full-text index.
+    return open_archive(base_dir).save(email, message_id, meta, body)
 
 
 if __name__ == "__main__":
@@ -67,7 +114,7 @@ if __name__ == "__main__":
 
     # Choose service from API
     try:
-        services = requests.get(f"{API_BASE}/services", timeout=10).json()
+        services = list_services()
     except Exception:
         services = ["guerrillamail", "mailgw", "mailtm", "dropmail", "tempmaillol"]
     print("\n========================")
@@ -94,9 +141,11 @@ if __name__ == "__main__":
 
     seen_ids: set[str] = set()
     interval_seconds = 5
+    expiry = lifecycle.index()
+    expiry.track_created(email, info)
 
     try:
-        while True:
+        while not expiry.is_expired(email):
             try:
                 msgs = list_messages(service, token) or []
                 new_msgs = []
@@ -127,7 +176,10 @@ if __name__ == "__main__":
                     print(body if isinstance(body, str) else str(body))
                     print("\n")
             except Exception as ex:
+                if is_gone(ex):
+                    break
                 print(f"Poll error: {ex}")
             time.sleep(interval_seconds)
+        print(f"{email} expired; stopped polling. Mails are archived in {base_mail_dir}")
     except KeyboardInterrupt:
         print("Stopped.")
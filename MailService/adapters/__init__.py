@@ -0,0 +1 @@
+"""Temp-mail provider adapters, imported lazily via temp_mail_apis.SERVICE_REGISTRY"""
@@ -0,0 +1,336 @@
+"""Shared HTTP plumbing for the provider adapters"""
+import asyncio
+import functools
+import os
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from .. import deadline, metrics, state, tracing
+from ..ratelimit import QueueTimeoutError, get_governor
+from ..resilience import CircuitOpenError, backoff_delay, get_breaker, get_retry_budget
+
+
+# Max open connections per adapter's shared session
+POOL_SIZE = 20
+
+# Default deadlines in seconds; adapters may override the class attributes
+CONNECT_TIMEOUT = float(os.environ.get('MAIL_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('MAIL_READ_TIMEOUT', '15'))
+
+# Upstream endpoints can be redirected, e.g. to the local simulator:
+#   MAIL_UPSTREAM_<KEY>=http://host:port/...   full base URL for one service
+#   MAIL_UPSTREAM_BASE=http://host:port        every service at <base>/<key><default path>
+UPSTREAM_BASE = os.environ.get('MAIL_UPSTREAM_BASE')
+
+
+def upstream_base_url(service_key: str, default: str) -> str:
+    """Base URL an adapter should talk to, honouring the override variables"""
+    override = os.environ.get(f'MAIL_UPSTREAM_{service_key.upper()}')
+    if override:
+        return override
+    if UPSTREAM_BASE:
+        return f"{UPSTREAM_BASE.rstrip('/')}/{service_key}{urlsplit(default).path}"
+    return default
+
+
+def hydra_attachments(msg: Dict) -> List[Dict]:
+    """Normalized attachment metadata from a mail.tm / mail.gw message"""
+    return [
+        {
+            'id': a['id'],
+            'filename': a.get('filename') or a['id'],
+            'content_type': a.get('contentType') or 'application/octet-stream',
+            'size': a.get('size'),
+        }
+        for a in msg.get('attachments') or () if a.get('id')
+    ]
+
+
+# MAIL_UPSTREAM_LIMITS=off lifts the per-service rate limits (e.g. against the
+# simulator); concurrency stays capped by the connection pool
+LIMITS_OFF = os.environ.get('MAIL_UPSTREAM_LIMITS', '').lower() == 'off'
+
+
+# Statuses that count as upstream failures (and are worth retrying for reads)
+_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+_TRANSIENT_ERRORS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+# Raised before anything is sent upstream; adapters must let these reach the gateway
+LOCAL_REJECTIONS = (CircuitOpenError, QueueTimeoutError, deadline.DeadlineExceeded)
+
+# Adapter operations timed per service
+OPERATIONS = ('create_address', 'get_messages', 'fetch_message')
+# Placeholder subjects adapters return instead of raising
+_ERROR_PAYLOADS = {'Error retrieving message': 'error_payload', 'Not found': 'not_found'}
+
+
+def _is_neutral(exc_type, status: Optional[int]) -> bool:
+    # Cancellation, our own rejections and the caller's own mistakes (a 4xx
+    # the adapter turned into an exception) neither trip nor close the breaker
+    if exc_type is None:
+        return False
+    if not issubclass(exc_type, Exception) or issubclass(exc_type, LOCAL_REJECTIONS):
+        return True
+    return status is not None and 400 <= status < 500 and status not in _RETRYABLE_STATUSES
+
+
+class _GuardedRequest:
+    """One upstream request behind the adapter's governor, breaker and retry budget.
+
+    The request holds one of the service's concurrency slots until the
+    context exits; every attempt also takes a rate-limit token. Idempotent
+    requests are retried with jittered backoff on connection errors,
+    timeouts and 429/5xx answers, as long as the service's retry budget
+    allows. Failures while reading the body count against the breaker when
+    the context exits. Queueing, attempts and backoff all stay within the
+    current request deadline, if one is set.
+    """
+
+    def __init__(self, api: 'BaseMailAPI', method: str, url: str, idempotent: bool, kwargs: Dict):
+        self.api = api
+        self.method = method
+        self.url = url
+        self.idempotent = idempotent
+        self.kwargs = kwargs
+        self.resp: Optional[aiohttp.ClientResponse] = None
+        self._slots = None
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        governor = self.api._governor()
+        self._slots = await governor.acquire(deadline.check())
+        try:
+            return await self._send(governor)
+        except BaseException as e:
+            governor.release(self._slots)
+            if isinstance(e, LOCAL_REJECTIONS):
+                metrics.UPSTREAM_REQUESTS.inc(self.api.SERVICE_KEY, type(e).__name__)
+            raise
+
+    async def _send(self, governor) -> aiohttp.ClientResponse:
+        api = self.api
+        breaker = api._breaker()
+        budget = get_retry_budget(api.SERVICE_KEY)
+        budget.deposit()
+        attempt = 0
+        while True:
+            left = deadline.check()
+            delay = backoff_delay(attempt)
+            if attempt:
+                await governor.throttle(left)
+            breaker.before_request()
+            kwargs = self.kwargs
+            if left is not None and 'timeout' not in kwargs:
+                kwargs = {**kwargs, 'timeout': api._timeout(total=left)}
+            trace_ctx = tracing.request_context(api.SERVICE_KEY, attempt)
+            if trace_ctx is not None:
+                kwargs = {**kwargs, 'trace_request_ctx': trace_ctx}
+            try:
+                resp = await api._get_http().request(self.method, self.url, **kwargs)
+            except _TRANSIENT_ERRORS as e:
+                metrics.UPSTREAM_REQUESTS.inc(api.SERVICE_KEY, type(e).__name__)
+                if deadline.remaining() is not None and deadline.remaining() <= 0:
+                    # Our own deadline ran out; not the upstream's fault
+                    raise deadline.DeadlineExceeded('request deadline exceeded') from e
+                breaker.record_failure()
+                if not self._may_retry(attempt, budget, delay):
+                    raise
+            else:
+                metrics.UPSTREAM_REQUESTS.inc(api.SERVICE_KEY, str(resp.status))
+                if resp.status not in _RETRYABLE_STATUSES or not self._may_retry(attempt, budget, delay):
+                    self.resp = resp
+                    return resp
+                breaker.record_failure()
+                tracing.finish(resp)
+                resp.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _may_retry(self, attempt: int, budget, delay: float) -> bool:
+        left = deadline.remaining()
+        if left is not None and left <= delay:
+            return False
+        return self.idempotent and attempt < self.api.MAX_RETRIES and budget.withdraw()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        breaker = self.api._breaker()
+        left = deadline.remaining()
+        status = self.resp.status if self.resp is not None else None
+        if (left is not None and left <= 0) or _is_neutral(exc_type, status):
+            pass  # says nothing about the upstream's health
+        elif exc_type is not None or status in _RETRYABLE_STATUSES:
+            # Includes bodies that fail to parse, e.g. an HTML error page sent with 200
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if self.resp is not None:
+            tracing.finish(self.resp)
+            self.resp.release()
+        self.api._governor().release(self._slots)
+        return False
+
+
+class _GuardedSession:
+    """Session facade whose get/post go through _GuardedRequest."""
+
+    def __init__(self, api: 'BaseMailAPI'):
+        self.api = api
+
+    def get(self, url: str, idempotent: bool = True, **kwargs) -> _GuardedRequest:
+        return _GuardedRequest(self.api, 'GET', url, idempotent, kwargs)
+
+    def post(self, url: str, idempotent: bool = False, **kwargs) -> _GuardedRequest:
+        return _GuardedRequest(self.api, 'POST', url, idempotent, kwargs)
+
+
+class _SharedSession:
+    """Async context manager yielding an adapter's pooled session without closing it."""
+
+    def __init__(self, api: 'BaseMailAPI'):
+        self.api = api
+
+    async def __aenter__(self) -> _GuardedSession:
+        return _GuardedSession(self.api)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _instrumented(operation: str, fn):
+    """Wrap an adapter operation with latency, in-flight and error metrics"""
+
+    @functools.wraps(fn)
+    async def wrapper(self, *args, **kwargs):
+        service = self.SERVICE_KEY
+        metrics.UPSTREAM_IN_FLIGHT.inc(service)
+        started = time.perf_counter()
+        try:
+            result = await fn(self, *args, **kwargs)
+        except BaseException as e:
+            metrics.UPSTREAM_ERRORS.inc(service, operation, type(e).__name__)
+            raise
+        finally:
+            metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - started, service, operation)
+            metrics.UPSTREAM_IN_FLIGHT.dec(service)
+        if isinstance(result, dict) and result.get('subject') in _ERROR_PAYLOADS:
+            metrics.UPSTREAM_ERRORS.inc(service, operation, _ERROR_PAYLOADS[result['subject']])
+        return result
+
+    wrapper._instrumented = True
+    return wrapper
+
+
+class BaseMailAPI:
+    """Shared HTTP plumbing: one keep-alive connection pool per adapter instance."""
+
+    SERVICE_KEY = 'base'
+    EXPIRATION_SECONDS = 3600  # how long the provider keeps an address
+    CONNECT_TIMEOUT = CONNECT_TIMEOUT
+    READ_TIMEOUT = READ_TIMEOUT
+    MAX_RETRIES = 2  # per idempotent request, on top of the first attempt
+    BREAKER_FAILURES = 5  # consecutive failures before failing fast
+    BREAKER_RESET = 30.0  # seconds before a half-open probe
+    RATE_LIMIT = 10.0  # sustained requests/s to this upstream
+    RATE_BURST = 20  # requests allowed in a burst
+    MAX_CONCURRENCY = 16  # concurrent requests to this upstream
+    MAX_QUEUE_WAIT = 5.0  # seconds a request may queue before failing
+    # Adapters setting this define open_attachment(token, message_id, attachment_id, headers)
+    # returning a _stream() request: `async with api.open_attachment(...) as resp`
+    SUPPORTS_ATTACHMENTS = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for operation in OPERATIONS:
+            fn = cls.__dict__.get(operation)
+            if fn is not None and not getattr(fn, '_instrumented', False):
+                setattr(cls, operation, _instrumented(operation, fn))
+
+    def __init__(self):
+        # Sessions are bound to the loop they were created on: one per loop
+        self._http: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        if hasattr(self, 'BASE_URL'):
+            self.BASE_URL = upstream_base_url(self.SERVICE_KEY, type(self).BASE_URL)
+
+    def _session_headers(self) -> Optional[Dict[str, str]]:
+        """Default headers for every request of this adapter"""
+        return None
+
+    def _timeout(self, total: Optional[float] = None) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=total, sock_connect=self.CONNECT_TIMEOUT, connect=self.CONNECT_TIMEOUT * 2,
+            sock_read=self.READ_TIMEOUT,
+        )
+
+    def _breaker(self):
+        return get_breaker(self.SERVICE_KEY, self.BREAKER_FAILURES, self.BREAKER_RESET)
+
+    def _governor(self):
+        if LIMITS_OFF:
+            return get_governor(self.SERVICE_KEY, 1e9, 1e9, POOL_SIZE, self.MAX_QUEUE_WAIT)
+        # Provider limits are per host; split them between the gateway workers
+        workers = state.WORKERS
+        return get_governor(
+            self.SERVICE_KEY, self.RATE_LIMIT / workers, max(1.0, self.RATE_BURST / workers),
+            max(1, self.MAX_CONCURRENCY // workers), self.MAX_QUEUE_WAIT
+        )
+
+    def _get_http(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        http = self._http.get(loop)
+        if http is None or http.closed:
+            self._drop_dead_sessions(loop)
+            trace_configs = tracing.trace_configs()
+            http = self._http[loop] = aiohttp.ClientSession(
+                headers=self._session_headers(),
+                connector=aiohttp.TCPConnector(limit=POOL_SIZE, ttl_dns_cache=300),
+                timeout=self._timeout(),
+                trace_configs=trace_configs,
+                response_class=tracing.response_class() if trace_configs else aiohttp.ClientResponse,
+            )
+        return http
+
+    def _drop_dead_sessions(self, loop: asyncio.AbstractEventLoop) -> None:
+        # The connector of a closed loop has nothing left to tear down, so its
+        # session can be closed from any loop
+        for owner, http in list(self._http.items()):
+            if owner.is_closed():
+                del self._http[owner]
+                loop.create_task(http.close())
+
+    def _session(self) -> _SharedSession:
+        return _SharedSession(self)
+
+    def _stream(self, url: str, headers: Optional[Dict[str, str]] = None) -> _GuardedRequest:
+        """Guarded GET whose body is read incrementally by the caller.
+
+        Only connects and individual reads are timed, so a large body may
+        outlive the request deadline. Content is requested unencoded so
+        byte ranges refer to the stored bytes.
+        """
+        headers = {'Accept-Encoding': 'identity', **(headers or {})}
+        return _GuardedRequest(self, 'GET', url, True, {'headers': headers, 'timeout': self._timeout()})
+
+    async def warm_up(self) -> None:
+        """Open the connection pool ahead of the first request"""
+        self._get_http()
+
+    @property
+    def expiration_seconds(self) -> int:
+        """Return expiration time in seconds"""
+        return self.EXPIRATION_SECONDS
+
+    def forget(self, token: str) -> None:
+        """Drop per-token state once the address has expired"""
+
+    async def close(self) -> None:
+        """Close the sessions of this loop, of closed loops and of loops running elsewhere"""
+        loop = asyncio.get_running_loop()
+        for owner, http in list(self._http.items()):
+            if owner is loop or owner.is_closed():
+                await http.close()
+            elif owner.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(http.close(), owner))
+            else:
+                continue  # An idle loop must close its own session
+            del self._http[owner]
@@ -0,0 +1,219 @@
+# Developed by: https://github.com/zebbern
+"""DropMail.me adapter"""
+import random
+import string
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from .base import LOCAL_REJECTIONS, BaseMailAPI
+
+
+class DropMailAPI(BaseMailAPI):
+    """API handler for DropMail.me service."""
+    BASE_URL = 'https://dropmail.me/api/graphql/'
+    DOMAINS = ['dropmail.me']  # This service generates domains dynamically
+    SERVICE_KEY = 'dropmail'
+    SERVICE_NAME = "DropMail.me"
+    EXPIRATION_SECONDS = 600  # 10 minutes
+
+    def __init__(self):
+        super().__init__()
+
+    def _session_headers(self) -> Dict[str, str]:
+        return {'Content-Type': 'application/json'}
+
+    def _rand_str(self, n=10):
+        return ''.join(random.choices(string.ascii_lowercase + string.digits, k=n))
+
+    async def _gql_post(self, token, query, variables=None):
+        url = self.BASE_URL + token
+        payload = {"query": query}
+        if variables:
+            payload["variables"] = variables
+        # Plain GraphQL queries are reads and safe to retry; mutations are not
+        idempotent = not query.lstrip().startswith('mutation')
+
+        async with self._session() as session:
+            async with session.post(url, json=payload, idempotent=idempotent) as resp:
+                if resp.status != 200:
+                    raise Exception(f"DropMail API error: {resp.status}")
+                data = await resp.json()
+                return data.get("data", {})
+
+    async def create_address(self, domain: str = None) -> Dict:
+        """Create session and get email address"""
+        token = self._rand_str(12)
+        query = """
+        mutation {
+          introduceSession {
+            id
+            expiresAt
+            addresses {
+              address
+            }
+          }
+        }
+        """
+        data = await self._gql_post(token, query)
+        sess = data["introduceSession"]
+        session_id = sess["id"]
+        address = sess["addresses"][0]["address"]
+        
+        # Return combined token that includes both API token and session ID
+        return {'email': address, 'token': f"{token}|{session_id}"}
+
+    async def get_messages(self, token: str) -> List[Dict]:
+        """Get messages for the session"""
+        api_token, session_id = token.split('|')
+        query = """
+        query($id: ID!){
+          session(id: $id){
+            mails{
+              id
+              fromAddr
+              headerSubject
+              text
+              receivedAt
+            }
+          }
+        }
+        """
+        data = await self._gql_post(api_token, query, {"id": session_id})
+        session = data.get("session")
+        if session is None:
+            return []
+        
+        messages = session.get("mails", [])
+        
+        # Normalize message format
+        normalized = []
+        for m in messages:
+            normalized.append({
+                'mail_id': m['id'],
+                'subject': m.get('headerSubject', 'No Subject'),
+                'mail_from': m.get('fromAddr', 'Unknown'),
+                'mail_date': m.get('receivedAt', ''),
+                'receive_time': datetime.now().timestamp()  # Add timestamp for sorting
+            })
+        return normalized
+
+    async def fetch_message(self, token: str, message_id: str) -> Dict:
+        """Fetch full message content"""
+        try:
+            # For DropMail, we need to query for the specific message directly
+            api_token, session_id = token.split('|')
+            
+            # First try the more precise query for a single mail
+            try:
+                query = """
+                query($id: ID!, $mailId: ID!){
+                  session(id: $id){
+                    mail(id: $mailId){
+                      id
+                      fromAddr
+                      headerSubject
+                      text
+                      html
+                      receivedAt
+                      size
+                    }
+                  }
+                }
+                """
+                data = await self._gql_post(api_token, query, {"id": session_id, "mailId": message_id})
+                mail = data.get("session", {}).get("mail", {})
+                
+                # If we got data, use it
+                if mail and (mail.get('text') or mail.get('html')):
+                    # Prioritize HTML content if available
+                    html_content = mail.get('html', '')
+                    text_content = mail.get('text', '')
+                    
+                    # Get the better content
+                    final_content = html_content if html_content else text_content
+                    
+                    # Calculate size if not provided
+                    mail_size = mail.get('size', len(final_content.encode('utf-8')))
+                    
+                    return {
+                        'mail_body': final_content,
+                        'mail_from': mail.get('fromAddr', 'Unknown'),
+                        'subject': mail.get('headerSubject', 'No Subject'),
+                        'mail_date': mail.get('receivedAt', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+                        'mail_size': mail_size,
+                        'receive_time': datetime.now().timestamp()  # Add timestamp for sorting
+                    }
+            except LOCAL_REJECTIONS:
+                raise
+            except Exception as e:
+                logging.error(f"DropMail single mail query failed: {e}")
+                # Continue to fallback method
+            
+            # If direct mail query failed, fall back to full mail list
+            query = """
+            query($id: ID!){
+              session(id: $id){
+                mails{
+                  id
+                  fromAddr
+                  headerSubject
+                  text
+                  html
+                  receivedAt
+                }
+              }
+            }
+            """
+            data = await self._gql_post(api_token, query, {"id": session_id})
+            
+            # Find the specific message in the list
+            mail = None
+            if "session" in data and "mails" in data["session"]:
+                for m in data["session"]["mails"]:
+                    if m["id"] == message_id:
+                        mail = m
+                        break
+            
+            if not mail:
+                raise Exception("Message not found in session")
+                
+            # Prioritize HTML content
+            html_content = mail.get('html', '')
+            text_content = mail.get('text', '')
+            
+            # Get the better content
+            final_content = html_content if html_content else text_content
+            
+            # Calculate size based on content
+            mail_size = len(final_content.encode('utf-8')) if final_content else 0
+            
+            return {
+                'mail_body': final_content,
+                'mail_from': mail.get('fromAddr', 'Unknown'),
+                'subject': mail.get('headerSubject', 'No Subject'),
+                'mail_date': mail.get('receivedAt', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+                'mail_size': mail_size,
+                'receive_time': datetime.now().timestamp()
+            }
+        except LOCAL_REJECTIONS:
+            raise
+        except Exception as e:
+            logging.error(f"DropMailAPI fetch_message error: {str(e)}")
+            # Return minimal data to prevent further errors
+            return {
+                'mail_body': f"Error loading message: {str(e)}",
+                'mail_from': 'Unknown',
+                'subject': 'Error retrieving message',
+                'mail_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'mail_size': 0,
+                'receive_time': datetime.now().timestamp()
+            }
+
+    @property
+    def service_name(self) -> str:
+        return self.SERVICE_NAME
+    
+    @property
+    def domains(self) -> List[str]:
+        return self.DOMAINS
@@ -0,0 +1,141 @@
+# Developed by: https://github.com/zebbern
+"""Guerrilla Mail adapter"""
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from .base import LOCAL_REJECTIONS, BaseMailAPI
+
+
+class GuerrillaMailAPI(BaseMailAPI):
+    """API handler for Guerrilla Mail service."""
+    BASE_URL = 'https://api.guerrillamail.com/ajax.php'
+    DOMAINS = ['grr.la', 'sharklasers.com', 'guerrillamail.net', 'guerrillamail.com']
+    SERVICE_KEY = 'guerrillamail'
+    SERVICE_NAME = "Guerrilla Mail"
+    EXPIRATION_SECONDS = 3600  # 1 hour
+    RATE_LIMIT = 5.0
+    MAX_CONCURRENCY = 8
+
+    def __init__(self):
+        super().__init__()
+        self.salt = int(datetime.now().timestamp() * 1000)
+
+    def _session_headers(self) -> Dict[str, str]:
+        return self._default_headers()
+
+    def _default_headers(self) -> Dict[str, str]:
+        return {
+            'User-Agent': 'TempMailPro/3.0',
+            'Accept': 'application/json',
+            'Referer': 'https://guerrillamail.com/'
+        }
+
+    async def create_address(self, domain: str = None) -> Dict:
+        """Create a new email address."""
+        if domain is None:
+            domain = self.DOMAINS[0]
+        
+        params = {'f': 'get_email_address', 't': str(self.salt)}
+        self.salt += 1
+        
+        async with self._session() as session:
+            async with session.get(self.BASE_URL, params=params, idempotent=False) as resp:
+                try:
+                    data = await resp.json()
+                    return {'email': data['email_addr'], 'token': data['sid_token']}
+                except Exception:
+                    pass
+            # Retry without the salt only once the first request has given back its slot;
+            # nesting it would need two slots and could wait on itself
+            params = {'f': 'get_email_address'}
+            async with session.get(self.BASE_URL, params=params, idempotent=False) as fallback_resp:
+                data = await fallback_resp.json()
+                return {'email': data['email_addr'], 'token': data['sid_token']}
+
+    async def get_messages(self, token: str) -> List[Dict]:
+        params = {'f': 'get_email_list', 'sid_token': token, 'offset': '0'}
+        async with self._session() as session:
+            async with session.get(self.BASE_URL, params=params) as resp:
+                data = await resp.json()
+                messages = data.get('list', [])
+                
+                # Normalize message format and ensure subject is properly extracted
+                normalized = []
+                for msg in messages:
+                    normalized.append({
+                        'mail_id': msg.get('mail_id', ''),
+                        'subject': msg.get('mail_subject', 'No Subject'),  # Correct field for subject
+                        'mail_from': msg.get('mail_from', 'Unknown'),
+                        'mail_date': msg.get('mail_date', ''),
+                        'receive_time': datetime.now().timestamp()  # Add timestamp for sorting
+                    })
+                return normalized
+
+    async def fetch_message(self, token: str, message_id: str) -> Dict:
+        """Fetch a specific message."""
+        try:
+            params = {'f': 'fetch_email', 'sid_token': token, 'email_id': message_id}
+            async with self._session() as session:
+                async with session.get(self.BASE_URL, params=params) as resp:
+                    data = await resp.json()
+                    
+                    # Get the mail body correctly from both possible locations
+                    mail_body = data.get('mail_body', '')
+                    if not mail_body:
+                        mail_body = data.get('body', '')
+                        
+                    # Make sure we handle HTML bodies correctly
+                    mail_body_html = data.get('body_html', '')
+                    if mail_body_html and not mail_body:
+                        mail_body = mail_body_html
+                    
+                    # Create normalized response with correct subject field
+                    # Format mail_date as human-readable string if timestamp provided
+                    mail_ts = data.get('mail_timestamp')
+                    try:
+                        if isinstance(mail_ts, (int, float)):
+                            formatted_date = datetime.fromtimestamp(mail_ts).strftime('%Y-%m-%d %H:%M:%S')
+                        elif isinstance(mail_ts, str) and mail_ts.isdigit():
+                            formatted_date = datetime.fromtimestamp(int(mail_ts)).strftime('%Y-%m-%d %H:%M:%S')
+                        else:
+                            formatted_date = data.get('mail_date', '') or ''
+                    except Exception:
+                        formatted_date = data.get('mail_date', '') or ''
+                    # Ensure formatted_date is a string (avoid numeric 0 leaking)
+                    if formatted_date is None or formatted_date == 0:
+                        formatted_date = ''
+                    elif not isinstance(formatted_date, str):
+                        try:
+                            formatted_date = str(formatted_date)
+                        except Exception:
+                            formatted_date = ''
+                    return {
+                        'mail_body': mail_body,
+                        'mail_from': data.get('mail_from', 'Unknown'),
+                        'subject': data.get('mail_subject', 'No Subject'),  # Use correct field
+                        'mail_date': formatted_date,
+                        'mail_size': data.get('mail_size', 0),
+                        'receive_time': datetime.now().timestamp()  # Add timestamp for sorting
+                    }
+        except LOCAL_REJECTIONS:
+            raise
+        except Exception as e:
+            logging.error(f"GuerrillaMailAPI fetch_message error: {str(e)}")
+            # Return minimal data to prevent further errors
+            return {
+                'mail_body': f"Error loading message: {str(e)}",
+                'mail_from': 'Unknown',
+                'subject': 'Error retrieving message',
+                'mail_date': '',
+                'mail_size': 0,
+                'receive_time': datetime.now().timestamp()
+            }
+
+    @property
+    def service_name(self) -> str:
+        return self.SERVICE_NAME
+    
+    @property
+    def domains(self) -> List[str]:
+        return self.DOMAINS
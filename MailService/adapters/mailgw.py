@@ -0,0 +1,168 @@
+# Developed by: https://github.com/zebbern
+"""Mail.gw adapter"""
+import random
+import string
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .base import LOCAL_REJECTIONS, BaseMailAPI, hydra_attachments
+
+
+class MailGwAPI(BaseMailAPI):
+    """API handler for Mail.gw service."""
+    BASE_URL = 'https://api.mail.gw'
+    SERVICE_KEY = 'mailgw'
+    SERVICE_NAME = "Mail.gw"
+    EXPIRATION_SECONDS = 600  # 10 minutes
+    RATE_LIMIT = 8.0  # same platform as mail.tm
+    SUPPORTS_ATTACHMENTS = True
+
+    def __init__(self):
+        super().__init__()
+        self._domains = None
+
+    def _randstr(self, n=10):
+        return "".join(random.choices(string.ascii_lowercase + string.digits, k=n))
+
+    async def _get_domains(self) -> List[str]:
+        """Fetch available domains"""
+        if self._domains is None:
+            async with self._session() as session:
+                async with session.get(f"{self.BASE_URL}/domains") as resp:
+                    data = await resp.json()
+                    self._domains = [d["domain"] for d in data["hydra:member"]]
+        return self._domains
+
+    async def create_address(self, domain: str = None) -> Dict:
+        """Create a new account with Mail.gw"""
+        if domain is None:
+            domains = await self._get_domains()
+            domain = random.choice(domains)
+        
+        local = self._randstr()
+        email = f"{local}@{domain}"
+        password = self._randstr(12)
+        
+        async with self._session() as session:
+            # Create account
+            async with session.post(f"{self.BASE_URL}/accounts", 
+                                     json={"address": email, "password": password}) as resp:
+                # Mail.gw sometimes returns text/html on errors; guard json decoding
+                try:
+                    await resp.json()
+                except Exception:
+                    _ = await resp.text()
+            
+            # Get token
+            async with session.post(f"{self.BASE_URL}/token",
+                                     json={"address": email, "password": password}) as resp:
+                try:
+                    data = await resp.json()
+                except Exception:
+                    # If unexpected mimetype, parse text and try to extract token
+                    text = await resp.text()
+                    raise Exception(f"Mail.gw token response not JSON: {text[:200]}")
+                token = data["token"]
+        
+        return {'email': email, 'token': token}
+
+    async def get_messages(self, token: str) -> List[Dict]:
+        headers = {"Authorization": f"Bearer {token}"}
+        async with self._session() as session:
+            async with session.get(f"{self.BASE_URL}/messages", headers=headers) as resp:
+                try:
+                    data = await resp.json()
+                except Exception:
+                    _ = await resp.text()
+                    raise
+                messages = data.get("hydra:member", [])
+                
+                # Normalize message format
+                normalized = []
+                for msg in messages:
+                    normalized.append({
+                        'mail_id': msg['id'],
+                        'subject': msg.get('subject', 'No Subject'),
+                        'mail_from': msg.get('from', {}).get('address', 'Unknown'),
+                        'mail_date': msg.get('createdAt', ''),
+                        'receive_time': datetime.now().timestamp()  # Add timestamp for sorting
+                    })
+                return normalized
+
+    async def fetch_message(self, token: str, message_id: str) -> Dict:
+        """Fetch full message content for Mail.gw"""
+        try:
+            headers = {"Authorization": f"Bearer {token}"}
+            async with self._session() as session:
+                async with session.get(f"{self.BASE_URL}/messages/{message_id}", headers=headers) as resp:
+                    try:
+                        msg = await resp.json()
+                    except Exception:
+                        text = await resp.text()
+                        raise Exception(f"Mail.gw message response not JSON: {text[:200]}")
+                    
+                    # Prioritize HTML content if available
+                    html_content = msg.get('html', '')
+                    text_content = msg.get('text', '')
+                    
+                    # Check if content exists at alternate locations in the response
+                    if not html_content and not text_content:
+                        if 'payload' in msg:
+                            html_content = msg.get('payload', {}).get('html', '')
+                            text_content = msg.get('payload', {}).get('text', '')
+                    
+                    # Ensure content is a string, not a list
+                    if isinstance(html_content, list):
+                        html_content = '\n'.join([str(item) for item in html_content])
+                    if isinstance(text_content, list):
+                        text_content = '\n'.join([str(item) for item in text_content])
+                    
+                    # Use HTML if available, else text
+                    final_content = html_content if html_content else text_content
+                    
+                    # Calculate size based on content length
+                    message_size = len(final_content.encode('utf-8'))
+                    
+                    # Format date if available
+                    created_date = msg.get('createdAt', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                    
+                    # Normalize message format
+                    return {
+                        'mail_body': final_content,
+                        'mail_from': msg.get('from', {}).get('address', 'Unknown'),
+                        'subject': msg.get('subject', 'No Subject'),
+                        'mail_date': created_date,
+                        'mail_size': message_size,
+                        'attachments': hydra_attachments(msg),
+                        'receive_time': datetime.now().timestamp()  # Add timestamp for sorting
+                    }
+        except LOCAL_REJECTIONS:
+            raise
+        except Exception as e:
+            logging.error(f"MailGwAPI fetch_message error: {str(e)}")
+            # Return minimal data to prevent further errors
+            return {
+                'mail_body': f"Error loading message: {str(e)}",
+                'mail_from': 'Unknown',
+                'subject': 'Error retrieving message',
+                'mail_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'mail_size': 0,
+                'receive_time': datetime.now().timestamp()
+            }
+
+    def open_attachment(self, token: str, message_id: str, attachment_id: str,
+                        headers: Optional[Dict[str, str]] = None):
+        """Stream an attachment's bytes; extra headers (e.g. Range) are passed upstream"""
+        url = f"{self.BASE_URL}/messages/{message_id}/attachment/{attachment_id}"
+        return self._stream(url, {**(headers or {}), "Authorization": f"Bearer {token}"})
+
+    @property
+    def service_name(self) -> str:
+        return self.SERVICE_NAME
+    
+    @property
+    def domains(self) -> List[str]:
+        if self._domains is None:
+            return ['mail.gw']  # Default domain
+        return self._domains
@@ -0,0 +1,174 @@
+# Developed by: https://github.com/zebbern
+"""TempMail.lol adapter"""
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from .base import LOCAL_REJECTIONS, BaseMailAPI
+from .. import state
+
+
+class TempMailLolAPI(BaseMailAPI):
+    """API handler for TempMail.lol service."""
+    BASE_URL = 'https://api.tempmail.lol'
+    DOMAINS = ['tempmail.lol']  # This service generates domains dynamically
+    SERVICE_KEY = 'tempmaillol'
+    SERVICE_NAME = "TempMail.lol"
+    EXPIRATION_SECONDS = 3600  # 1 hour
+    MESSAGE_CACHE_TOKENS = 10000
+
+    def __init__(self):
+        super().__init__()
+        # Messages seen per token; shared between gateway workers with MAIL_STATE=sqlite
+        self.message_cache = state.cache('tempmaillol.messages', self.MESSAGE_CACHE_TOKENS)
+
+    async def create_address(self, domain: str = None) -> Dict:
+        """Generate address using TempMail.lol"""
+        # Can use /generate or /generate/rush
+        path = "/generate/rush"  # Rush is faster
+        url = self.BASE_URL + path
+        
+        async with self._session() as session:
+            # Each call mints a new inbox, so never retry it
+            async with session.get(url, idempotent=False) as resp:
+                if resp.status != 200:
+                    raise Exception(f"TempMail.lol API error: {resp.status}")
+                data = await resp.json()
+                return {'email': data["address"], 'token': data["token"]}
+
+    async def get_messages(self, token: str) -> List[Dict]:
+        """Fetch emails for the token"""
+        url = f"{self.BASE_URL}/auth/{token}"
+        async with self._session() as session:
+            async with session.get(url) as resp:
+                if resp.status != 200:
+                    raise Exception(f"TempMail.lol API error: {resp.status}")
+                data = await resp.json()
+                messages = data.get("email", [])
+                
+                # Save messages to cache and normalize format
+                cached = await state.offload(self.message_cache.get, token) or []
+                
+                normalized = []
+                existing_ids = {msg['mail_id'] for msg in cached}
+                
+                for i, msg in enumerate(messages):
+                    msg_id = str(i)
+                    if msg_id not in existing_ids:
+                        # New message - save to cache
+                        received_time = datetime.now().timestamp()
+                        normalized_msg = {
+                            'mail_id': msg_id,
+                            'subject': msg.get('subject', 'No Subject'),
+                            'mail_from': msg.get('from', 'Unknown'),
+                            'mail_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                            'mail_body': msg.get('body', '') or msg.get('html', ''),
+                            'mail_size': len(msg.get('body', '') or msg.get('html', '')),
+                            'cached': False,
+                            'receive_time': received_time
+                        }
+                        cached.append(normalized_msg)
+                        normalized.append(normalized_msg)
+                if normalized:
+                    await state.offload(self.message_cache.put, token, cached)
+                
+                # Also return cached messages not in current response
+                for cached_msg in cached:
+                    if cached_msg['mail_id'] not in [msg['mail_id'] for msg in normalized]:
+                        cached_copy = cached_msg.copy()
+                        cached_copy['cached'] = True
+                        normalized.append(cached_copy)
+                
+                return normalized
+
+    async def fetch_message(self, token: str, message_id: str) -> Dict:
+        """Fetch full message content for TempMail.lol"""
+        try:
+            # First try to get from cache
+            cached = await state.offload(self.message_cache.get, token)
+            if cached is not None:
+                for msg in cached:
+                    if msg['mail_id'] == message_id:
+                        # Ensure we have date and size
+                        if not msg.get('mail_date'):
+                            msg['mail_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                        
+                        body_content = msg.get('mail_body', '')
+                        if not msg.get('mail_size'):
+                            msg['mail_size'] = len(body_content.encode('utf-8')) if body_content else 0
+                            
+                        return {
+                            'mail_body': body_content,
+                            'mail_from': msg.get('mail_from', 'Unknown'),
+                            'subject': msg.get('subject', 'No Subject'),
+                            'mail_date': msg.get('mail_date'),
+                            'mail_size': msg.get('mail_size'),
+                            'receive_time': msg.get('receive_time', datetime.now().timestamp())
+                        }
+            
+            # If not in cache, fetch fresh
+            url = f"{self.BASE_URL}/auth/{token}"
+            async with self._session() as session:
+                async with session.get(url) as resp:
+                    if resp.status != 200:
+                        raise Exception(f"TempMail.lol API error: {resp.status}")
+                    data = await resp.json()
+                    messages = data.get("email", [])
+                    
+                    try:
+                        index = int(message_id)
+                        if 0 <= index < len(messages):
+                            msg = messages[index]
+                            body_content = msg.get('body', '') or msg.get('html', '')
+                            
+                            # Calculate size based on content length
+                            size = len(body_content.encode('utf-8')) if body_content else 0
+                            
+                            # Use current timestamp if date not provided
+                            curr_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                            receive_time = datetime.now().timestamp()
+                            
+                            return {
+                                'mail_body': body_content,
+                                'mail_from': msg.get('from', 'Unknown'),
+                                'subject': msg.get('subject', 'No Subject'),
+                                'mail_date': curr_date,
+                                'mail_size': size,
+                                'receive_time': receive_time
+                            }
+                    except (ValueError, IndexError):
+                        pass
+                    
+                    # Return a default message if not found
+                    return {
+                        'mail_body': 'Message not found',
+                        'mail_from': 'Unknown',
+                        'subject': 'Not found',
+                        'mail_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        'mail_size': 0,
+                        'receive_time': datetime.now().timestamp()
+                    }
+        except LOCAL_REJECTIONS:
+            raise
+        except Exception as e:
+            logging.error(f"TempMailLolAPI fetch_message error: {str(e)}")
+            # Return minimal data to prevent further errors
+            return {
+                'mail_body': f"Error loading message: {str(e)}",
+                'mail_from': 'Unknown',
+                'subject': 'Error retrieving message',
+                'mail_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'mail_size': 0,
+                'receive_time': datetime.now().timestamp()
+            }
+
+    def forget(self, token: str) -> None:
+        self.message_cache.pop(token)
+
+    @property
+    def service_name(self) -> str:
+        return self.SERVICE_NAME
+    
+    @property
+    def domains(self) -> List[str]:
+        return self.DOMAINS
@@ -0,0 +1,178 @@
+"""Per-client admission control for the Mail API gateway"""
+import asyncio
+import json
+import math
+import os
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+
+from .cache import LRUCache
+from .ratelimit import TokenBucket
+
+
+# Defaults per client; override via environment
+CLIENT_RATE = float(os.environ.get('MAIL_CLIENT_RATE', '20'))  # requests/s
+CLIENT_BURST = float(os.environ.get('MAIL_CLIENT_BURST', '40'))
+CLIENT_CONCURRENCY = int(os.environ.get('MAIL_CLIENT_CONCURRENCY', '8'))
+CLIENT_QUEUE = int(os.environ.get('MAIL_CLIENT_QUEUE', '16'))  # queued requests per client
+CLIENT_QUEUE_WAIT = float(os.environ.get('MAIL_CLIENT_QUEUE_WAIT', '2'))  # seconds
+# Gateway-wide in-flight requests before clients are held to their fair share
+MAX_IN_FLIGHT = int(os.environ.get('MAIL_MAX_IN_FLIGHT', '256'))
+# Distinct X-Client-Id values honoured per peer address; further ids share the address's bucket
+CLIENT_IDS_PER_ADDRESS = int(os.environ.get('MAIL_CLIENT_IDS_PER_ADDRESS', '16'))
+
+# Comma-separated X-API-Key values that get a bucket of their own; unknown keys are ignored
+API_KEYS = frozenset(k.strip() for k in os.environ.get('MAIL_API_KEYS', '').split(',') if k.strip())
+
+CLIENT_ID_HEADER = 'x-client-id'
+
+# Probes and scrapes must keep working under load
+EXEMPT_PATHS = {'/healthz', '/readyz', '/metrics', '/'}
+
+
+class _Client:
+    __slots__ = ('bucket', 'slots', 'in_flight', 'queued', 'rejected')
+
+    def __init__(self, rate: float, burst: float, concurrency: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+
+
+class AdmissionMiddleware:
+    """ASGI middleware shedding excess load per client with 429 + Retry-After.
+
+    Clients are keyed by their X-API-Key header when it is one of api_keys
+    (so rotating made-up keys buys nothing), then by their X-Client-Id
+    header scoped to the peer address (so the GUI and scripts on one host get
+    their own buckets), falling back to the peer address alone. At most
+    ids_per_address client ids count per address, so minting fresh ids does
+    not buy a fresh bucket forever. Each client gets a token bucket, a concurrency limit and a
+    short bounded queue. When the gateway as a whole is saturated, clients
+    already above their fair share of MAX_IN_FLIGHT are shed first, so one
+    noisy client cannot starve the others.
+    """
+
+    def __init__(self, app, rate: float = CLIENT_RATE, burst: float = CLIENT_BURST,
+                 concurrency: int = CLIENT_CONCURRENCY, queue: int = CLIENT_QUEUE,
+                 queue_wait: float = CLIENT_QUEUE_WAIT, max_in_flight: int = MAX_IN_FLIGHT,
+                 ids_per_address: int = CLIENT_IDS_PER_ADDRESS, api_keys=API_KEYS,
+                 max_clients: int = 10000):
+        self.app = app
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_wait = queue_wait
+        self.max_in_flight = max_in_flight
+        self.ids_per_address = ids_per_address
+        self.api_keys = frozenset(api_keys)
+        self.clients = LRUCache(maxsize=max_clients)
+        self.client_ids = LRUCache(maxsize=max_clients)  # peer address -> client ids seen
+        self.in_flight = 0
+        self.shed = 0
+
+    def client_key(self, scope) -> str:
+        headers = Headers(scope=scope)
+        api_key = headers.get('x-api-key')
+        if api_key and api_key in self.api_keys:
+            return 'key:' + api_key
+        client = scope.get('client')
+        address = client[0] if client else 'unknown'
+        client_id = headers.get(CLIENT_ID_HEADER)
+        if client_id:
+            ids = self.client_ids.get(address)
+            if ids is None:
+                ids = set()
+                self.client_ids.put(address, ids)
+            if client_id in ids or len(ids) < self.ids_per_address:
+                ids.add(client_id)
+                return f'id:{address}/{client_id}'
+        return 'ip:' + address
+
+    def _client(self, key: str) -> _Client:
+        client = self.clients.get(key)
+        if client is None:
+            client = _Client(self.rate, self.burst, self.concurrency)
+            self.clients.put(key, client)
+        return client
+
+    def _fair_share(self) -> float:
+        active = sum(1 for _, c in self.clients.items() if c.in_flight or c.queued)
+        return max(1.0, self.max_in_flight / max(active, 1))
+
+    async def _reject(self, send, retry_after: float, reason: str):
+        self.shed += 1
+        body = json.dumps({'detail': f'Too many requests: {reason}'}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': 429,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        client = self._client(self.client_key(scope))
+        if client.bucket.reserve(0.0) is None:
+            client.rejected += 1
+            await self._reject(send, 1.0 / self.rate, 'rate limit exceeded')
+            return
+        if self.in_flight >= self.max_in_flight and client.in_flight >= self._fair_share():
+            client.rejected += 1
+            await self._reject(send, 1.0, 'gateway saturated')
+            return
+
+        if client.slots.locked():
+            if client.queued >= self.queue:
+                client.rejected += 1
+                await self._reject(send, self.queue_wait, 'queue full')
+                return
+            client.queued += 1
+            try:
+                await asyncio.wait_for(client.slots.acquire(), self.queue_wait)
+            except asyncio.TimeoutError:
+                client.rejected += 1
+                await self._reject(send, self.queue_wait, 'queue wait exceeded')
+                return
+            finally:
+                client.queued -= 1
+        else:
+            await client.slots.acquire()
+
+        client.in_flight += 1
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            client.in_flight -= 1
+            self.in_flight -= 1
+            client.slots.release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'in_flight': self.in_flight,
+            'clients': len(self.clients),
+            'queued': sum(c.queued for _, c in self.clients.items()),
+            'shed': self.shed,
+        }
+
+
+def find_admission(app) -> Optional[AdmissionMiddleware]:
+    """Locate the AdmissionMiddleware instance in a built Starlette middleware stack"""
+    layer = getattr(app, 'middleware_stack', None)
+    while layer is not None:
+        if isinstance(layer, AdmissionMiddleware):
+            return layer
+        layer = getattr(layer, 'app', None)
+    return None
@@ -1,13 +1,187 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import asyncio
-from typing import List, Optional
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
+from .admission import AdmissionMiddleware, find_admission
+from . import attachments, lifecycle, looplag, metrics, profiling, snapshot, state, tracing
+from .archive import open_archive, path_component
+from .compression import CompressionMiddleware, encode_body
+from .deadline import DeadlineExceeded, DeadlineMiddleware
+from .ratelimit import QueueTimeoutError, governor_stats
+from .resilience import CircuitOpenError, breaker_states
 from .temp_mail_apis import SERVICE_REGISTRY
 
 
-app = FastAPI(title="FakeAccounts Mail API")
+# Startup phase durations in seconds; logged once ready and returned by /readyz
+STARTUP_TIMINGS: Dict[str, float] = {"imports": time.perf_counter() - _IMPORT_STARTED}
+_APP_STARTED = time.perf_counter()
+
+logger = logging.getLogger("uvicorn.error")
+
+# Upper bound for warming a single service at startup
+PREWARM_TIMEOUT = float(os.environ.get("MAIL_PREWARM_TIMEOUT", "10"))
+
+# Domains per service, fetched once during prewarm
+DOMAIN_CATALOG: Dict[str, List[str]] = {}
+
+_ready = asyncio.Event()
+
+# Warm restarts: the domain catalog is saved and restored with the caches
+snapshot.register("domains", lambda: dict(DOMAIN_CATALOG), DOMAIN_CATALOG.update)
+
+
+def _restore_expiry(items):
+    for key, expires_at, info in items:
+        lifecycle.index().add(key, expires_at, **info)
+
+
+# The expiry index too, so addresses created before a restart still expire
+snapshot.register("expiry", lifecycle.index().items, _restore_expiry)
+
+
+async def _warm_service(service_key: str):
+    api = _get_api(service_key)
+    if DOMAIN_CATALOG.get(service_key) and getattr(api, "_domains", False) is None:
+        # Restored from the last snapshot; skip the upstream round trip
+        api._domains = list(DOMAIN_CATALOG[service_key])
+    if hasattr(api, "warm_up"):
+        await api.warm_up()
+    fetch_domains = getattr(api, "_get_domains", None)
+    domains = await fetch_domains() if fetch_domains else getattr(api, "domains", [])
+    DOMAIN_CATALOG[service_key] = list(domains or [])
+
+
+async def prewarm():
+    """Instantiate adapters, open their connection pools and load domain lists"""
+    keys = list(SERVICE_REGISTRY.keys())
+    results = await asyncio.gather(
+        *(asyncio.wait_for(_warm_service(k), PREWARM_TIMEOUT) for k in keys),
+        return_exceptions=True,
+    )
+    for key, result in zip(keys, results):
+        if isinstance(result, BaseException):
+            logger.warning("Prewarm of %s failed: %r", key, result)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    lag_monitor = looplag.install("gateway")
+    if snapshot.enabled():
+        restored = snapshot.restore()
+        STARTUP_TIMINGS["restore"] = time.perf_counter() - started
+        if restored:
+            logger.info("Restored from snapshot: %s", ", ".join(f"{k} {n}" for k, n in restored.items()))
+    started = time.perf_counter()
+    await prewarm()
+    STARTUP_TIMINGS["prewarm"] = time.perf_counter() - started
+    logger.info(
+        "Gateway ready: %s",
+        ", ".join(f"{phase} {secs * 1000:.1f} ms" for phase, secs in STARTUP_TIMINGS.items()),
+    )
+    _ready.set()
+    snapshot_task = snapshot.start_periodic()
+    sweeper = asyncio.create_task(lifecycle.run_sweeper(expire_address))
+    yield
+    _ready.clear()
+    sweeper.cancel()
+    if lag_monitor:
+        lag_monitor.stop()
+    if snapshot_task:
+        snapshot_task.cancel()
+        try:
+            snapshot.save()
+        except Exception as e:
+            logger.warning("Final snapshot failed: %r", e)
+    await asyncio.gather(
+        *(api.close() for api in _ADAPTERS.values() if hasattr(api, "close")),
+        return_exceptions=True,
+    )
+
+
+app = FastAPI(title="FakeAccounts Mail API", lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
+# Opt-in profiling (MAIL_PROFILE); not installed at all when unused
+if profiling.gateway_enabled():
+    app.add_middleware(profiling.ProfilingMiddleware)
+# Per-request deadline, propagated into adapter calls
+app.add_middleware(DeadlineMiddleware)
+# Server span per request (MAIL_TRACE_*); upstream spans become its children
+if tracing.enabled():
+    app.add_middleware(tracing.TracingMiddleware)
+# Outermost: shed excess load before any other work is done
+app.add_middleware(AdmissionMiddleware)
+
+
+@app.exception_handler(CircuitOpenError)
+@app.exception_handler(QueueTimeoutError)
+async def upstream_unavailable_handler(request: Request, exc: CircuitOpenError | QueueTimeoutError):
+    # Upstream is failing fast or saturated; tell clients when to come back
+    return JSONResponse(
+        {"detail": str(exc)}, status_code=503,
+        headers={"Retry-After": str(int(exc.retry_after + 0.999))},
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse({"detail": "Request deadline exceeded"}, status_code=504)
+
+# Fetched message bodies keyed by (service, token, message_id). Each entry holds
+# the serialized JSON payload plus its compressed variants per content-encoding.
+BODY_CACHE = state.cache("body", maxsize=int(os.environ.get("MAIL_BODY_CACHE_SIZE", "512")))
+
+# With a shared backend, expiry times of every created address, so each worker
+# answers 410 and evicts its own state, not only the one that created it
+SHARED_EXPIRY = state.cache("expiry", maxsize=100000) if state.shared() else None
+
+# Mail archive written by MailClient.save_mail; its full-text index backs /search
+ARCHIVE_DIR = os.environ.get("MAIL_ARCHIVE_DIR", os.path.join(os.getcwd(), "mails"))
+
+CACHE_ENTRIES = metrics.Gauge("mail_cache_entries", "Entries per gateway cache", ("cache",))
+CACHE_HITS = metrics.Counter("mail_cache_hits_total", "Cache hits since start", ("cache",))
+CACHE_MISSES = metrics.Counter("mail_cache_misses_total", "Cache misses since start", ("cache",))
+CACHE_HIT_RATIO = metrics.Gauge("mail_cache_hit_ratio", "Hits / lookups since start", ("cache",))
+GATEWAY_IN_FLIGHT = metrics.Gauge("mail_gateway_in_flight", "Requests admitted and running")
+GATEWAY_QUEUED = metrics.Gauge("mail_gateway_queued", "Requests waiting for admission")
+GATEWAY_SHED = metrics.Counter("mail_gateway_shed_total", "Requests rejected with 429 since start")
+STARTUP_SECONDS = metrics.Gauge(
+    "mail_gateway_startup_seconds", "Duration of each startup phase (as in /readyz)", ("phase",))
+ADDRESSES_EXPIRED = metrics.Counter(
+    "mail_addresses_expired_total", "Addresses whose state was evicted on expiry", ("service",))
+
+
+def _collect_gateway():
+    lookups = BODY_CACHE.hits + BODY_CACHE.misses
+    CACHE_ENTRIES.set(len(BODY_CACHE), "body")
+    CACHE_HITS.set_total(BODY_CACHE.hits, "body")
+    CACHE_MISSES.set_total(BODY_CACHE.misses, "body")
+    CACHE_HIT_RATIO.set(BODY_CACHE.hits / lookups if lookups else 0.0, "body")
+    for phase, seconds in STARTUP_TIMINGS.items():
+        STARTUP_SECONDS.set(seconds, phase)
+    admission = find_admission(app)
+    if admission is not None:
+        stats = admission.stats()
+        GATEWAY_IN_FLIGHT.set(stats["in_flight"])
+        GATEWAY_QUEUED.set(stats["queued"])
+        GATEWAY_SHED.set_total(stats["shed"])
+
+
+metrics.add_collector(_collect_gateway)
+
+# Subjects the adapters use for their placeholder error payloads; never cached
+_ERROR_SUBJECTS = {"Error retrieving message", "Not found"}
 
 
 class CreateAddressRequest(BaseModel):
@@ -19,6 +193,7 @@ class CreateAddressResponse(BaseModel):
     email: str
     token: str
     service: str
+    expires_at: Optional[float] = None
 
 
 class Message(BaseModel):
@@ -29,6 +204,13 @@ class Message(BaseModel):
     receive_time: Optional[float] = None
 
 
+class Attachment(BaseModel):
+    id: str
+    filename: str
+    content_type: str
+    size: Optional[int] = None
+
+
 class FetchMessageResponse(BaseModel):
     mail_body: str
     mail_from: str
@@ -36,13 +218,72 @@ class FetchMessageResponse(BaseModel):
     mail_date: Optional[str] = None
     mail_size: Optional[int] = None
     receive_time: Optional[float] = None
+    attachments: List[Attachment] = []
+
+
+class SearchHit(BaseModel):
+    email: str
+    message_id: str
+    service: Optional[str] = None
+    subject: str
+    mail_from: str
+    snippet: str
+    received_at: Optional[str | float] = None
+
+
+# One adapter instance per service, so per-token adapter state (e.g. the
+# TempMail.lol message cache) and fetched domain lists survive across requests
+_ADAPTERS: Dict[str, object] = {}
 
 
 def _get_api(service_key: str):
-    api_class = SERVICE_REGISTRY.get(service_key)
-    if not api_class:
-        raise HTTPException(status_code=404, detail=f"Unknown service '{service_key}'")
-    return api_class()
+    api = _ADAPTERS.get(service_key)
+    if api is None:
+        api_class = SERVICE_REGISTRY.get(service_key)
+        if not api_class:
+            raise HTTPException(status_code=404, detail=f"Unknown service '{service_key}'")
+        api = _ADAPTERS[service_key] = api_class()
+    return api
+
+
+async def _track(service: str, token: str, email: str) -> float:
+    key = (service, token)
+    expires_at = lifecycle.index().track(key, service, email=email)
+    if SHARED_EXPIRY is not None:
+        await state.offload(SHARED_EXPIRY.put, key, {"expires_at": expires_at, "email": email})
+    return expires_at
+
+
+async def _ensure_alive(service: str, token: str):
+    # Expired addresses are gone upstream too; don't spend upstream calls on them
+    key = (service, token)
+    expiry = lifecycle.index()
+    if key not in expiry and not expiry.is_expired(key):
+        shared = None
+        if SHARED_EXPIRY is not None:
+            # Created by another worker: track it here too so our sweeper evicts our state
+            shared = await state.offload(SHARED_EXPIRY.get, key)
+        if shared is not None:
+            expiry.add(key, shared["expires_at"], service=service, email=shared.get("email"))
+        else:
+            # Created elsewhere (another node behind the router, or before a restart):
+            # count its lifetime from now, which errs on the late side
+            expiry.track(key, service)
+    if expiry.is_expired(key):
+        raise HTTPException(status_code=410, detail="Address expired")
+
+
+async def expire_address(key, info: Dict):
+    """Evict the gateway's state for an expired (service, token)"""
+    if not isinstance(key, tuple):
+        return  # an email tracked by a client sharing the process (embedded mode)
+    service, token = key
+    api = _ADAPTERS.get(service)
+    if api is not None and hasattr(api, "forget"):
+        await state.offload(api.forget, token)
+    await state.offload(BODY_CACHE.pop_prefix, key)
+    await asyncio.to_thread(attachments.forget, service, token)
+    ADDRESSES_EXPIRED.inc(service)
 
 
 @app.get("/services", response_model=List[str])
@@ -53,6 +294,8 @@ async def list_services():
 @app.get("/domains", response_model=List[str])
 async def list_domains(service: str = Query(..., description="Service key")):
     api = _get_api(service)
+    if DOMAIN_CATALOG.get(service):
+        return DOMAIN_CATALOG[service]
     try:
         domains = getattr(api, "domains", [])
         if callable(domains):
@@ -70,23 +313,20 @@ async def create_address(req: CreateAddressRequest):
     token = result.get("token")
     if not email or not token:
         raise HTTPException(status_code=502, detail="Service did not return email/token")
-    return CreateAddressResponse(email=email, token=token, service=req.service)
+    expires_at = await _track(req.service, token, email)
+    return CreateAddressResponse(email=email, token=token, service=req.service, expires_at=expires_at)
 
 
 @app.get("/messages", response_model=List[Message])
 async def get_messages(service: str, token: str):
     api = _get_api(service)
+    await _ensure_alive(service, token)
     msgs = await api.get_messages(token)
     return msgs
 
 
-@app.get("/messages/{message_id}")
-async def fetch_message(message_id: str, service: str, token: str):
-    api = _get_api(service)
-    data = await api.fetch_message(token, message_id)
-    # Normalize types to satisfy response model
-    if data is None:
-        raise HTTPException(status_code=502, detail="Empty response from service")
+def _coerce_message(data: Dict) -> Dict:
+    """Normalize adapter output types to satisfy the response model"""
     # Coerce mail_body to string
     body = data.get("mail_body", "")
     if not isinstance(body, str):
@@ -113,8 +353,134 @@ async def fetch_message(message_id: str, service: str, token: str):
     return data
 
 
+async def _load_message(service: str, token: str, message_id: str) -> Dict:
+    """Return the body-cache entry for a message, fetching it on a miss"""
+    key = (service, token, message_id)
+    entry = await state.offload(BODY_CACHE.get, key)
+    if entry is not None:
+        return entry
+    await _ensure_alive(service, token)
+    api = _get_api(service)
+    data = await api.fetch_message(token, message_id)
+    if data is None:
+        raise HTTPException(status_code=502, detail="Empty response from service")
+    data = _coerce_message(data)
+    entry = {
+        "payload": json.dumps(data, ensure_ascii=False).encode("utf-8"),
+        "encoded": {},  # content-encoding -> compressed payload
+    }
+    if data.get("subject") not in _ERROR_SUBJECTS:
+        await state.offload(BODY_CACHE.put, key, entry)
+    return entry
+
+
+def _store_encoded(key, entry: Dict):
+    if key in BODY_CACHE:  # not if it was evicted meanwhile
+        BODY_CACHE.put(key, entry)
+
+
+# The cached payload is returned pre-serialized; the model documents its shape
+@app.get("/messages/{message_id}", response_model=FetchMessageResponse)
+async def fetch_message(message_id: str, service: str, token: str, request: Request):
+    entry = await _load_message(service, token, message_id)
+    known_encodings = len(entry["encoded"])
+    body, encoding = encode_body(
+        entry["payload"], request.headers.get("accept-encoding"), entry["encoded"]
+    )
+    key = (service, token, message_id)
+    if state.shared() and len(entry["encoded"]) > known_encodings:
+        # Entries are copies with a shared backend; store the new encoding for other workers
+        await state.offload(_store_encoded, key, entry)
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/messages/{message_id}/attachments/{attachment_id}")
+async def fetch_attachment(message_id: str, attachment_id: str, service: str, token: str, request: Request):
+    """Attachment bytes streamed in chunks; honours single byte ranges (Range: bytes=a-b)"""
+    api = _get_api(service)
+    await _ensure_alive(service, token)
+    return await attachments.stream(
+        api, service, token, message_id, attachment_id, request.headers.get("range")
+    )
+
+
+def _check_email(email: Optional[str]):
+    # Archive records live under <archive>/<email>/; the name must not leave that directory
+    if email is not None:
+        try:
+            path_component(email)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid email") from None
+
+
+@app.get("/search", response_model=List[SearchHit])
+async def search(
+    q: str = Query(..., min_length=1, description="Free-text query"),
+    email: Optional[str] = None,
+    service: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=1000),
+):
+    _check_email(email)
+    index = open_archive(ARCHIVE_DIR).index
+    return await asyncio.to_thread(index.search, q, email=email, service=service, limit=limit)
+
+
+@app.get("/export")
+async def export_archive(
+    format: str = Query("jsonl", pattern="^(jsonl|mbox)$"),
+    email: Optional[str] = None,
+    service: Optional[str] = None,
+    since: Optional[str] = None,
+):
+    from .export import export_chunks  # rarely used; keep it off the startup path
+
+    _check_email(email)
+    archive = open_archive(ARCHIVE_DIR)
+    chunks = export_chunks(archive, format, email=email, service=service, since=since)
+    if format == "mbox":
+        media_type, filename = "application/mbox", "mails.mbox"
+    else:
+        media_type, filename = "application/gzip", "mails.jsonl.gz"
+    # Sync generator: Starlette iterates it in a worker thread, off the event loop
+    return StreamingResponse(
+        chunks, media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: adapters are warm and the domain catalog is loaded"""
+    body = {"ready": _ready.is_set(), "startup": STARTUP_TIMINGS, "upstreams": breaker_states(),
+            "limits": governor_stats(), "loops": looplag.loop_stats()}
+    admission = find_admission(app)
+    if admission is not None:
+        body["admission"] = admission.stats()
+    if not _ready.is_set():
+        return JSONResponse(body, status_code=503)
+    return body
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of adapter, cache and gateway metrics"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/")
 async def root():
     return {"name": "FakeAccounts Mail API", "services": list(SERVICE_REGISTRY.keys())}
 
 
+STARTUP_TIMINGS["app_creation"] = time.perf_counter() - _APP_STARTED
+
+
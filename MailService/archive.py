@@ -0,0 +1,190 @@
+"""Content-addressed mail archive.
+
+Bodies are hashed (SHA-256), gzip-compressed and stored once under
+``<base>/objects/<aa>/<digest>.gz``. Each message gets a small metadata record
+at ``<base>/<email>/<message_id>.json`` that references its body by digest, so
+identical newsletters sent to many addresses share a single object.
+Saved messages are also added to the full-text index at ``<base>/index.sqlite3``.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from .search_index import SearchIndex
+
+
+OBJECTS_DIR = 'objects'
+INDEX_FILE = 'index.sqlite3'
+GZIP_LEVEL = 6
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Write data to path via a temp file in the same directory plus rename"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def path_component(value) -> str:
+    """value as a single directory entry name; raises ValueError if it could leave its directory"""
+    name = str(value)
+    if name in ('', '.', '..') or '\x00' in name or '/' in name or '\\' in name:
+        raise ValueError(f'invalid archive name {name!r}')
+    return name
+
+
+def body_type(body: str) -> str:
+    """Return 'html' if the body looks like HTML, otherwise 'txt'"""
+    return 'html' if isinstance(body, str) and '<' in body and '>' in body else 'txt'
+
+
+def _index_row(record: Dict, body: str) -> Dict:
+    return {
+        'email': record.get('email'),
+        'message_id': record.get('message_id'),
+        'subject': record.get('subject') or '',
+        'sender': record.get('from') or record.get('mail_from') or '',
+        'body': body,
+        'service': record.get('service'),
+        'received_at': record.get('received_at'),
+    }
+
+
+class MailArchive:
+    """Deduplicating on-disk store for fetched mails."""
+
+    def __init__(self, base_dir: str, indexed: bool = True):
+        self.base_dir = base_dir
+        os.makedirs(os.path.join(base_dir, OBJECTS_DIR), exist_ok=True)
+        self.index: Optional[SearchIndex] = (
+            SearchIndex(os.path.join(base_dir, INDEX_FILE)) if indexed else None
+        )
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.base_dir, OBJECTS_DIR, digest[:2], f"{digest}.gz")
+
+    def _record_path(self, email: str, message_id) -> str:
+        return os.path.join(self.base_dir, path_component(email), f"{path_component(message_id)}.json")
+
+    def put_body(self, body: str) -> str:
+        """Store a body if it is not already present and return its digest"""
+        data = (body or '').encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+        return digest
+
+    def get_body(self, digest: str) -> str:
+        """Return the body stored under digest"""
+        with open(self._object_path(digest), 'rb') as f:
+            return gzip.decompress(f.read()).decode('utf-8')
+
+    def save(self, email: str, message_id, meta: Dict, body: str, index: bool = True) -> Dict:
+        """Archive a message and return its metadata record.
+
+        Pass ``index=False`` for bulk loads and hand the records to
+        :meth:`index_many` in batches instead.
+        """
+        body = body if isinstance(body, str) else ('' if body is None else str(body))
+        record = dict(meta)
+        record['email'] = email
+        record['message_id'] = str(message_id)
+        record['body_sha256'] = self.put_body(body)
+        record['body_type'] = body_type(body)
+        record['body_size'] = len(body.encode('utf-8'))
+        path = self._record_path(email, message_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        if index and self.index is not None:
+            self.index.add(**_index_row(record, body))
+        return record
+
+    def index_many(self, saved: Iterable[Tuple[Dict, str]]) -> int:
+        """Index (record, body) pairs in one transaction"""
+        if self.index is None:
+            return 0
+        return self.index.add_many(_index_row(record, body) for record, body in saved)
+
+    def reindex(self) -> int:
+        """Rebuild index entries for every archived record; returns the count"""
+        if self.index is None:
+            return 0
+        rows = (_index_row(r, self.resolve_body(r).get('body', '')) for r in self.iter_records())
+        return self.index.add_many(rows)
+
+    def load(self, email: str, message_id, with_body: bool = True) -> Optional[Dict]:
+        """Load a message record, resolving its body unless with_body is False"""
+        try:
+            with open(self._record_path(email, message_id), encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if with_body:
+            self.resolve_body(record)
+        return record
+
+    def resolve_body(self, record: Dict) -> Dict:
+        """Fill record['body'] from the object store (legacy records inline it)"""
+        if 'body' not in record and record.get('body_sha256'):
+            try:
+                record['body'] = self.get_body(record['body_sha256'])
+            except OSError:
+                record['body'] = ''
+        return record
+
+    def emails(self) -> Iterator[str]:
+        """Yield archived addresses"""
+        try:
+            entries = sorted(os.scandir(self.base_dir), key=lambda e: e.name)
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir() and entry.name != OBJECTS_DIR and '@' in entry.name:
+                yield entry.name
+
+    def iter_records(self, email: Optional[str] = None) -> Iterator[Dict]:
+        """Yield metadata records (without bodies), optionally for one address"""
+        for addr in ([path_component(email)] if email else self.emails()):
+            email_dir = os.path.join(self.base_dir, addr)
+            try:
+                names = sorted(n for n in os.listdir(email_dir) if n.endswith('.json'))
+            except OSError:
+                continue
+            for name in names:
+                try:
+                    with open(os.path.join(email_dir, name), encoding='utf-8') as f:
+                        record = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                record.setdefault('email', addr)
+                record.setdefault('message_id', name[:-len('.json')])
+                yield record
+
+
+_ARCHIVES: Dict[str, MailArchive] = {}
+_ARCHIVES_LOCK = threading.Lock()
+
+
+def open_archive(base_dir: str) -> MailArchive:
+    """Return a shared MailArchive per directory (keeps the index connection open)"""
+    key = os.path.abspath(base_dir)
+    with _ARCHIVES_LOCK:
+        archive = _ARCHIVES.get(key)
+        if archive is None:
+            archive = _ARCHIVES[key] = MailArchive(key)
+        return archive
@@ -0,0 +1,325 @@
+"""Attachment downloads through the gateway: chunked relay, byte ranges, disk cache.
+
+Bytes are relayed from the provider in CHUNK_SIZE pieces as they arrive,
+so gateway memory stays flat whatever the attachment size. A single
+byte range (Range: bytes=a-b, a- or -n) is forwarded upstream. If the
+provider ignores it, the gateway cuts the range out of the full stream
+itself. Multiple ranges are answered with the whole file, as RFC 9110
+allows.
+
+With a cache directory configured, complete downloads are written to
+disk while they are relayed. Later requests, ranged or not, are then
+served from the file without an upstream call. Files are grouped per
+address, so expiring an address drops its files, and the least recently
+used files go first once the cache is over its size.
+
+    MAIL_ATTACHMENT_CACHE=dir            cache directory ("" disables the cache, the default)
+    MAIL_ATTACHMENT_CACHE_MAX_MB=1024    cache size limit
+    MAIL_ATTACHMENT_CHUNK=65536          bytes per relayed chunk
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+from starlette.exceptions import HTTPException
+from starlette.responses import Response, StreamingResponse
+
+from . import metrics
+
+
+CACHE_DIR = os.environ.get('MAIL_ATTACHMENT_CACHE', '')
+CACHE_MAX_BYTES = int(float(os.environ.get('MAIL_ATTACHMENT_CACHE_MAX_MB', '1024')) * 1024 * 1024)
+CHUNK_SIZE = int(os.environ.get('MAIL_ATTACHMENT_CHUNK', '65536'))
+
+ATTACHMENT_BYTES = metrics.Counter(
+    'mail_attachment_bytes_total', 'Attachment bytes sent to clients', ('source',))
+
+_RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested range lies outside the attachment."""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (first, last) byte of a single-range header; None means the whole body"""
+    match = _RANGE.fullmatch((header or '').strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last n bytes
+        n = int(last)
+        if n == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - n), size - 1
+    first = int(first)
+    last = size - 1 if last == '' else min(int(last), size - 1)
+    if first >= size or first > last:
+        raise RangeNotSatisfiable()
+    return first, last
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+
+class _CacheWriter:
+    """Temp file collecting one download; becomes a cache entry on commit."""
+
+    def __init__(self, cache: 'AttachmentCache', path: str):
+        self.cache = cache
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        self.file = os.fdopen(fd, 'wb')
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self, headers: Dict[str, str], expected: Optional[int]) -> None:
+        self.file.close()
+        if expected is not None and self.size != expected:
+            self.abort()
+            return
+        with open(f'{self.path}.json', 'w', encoding='utf-8') as f:
+            json.dump(headers, f)
+        os.replace(self.tmp_path, self.path)
+        self.cache.added(self.size)
+
+    def abort(self) -> None:
+        self.file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except OSError:
+            pass
+
+
+class AttachmentCache:
+    """Attachment files under <dir>/<address digest>/<attachment digest>, LRU by mtime."""
+
+    def __init__(self, directory: str, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # computed on the first trim
+
+    def _address_dir(self, service: str, token: str) -> str:
+        return os.path.join(self.directory, _digest(service, token))
+
+    def path(self, service: str, token: str, message_id: str, attachment_id: str) -> str:
+        return os.path.join(self._address_dir(service, token), _digest(message_id, attachment_id))
+
+    def lookup(self, service: str, token: str, message_id: str,
+               attachment_id: str) -> Optional[Tuple[str, int, Dict[str, str]]]:
+        """(path, size, response headers) of a cached attachment, marking it recently used"""
+        path = self.path(service, token, message_id, attachment_id)
+        try:
+            with open(f'{path}.json', encoding='utf-8') as f:
+                headers = json.load(f)
+            size = os.path.getsize(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return path, size, headers
+
+    def writer(self, service: str, token: str, message_id: str, attachment_id: str) -> _CacheWriter:
+        return _CacheWriter(self, self.path(service, token, message_id, attachment_id))
+
+    def forget(self, service: str, token: str) -> None:
+        """Drop every cached attachment of an address"""
+        shutil.rmtree(self._address_dir(service, token), ignore_errors=True)
+        with self._lock:
+            self._size = None
+
+    def added(self, size: int) -> None:
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+                if self._size <= self.max_bytes:
+                    return
+            self._trim()
+
+    def _trim(self):
+        # Caller holds the lock; evicts least recently used files beyond max_bytes
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.json') or name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            for victim in (path, f'{path}.json'):
+                try:
+                    os.unlink(victim)
+                except OSError:
+                    pass
+            total -= size
+        self._size = total
+
+
+CACHE: Optional[AttachmentCache] = AttachmentCache(CACHE_DIR) if CACHE_DIR else None
+
+
+def forget(service: str, token: str) -> None:
+    if CACHE is not None:
+        CACHE.forget(service, token)
+
+
+def _iter_file(path: str, first: int, last: int) -> Iterator[bytes]:
+    # Sync generator: Starlette runs it in a worker thread
+    with open(path, 'rb') as f:
+        f.seek(first)
+        left = last - first + 1
+        while left > 0:
+            chunk = f.read(min(CHUNK_SIZE, left))
+            if not chunk:
+                break
+            left -= len(chunk)
+            ATTACHMENT_BYTES.inc('cache', amount=len(chunk))
+            yield chunk
+
+
+def _ranged(status: int, headers: Dict[str, str], size: Optional[int],
+            window: Optional[Tuple[int, int]]) -> Tuple[int, Dict[str, str]]:
+    headers = {**headers, 'Accept-Ranges': 'bytes'}
+    if window is not None:
+        headers['Content-Range'] = f'bytes {window[0]}-{window[1]}/{size}'
+        headers['Content-Length'] = str(window[1] - window[0] + 1)
+        return 206, headers
+    if size is not None:
+        headers['Content-Length'] = str(size)
+    return status, headers
+
+
+def _not_satisfiable(size) -> Response:
+    return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+
+
+def _from_cache(hit: Tuple[str, int, Dict[str, str]], range_header: Optional[str]) -> Response:
+    path, size, headers = hit
+    try:
+        window = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return _not_satisfiable(size)
+    status, headers = _ranged(200, headers, size, window)
+    first, last = window or (0, size - 1)
+    return StreamingResponse(_iter_file(path, first, last), status_code=status, headers=headers)
+
+
+async def _relay(upstream, first: int = 0, last: Optional[int] = None,
+                 cache_key: Optional[Tuple[str, str, str, str]] = None, headers: Optional[Dict[str, str]] = None):
+    """Yield upstream chunks within [first, last], teeing the full body into the cache"""
+    writer = await asyncio.to_thread(CACHE.writer, *cache_key) if cache_key else None
+    expected = upstream.content_length
+    try:
+        pos = 0
+        async for chunk in upstream.content.iter_chunked(CHUNK_SIZE):
+            if writer is not None:
+                await asyncio.to_thread(writer.write, chunk)
+                if writer.size == expected:
+                    # Commit before the last chunk goes out; clients hang up right after it
+                    await asyncio.to_thread(writer.commit, headers or {}, expected)
+                    writer = None
+            lo = max(first - pos, 0)
+            hi = len(chunk) if last is None else min(len(chunk), last + 1 - pos)
+            pos += len(chunk)
+            if lo < hi:
+                piece = chunk if lo == 0 and hi == len(chunk) else chunk[lo:hi]
+                ATTACHMENT_BYTES.inc('upstream', amount=len(piece))
+                yield piece
+            if last is not None and pos > last:
+                break
+        if writer is not None and expected is None:
+            await asyncio.to_thread(writer.commit, headers or {}, None)
+            writer = None
+    finally:
+        # Not awaited: a cancelled stream would cancel the await and leave the temp file behind
+        if writer is not None:
+            writer.abort()
+
+
+class _UpstreamStream(StreamingResponse):
+    """Streaming response that releases its upstream request however the stream ends."""
+
+    def __init__(self, guard, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.guard = guard
+
+    async def __call__(self, scope, receive, send):
+        exc_info = (None, None, None)
+        try:
+            await super().__call__(scope, receive, send)
+        except BaseException as e:
+            exc_info = (type(e), e, e.__traceback__)
+            raise
+        finally:
+            await self.body_iterator.aclose()
+            await self.guard.__aexit__(*exc_info)
+
+
+async def stream(api, service: str, token: str, message_id: str, attachment_id: str,
+                 range_header: Optional[str] = None) -> Response:
+    """Response streaming one attachment, from the disk cache or the provider"""
+    if not api.SUPPORTS_ATTACHMENTS:
+        raise HTTPException(status_code=404, detail=f"Service '{service}' has no attachments")
+    if CACHE is not None:
+        hit = await asyncio.to_thread(CACHE.lookup, service, token, message_id, attachment_id)
+        if hit is not None:
+            return _from_cache(hit, range_header)
+
+    guard = api.open_attachment(token, message_id, attachment_id,
+                                {'Range': range_header} if range_header else None)
+    upstream = await guard.__aenter__()
+    handed_off = False
+    try:
+        if upstream.status in (401, 403, 404):
+            raise HTTPException(status_code=404, detail='Attachment not found')
+        if upstream.status == 416:
+            return _not_satisfiable(upstream.headers.get('Content-Range', 'bytes */*').rpartition('/')[2])
+        if upstream.status not in (200, 206):
+            raise HTTPException(status_code=502, detail=f'Provider answered {upstream.status}')
+
+        headers = {'Content-Type': upstream.headers.get('Content-Type', 'application/octet-stream'),
+                   'Content-Disposition': upstream.headers.get('Content-Disposition', 'attachment')}
+        size = upstream.content_length
+        if upstream.status == 206:
+            out = {**headers, 'Accept-Ranges': 'bytes', 'Content-Range': upstream.headers.get('Content-Range', '')}
+            if size is not None:
+                out['Content-Length'] = str(size)
+            handed_off = True
+            return _UpstreamStream(guard, _relay(upstream), status_code=206, headers=out)
+
+        # Full body: cut the range out ourselves if the provider ignored it
+        window = None
+        if range_header and size is not None:
+            try:
+                window = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                return _not_satisfiable(size)
+        cache_key = (service, token, message_id, attachment_id) if CACHE is not None and window is None else None
+        status, out = _ranged(200, headers, size, window)
+        first, last = window or (0, None)
+        handed_off = True
+        return _UpstreamStream(guard, _relay(upstream, first, last, cache_key, headers),
+                               status_code=status, headers=out)
+    finally:
+        if not handed_off:
+            await guard.__aexit__(*sys.exc_info())
@@ -0,0 +1,129 @@
+"""Content-encoding negotiation and response compression for the Mail API"""
+import gzip
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli  # Optional - enables 'br' when installed
+except ImportError:
+    brotli = None
+
+
+# Bodies below this size are sent as-is (short header lists gain nothing)
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def supported_encodings() -> List[str]:
+    """Return supported encodings in server preference order"""
+    if brotli is not None:
+        return ['br', 'gzip']
+    return ['gzip']
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+
+    best, best_q = None, 0.0
+    for encoding in supported_encodings():
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress data with the given content-encoding"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        # mtime=0 keeps output deterministic so cached bytes are reusable
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported encoding '{encoding}'")
+
+
+def encode_body(data: bytes, accept_encoding: Optional[str],
+                cache: Optional[Dict[str, bytes]] = None) -> Tuple[bytes, Optional[str]]:
+    """Return (body, encoding) for a response, reusing cached encodings if given"""
+    if len(data) < MIN_COMPRESS_SIZE:
+        return data, None
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return data, None
+    if cache is not None and encoding in cache:
+        return cache[encoding], encoding
+    encoded = compress(data, encoding)
+    if cache is not None:
+        cache[encoding] = encoded
+    return encoded, encoding
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete responses above a size threshold.
+
+    Streamed responses (more than one body chunk), byte-addressed responses
+    (Accept-Ranges) and responses that already carry a Content-Encoding are
+    passed through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = MIN_COMPRESS_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get('accept-encoding'))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message['type'] == 'http.response.start':
+                start_message = message
+                return
+            if message['type'] != 'http.response.body' or passthrough:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            headers = MutableHeaders(raw=start_message['headers'])
+            if (message.get('more_body', False) or 'content-encoding' in headers
+                    or 'accept-ranges' in headers or len(body) < self.minimum_size):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            headers['Content-Encoding'] = encoding
+            headers['Content-Length'] = str(len(body))
+            headers.add_vary_header('Accept-Encoding')
+            await send(start_message)
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, send_wrapper)
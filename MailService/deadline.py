@@ -0,0 +1,145 @@
+"""Per-request deadlines propagated from the gateway into the adapters"""
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+# Header carrying the client's remaining budget in seconds
+DEADLINE_HEADER = 'x-request-timeout'
+DEFAULT_DEADLINE = float(os.environ.get('MAIL_REQUEST_DEADLINE', '20'))
+MAX_DEADLINE = float(os.environ.get('MAIL_MAX_REQUEST_DEADLINE', '60'))
+
+# Absolute time.monotonic() deadline of the current request, if any
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('mail_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the current request has no time left for upstream work."""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check() -> Optional[float]:
+    """Return the remaining time, raising DeadlineExceeded once it is used up"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded('request deadline exceeded')
+    return left
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Run the block under a deadline; an enclosing tighter deadline wins"""
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def parse_timeout(value: Optional[str]) -> float:
+    """Deadline in seconds for a header value, clamped to MAX_DEADLINE"""
+    try:
+        seconds = float(value) if value else DEFAULT_DEADLINE
+    except ValueError:
+        seconds = DEFAULT_DEADLINE
+    return min(max(seconds, 0.0), MAX_DEADLINE)
+
+
+class DeadlineMiddleware:
+    """ASGI middleware bounding each request by its deadline.
+
+    The deadline comes from the X-Request-Timeout header or
+    MAIL_REQUEST_DEADLINE. The handler is cancelled, releasing upstream
+    connections and slots, when the client disconnects or when the deadline
+    passes before the response has started (answered with 504). Responses
+    that are already streaming are only cancelled on disconnect.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get('headers') or [])
+        seconds = parse_timeout(headers.get(DEADLINE_HEADER.encode(), b'').decode('latin-1'))
+
+        # Buffer the (small) request body so the real receive channel can be
+        # watched for a disconnect while the handler runs
+        messages = []
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message['type'] != 'http.request' or not message.get('more_body', False):
+                break
+        if messages[-1]['type'] == 'http.disconnect':
+            return
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        started = False
+        disconnected = asyncio.Event()
+
+        async def send_wrapper(message):
+            nonlocal started
+            if message['type'] == 'http.response.start':
+                started = True
+            await send(message)
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        with deadline_scope(seconds):
+            handler = asyncio.ensure_future(self.app(scope, replay, send_wrapper))
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            done, _ = await asyncio.wait({handler, watcher}, timeout=seconds,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if handler not in done and not watcher.done() and started:
+                # Streaming response: no deadline, but stop if the client goes away
+                await asyncio.wait({handler, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not handler.done():
+                handler.cancel()
+                try:
+                    await handler
+                except asyncio.CancelledError:
+                    pass
+                if not started and not disconnected.is_set():
+                    await _send_timeout(send)
+            else:
+                handler.result()
+        finally:
+            watcher.cancel()
+            if not handler.done():
+                handler.cancel()
+
+
+async def _send_timeout(send):
+    body = b'{"detail":"Request deadline exceeded"}'
+    await send({
+        'type': 'http.response.start',
+        'status': 504,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,90 @@
+"""In-process gateway for Python clients.
+
+Runs the same handlers, adapters and caches as api_server.py, but in the
+calling process: no uvicorn subprocess to start and no loopback HTTP hop per
+call. The adapters are async, so calls are executed on a private event loop
+running in a daemon thread; the public methods are synchronous.
+"""
+import asyncio
+import json
+import threading
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+from . import api_server, lifecycle
+from .deadline import DEFAULT_DEADLINE, DeadlineExceeded, deadline_scope
+from .ratelimit import QueueTimeoutError
+from .resilience import CircuitOpenError
+
+
+class GatewayError(Exception):
+    """Raised where the HTTP API would answer with an error status."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def _with_deadline(coro, timeout: float):
+    # Same deadline semantics as the HTTP gateway: adapters see the remaining
+    # budget and the call is cancelled once it runs out
+    with deadline_scope(timeout):
+        return await asyncio.wait_for(coro, timeout)
+
+
+class EmbeddedGateway:
+    """Synchronous facade over the gateway handlers."""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="embedded-gateway", daemon=True)
+        self._thread.start()
+        # No lifespan runs in embedded mode; evict expired addresses ourselves
+        self._sweeper = asyncio.run_coroutine_threadsafe(lifecycle.run_sweeper(api_server.expire_address), self._loop)
+
+    def _run(self, coro, timeout: float = DEFAULT_DEADLINE):
+        future = asyncio.run_coroutine_threadsafe(_with_deadline(coro, timeout), self._loop)
+        try:
+            return future.result()
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            raise GatewayError(504, "Request deadline exceeded") from None
+        except HTTPException as e:
+            raise GatewayError(e.status_code, str(e.detail)) from None
+        except (CircuitOpenError, QueueTimeoutError) as e:
+            raise GatewayError(503, str(e)) from None
+
+    def list_services(self) -> List[str]:
+        return self._run(api_server.list_services())
+
+    def create_address(self, service: str, domain: Optional[str] = None) -> Dict:
+        req = api_server.CreateAddressRequest(service=service, domain=domain)
+        return self._run(api_server.create_address(req)).model_dump()
+
+    def list_messages(self, service: str, token: str) -> List[Dict]:
+        msgs = self._run(api_server.get_messages(service, token)) or []
+        # Same shape the HTTP response model produces
+        return [api_server.Message.model_validate(m).model_dump() for m in msgs]
+
+    def fetch_message(self, service: str, token: str, message_id: str) -> Dict:
+        entry = self._run(api_server._load_message(service, token, str(message_id)))
+        return json.loads(entry["payload"])
+
+    def close(self):
+        self._sweeper.cancel()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_gateway: Optional[EmbeddedGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> EmbeddedGateway:
+    """Return the process-wide embedded gateway, starting it on first use"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = EmbeddedGateway()
+        return _gateway
@@ -0,0 +1,224 @@
+"""Streaming export/import of the mail archive (mbox or gzip-compressed JSONL).
+
+Everything here is a generator pipeline: records are read, rendered and
+compressed one message at a time, so memory stays flat regardless of archive
+size.
+
+Usage:
+    python -m MailService.export export --format jsonl -o mails.jsonl.gz
+    python -m MailService.export export --format mbox --email a@b.c -o a.mbox
+    python -m MailService.export import mails.jsonl.gz
+"""
+import argparse
+import email
+import email.policy
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from email.generator import BytesGenerator
+from email.message import EmailMessage
+from email.utils import parseaddr
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional
+
+from .archive import MailArchive, open_archive, path_component
+
+
+FORMATS = ('jsonl', 'mbox')
+# Derived by MailArchive.save; not carried over as metadata on import
+_DERIVED_KEYS = ('email', 'message_id', 'body', 'body_sha256', 'body_type', 'body_size')
+IMPORT_BATCH_SIZE = 500
+# mboxrd: From_ lines in a message gain one '>' on export and lose one on import
+_FROM_QUOTE = re.compile(rb'^(>*From )', re.MULTILINE)
+_FROM_QUOTED = re.compile(rb'^>(>*From )')
+
+
+def iter_messages(archive: MailArchive, email: Optional[str] = None, service: Optional[str] = None,
+                  since: Optional[str] = None) -> Iterator[Dict]:
+    """Yield archived records with their bodies, optionally filtered"""
+    for record in archive.iter_records(email):
+        if service and record.get('service') != service:
+            continue
+        if since and str(record.get('received_at') or '') < since:
+            continue
+        yield archive.resolve_body(record)
+
+
+def jsonl_gz_chunks(records: Iterable[Dict]) -> Iterator[bytes]:
+    """Render records as gzip-compressed JSON lines, chunk by chunk"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for record in records:
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        chunk = compressor.compress(line.encode('utf-8'))
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def _to_email_message(record: Dict) -> EmailMessage:
+    msg = EmailMessage()
+    msg['From'] = str(record.get('from') or record.get('mail_from') or 'unknown')
+    msg['To'] = record.get('email', '')
+    msg['Subject'] = str(record.get('subject') or '')
+    msg['X-Message-Id'] = str(record.get('message_id', ''))
+    if record.get('service'):
+        msg['X-Mail-Service'] = record['service']
+    if record.get('received_at'):
+        msg['X-Received-At'] = str(record['received_at'])
+    subtype = 'html' if record.get('body_type') == 'html' else 'plain'
+    # Always end with a newline that import strips again; set_content only adds one when missing
+    msg.set_content((record.get('body') or '') + '\n', subtype=subtype, cte='8bit')
+    return msg
+
+
+def _mbox_date(received_at) -> str:
+    # received_at is local 'YYYY-MM-DD HH:MM:SS' as written by save_mail, or a timestamp
+    try:
+        if isinstance(received_at, (int, float)):
+            return time.asctime(time.localtime(received_at))
+        return time.asctime(time.strptime(str(received_at)[:19], '%Y-%m-%d %H:%M:%S'))
+    except (ValueError, OverflowError, OSError):
+        return time.asctime()
+
+
+def mbox_chunks(records: Iterable[Dict]) -> Iterator[bytes]:
+    """Render records as an mboxrd stream, one message per chunk"""
+    for record in records:
+        buf = io.BytesIO()
+        BytesGenerator(buf, mangle_from_=False, policy=email.policy.SMTPUTF8.clone(linesep='\n')).flatten(
+            _to_email_message(record)
+        )
+        sender = parseaddr(str(record.get('from') or record.get('mail_from') or ''))[1] or 'MAILER-DAEMON'
+        from_line = f"From {sender} {_mbox_date(record.get('received_at'))}\n".encode('utf-8')
+        yield from_line + _FROM_QUOTE.sub(rb'>\1', buf.getvalue()) + b'\n'
+
+
+def export_chunks(archive: MailArchive, fmt: str, **filters) -> Iterator[bytes]:
+    """Stream the (filtered) archive in the given format"""
+    records = iter_messages(archive, **filters)
+    if fmt == 'jsonl':
+        return jsonl_gz_chunks(records)
+    if fmt == 'mbox':
+        return mbox_chunks(records)
+    raise ValueError(f"Unknown export format '{fmt}'")
+
+
+def iter_jsonl(fileobj: BinaryIO) -> Iterator[Dict]:
+    """Yield records from a JSONL stream (gzip-compressed or plain)"""
+    head = fileobj.peek(2)[:2] if hasattr(fileobj, 'peek') else b''
+    stream = gzip.GzipFile(fileobj=fileobj) if head == b'\x1f\x8b' else fileobj
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_mbox(fileobj: BinaryIO) -> Iterator[Dict]:
+    """Yield records from an mbox stream, one message at a time"""
+    lines = []
+    for line in fileobj:
+        if line.startswith(b'From ') and (not lines or lines[-1] in (b'\n', b'\r\n')):
+            if lines:
+                yield _mbox_record(lines[:-1])  # without the separating blank line
+            lines = []
+            continue
+        lines.append(line)
+    if lines:
+        yield _mbox_record(lines[:-1] if lines[-1] in (b'\n', b'\r\n') else lines)
+
+
+def _mbox_record(lines) -> Dict:
+    # Undo one level of From_ quoting (mboxrd)
+    raw = b''.join(_FROM_QUOTED.sub(rb'\1', line) for line in lines)
+    msg = email.message_from_bytes(raw, policy=email.policy.default)
+    part = msg.get_body(preferencelist=('html', 'plain')) or msg
+    return {
+        'email': str(msg.get('To', '')),
+        'message_id': str(msg.get('X-Message-Id', '')),
+        'subject': str(msg.get('Subject', '')),
+        'from': str(msg.get('From', '')),
+        'service': msg.get('X-Mail-Service'),
+        'received_at': msg.get('X-Received-At'),
+        'body': _strip_newline(part.get_content()) if part.get_content_maintype() == 'text' else '',
+    }
+
+
+def _strip_newline(body: str) -> str:
+    # Only the newline added on export; the body's own trailing whitespace stays
+    return body[:-1] if body.endswith('\n') else body
+
+
+def import_records(archive: MailArchive, records: Iterable[Dict]) -> int:
+    """Bulk-load records into the archive; the index is updated in batches"""
+    count = 0
+    batch = []
+    for record in records:
+        if not record.get('email') or not record.get('message_id'):
+            continue
+        try:
+            path_component(record['email'])
+            path_component(record['message_id'])
+        except ValueError:
+            continue  # would be written outside the archive
+        meta = {k: v for k, v in record.items() if k not in _DERIVED_KEYS and v is not None}
+        body = record.get('body') or ''
+        saved = archive.save(record['email'], record['message_id'], meta, body, index=False)
+        batch.append((saved, body))
+        count += 1
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            archive.index_many(batch)
+            batch = []
+    if batch:
+        archive.index_many(batch)
+    return count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Export or import the mail archive')
+    parser.add_argument('--archive', default=os.environ.get('MAIL_ARCHIVE_DIR', os.path.join(os.getcwd(), 'mails')),
+                        help='Archive directory (default: ./mails)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    exp = sub.add_parser('export', help='Stream the archive to a file or stdout')
+    exp.add_argument('--format', choices=FORMATS, default='jsonl')
+    exp.add_argument('--email')
+    exp.add_argument('--service')
+    exp.add_argument('--since', help="Only mails received at or after 'YYYY-MM-DD[ HH:MM:SS]'")
+    exp.add_argument('-o', '--output', help='Output file (default: stdout)')
+
+    imp = sub.add_parser('import', help='Bulk-load an export back into the archive')
+    imp.add_argument('input', help="Export file ('-' for stdin)")
+    imp.add_argument('--format', choices=FORMATS, help='Input format (default: from file name)')
+
+    args = parser.parse_args(argv)
+    archive = open_archive(args.archive)
+
+    if args.command == 'export':
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in export_chunks(archive, args.format, email=args.email,
+                                       service=args.service, since=args.since):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+        return 0
+
+    fmt = args.format or ('mbox' if args.input.endswith('.mbox') else 'jsonl')
+    src = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    try:
+        records = iter_mbox(src) if fmt == 'mbox' else iter_jsonl(src)
+        count = import_records(archive, records)
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+    print(f"Imported {count} mails into {archive.base_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
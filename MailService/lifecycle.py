@@ -0,0 +1,171 @@
+"""Expiry index for temp addresses: when each address dies and what to do then.
+
+Every adapter declares how long its addresses live (EXPIRATION_SECONDS).
+The index keeps one min-heap entry per tracked address, keyed by
+created_at + TTL, so the next address to expire is always on top. That
+makes the per-tick check O(1) and each expiry O(log n). Pollers ask
+the index before polling. When an address expires, its owner stops
+polling it, archives what it still holds and evicts its state:
+
+    GUI (tempgen)         archives cached mails to mails/ and drops the address
+    MailClient, watcher   stop the poll loop for the address
+    gateway               sweeper drops cached bodies and adapter state, answers 410
+
+With a shared state backend (MAIL_STATE=sqlite), gateway workers also
+publish expiry times in the shared "expiry" cache. A worker that first
+sees a token created by another worker tracks it from there. Tokens the
+gateway has no record of (created on another node, or before a restart)
+are tracked from when it first sees them.
+
+    MAIL_EXPIRY_GRACE=60     seconds past the TTL before an address counts as expired
+    MAIL_EXPIRY_SWEEP=30     longest the gateway sweeper sleeps between checks
+
+Keys are whatever the caller polls by: email addresses in the clients,
+(service, token) pairs in the gateway.
+"""
+import asyncio
+import heapq
+import inspect
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .cache import LRUCache
+from .temp_mail_apis import SERVICE_REGISTRY
+
+
+DEFAULT_TTL = 3600
+GRACE = float(os.environ.get('MAIL_EXPIRY_GRACE', '60'))
+SWEEP_INTERVAL = float(os.environ.get('MAIL_EXPIRY_SWEEP', '30'))
+
+logger = logging.getLogger(__name__)
+
+
+def ttl(service_key: str) -> int:
+    """Address lifetime in seconds declared by a service's adapter"""
+    try:
+        api_class = SERVICE_REGISTRY[service_key]
+    except (KeyError, ImportError, AttributeError):
+        return DEFAULT_TTL
+    return getattr(api_class, 'EXPIRATION_SECONDS', DEFAULT_TTL)
+
+
+class ExpiryIndex:
+    """Min-heap of (expires_at, key) with lazy deletion; thread-safe."""
+
+    def __init__(self, grace: float = GRACE, remember: int = 10000):
+        self.grace = grace
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._entries: Dict[Hashable, Tuple[float, int, Dict]] = {}
+        # Expired keys stay recognisable for a while after leaving the heap
+        self._expired = LRUCache(maxsize=remember)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, key: Hashable, expires_at: float, **info) -> float:
+        """Track key until expires_at, replacing any earlier entry"""
+        seq = next(self._seq)
+        with self._lock:
+            self._entries[key] = (expires_at, seq, info)
+            self._expired.pop(key)
+            heapq.heappush(self._heap, (expires_at, seq, key))
+            # Replaced and discarded entries linger in the heap; rebuild once they dominate
+            if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+                self._heap = [(e, s, k) for k, (e, s, _) in self._entries.items()]
+                heapq.heapify(self._heap)
+        return expires_at
+
+    def track(self, key: Hashable, service: str, created_at: Optional[float] = None, **info) -> float:
+        """Track an address of service created at created_at (default now)"""
+        created_at = time.time() if created_at is None else created_at
+        return self.add(key, created_at + ttl(service), service=service, **info)
+
+    def track_created(self, key: Hashable, created: Dict) -> float:
+        """Track an address from a gateway /address response"""
+        if created.get('expires_at'):
+            return self.add(key, created['expires_at'], service=created.get('service'))
+        return self.track(key, created.get('service'))
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def expires_at(self, key: Hashable) -> Optional[float]:
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def is_expired(self, key: Hashable, now: Optional[float] = None) -> bool:
+        """Whether key is past its TTL plus grace; untracked keys never are"""
+        if key in self._expired:
+            return True
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] + self.grace <= (time.time() if now is None else now)
+
+    def next_expiry(self) -> Optional[float]:
+        """When the next tracked key expires, grace included"""
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] + self.grace if self._heap else None
+
+    def pop_expired(self, now: Optional[float] = None) -> List[Tuple[Hashable, Dict]]:
+        """Remove and return (key, info) for every key past its TTL plus grace"""
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            while True:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] + self.grace > now:
+                    break
+                _, _, key = heapq.heappop(self._heap)
+                info = self._entries.pop(key)[2]
+                self._expired.put(key, True)
+                expired.append((key, info))
+        return expired
+
+    def _drop_stale(self):
+        # Caller holds the lock; pops heap entries that were replaced or discarded
+        heap = self._heap
+        while heap:
+            expires_at, seq, key = heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == seq:
+                return
+            heapq.heappop(heap)
+
+    def items(self) -> List[Tuple[Hashable, float, Dict]]:
+        with self._lock:
+            return [(k, e, dict(info)) for k, (e, _, info) in self._entries.items()]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_INDEX = ExpiryIndex()
+
+
+def index() -> ExpiryIndex:
+    """The process-wide index shared by the GUI, the clients and the gateway"""
+    return _INDEX
+
+
+async def run_sweeper(on_expire: Callable[[Hashable, Dict], Any], expiry: Optional[ExpiryIndex] = None,
+                      max_sleep: float = SWEEP_INTERVAL):
+    """Call on_expire(key, info) for each key as it expires; on_expire may be async"""
+    expiry = _INDEX if expiry is None else expiry
+    while True:
+        for key, info in expiry.pop_expired():
+            try:
+                result = on_expire(key, info)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning('Expiring %r failed: %r', key, e)
+        upcoming = expiry.next_expiry()
+        delay = max_sleep if upcoming is None else min(max_sleep, upcoming - time.time())
+        await asyncio.sleep(max(0.05, delay))
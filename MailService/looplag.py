@@ -0,0 +1,126 @@
+"""Event-loop lag monitor for the GUI (qasync) and gateway (uvicorn) loops.
+
+A heartbeat task sleeps INTERVAL seconds at a time on the monitored loop;
+how late it wakes up is the loop's lag, recorded per loop in the
+mail_event_loop_lag_seconds histogram. A watchdog thread notices when the
+heartbeat is overdue by more than THRESHOLD and snapshots the loop
+thread's stack while the offending callback is still running. When the
+loop recovers, the stall's duration and that stack are logged.
+
+    MAIL_LOOP_LAG=0                 disable the monitor (on by default)
+    MAIL_LOOP_LAG_INTERVAL=0.05     heartbeat period in seconds
+    MAIL_LOOP_LAG_THRESHOLD=0.1     lag above which a stall is logged with its stack
+    MAIL_LOOP_LAG_LOG=path          also append stall reports to this file
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+from . import metrics
+
+
+ENABLED = os.environ.get('MAIL_LOOP_LAG', '1') != '0'
+INTERVAL = float(os.environ.get('MAIL_LOOP_LAG_INTERVAL', '0.05'))
+THRESHOLD = float(os.environ.get('MAIL_LOOP_LAG_THRESHOLD', '0.1'))
+LOG_FILE = os.environ.get('MAIL_LOOP_LAG_LOG')
+
+# Healthy loops lag well under a millisecond; stalls run into seconds
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LOOP_LAG = metrics.Histogram(
+    'mail_event_loop_lag_seconds', 'How late the loop heartbeat woke up', ('loop',), LAG_BUCKETS)
+LOOP_STALLS = metrics.Counter(
+    'mail_event_loop_stalls_total', 'Heartbeats later than the stall threshold', ('loop',))
+
+logger = logging.getLogger(__name__)
+if LOG_FILE:
+    _handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger.addHandler(_handler)
+
+_MONITORS: Dict[str, 'LoopMonitor'] = {}
+
+
+class LoopMonitor:
+    """Heartbeat on one event loop plus a watchdog thread capturing stall stacks."""
+
+    def __init__(self, name: str, interval: float = INTERVAL, threshold: float = THRESHOLD):
+        self.name = name
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._stack: Optional[str] = None  # captured during the current stall
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog = threading.Thread(target=self._watch, name=f'looplag-{name}', daemon=True)
+
+    def start(self) -> 'LoopMonitor':
+        """Start monitoring the running loop; call from a coroutine on it"""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._beat = now
+            with self._lock:
+                stack, self._stack = self._stack, None
+            LOOP_LAG.observe(lag, self.name)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                self._report(lag, stack)
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            overdue = time.monotonic() - self._beat - self.interval
+            if overdue <= self.threshold or self._stack is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame))
+            with self._lock:
+                self._stack = stack
+
+    def _report(self, lag: float, stack: Optional[str]):
+        self.stalls += 1
+        LOOP_STALLS.inc(self.name)
+        if stack:
+            logger.warning('%s event loop stalled for %.0f ms; blocked in:\n%s', self.name, lag * 1000, stack)
+        else:
+            logger.warning('%s event loop stalled for %.0f ms', self.name, lag * 1000)
+
+    def stats(self) -> Dict[str, float]:
+        return {'stalls': self.stalls, 'max_lag_ms': round(self.max_lag * 1000, 1)}
+
+
+def install(name: str) -> Optional[LoopMonitor]:
+    """Monitor the running loop under name, unless disabled via MAIL_LOOP_LAG=0"""
+    if not ENABLED:
+        return None
+    monitor = _MONITORS[name] = LoopMonitor(name).start()
+    return monitor
+
+
+def loop_stats() -> Dict[str, Dict[str, float]]:
+    return {name: m.stats() for name, m in _MONITORS.items()}
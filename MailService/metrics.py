@@ -0,0 +1,196 @@
+"""In-process metrics with Prometheus text exposition.
+
+A deliberately small subset of the Prometheus client model (counters,
+gauges and histograms with fixed label names) so the adapters can record
+metrics without extra dependencies. The gateway serves render() on
+/metrics. The GUI and CLI can dump it to MAIL_METRICS_FILE on exit.
+"""
+import atexit
+import os
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Upstream latencies range from a few ms (cached pools) to the 20 s deadline
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f'{self.name} expects labels {self.label_names}')
+        return tuple(str(v) for v in labels)
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_labels(self.label_names, k)} {_number(v)}' for k, v in items]
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}'] + self.samples()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, *labels: str) -> None:
+        """Mirror a running total kept elsewhere (from a collector); it must never go down"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        # label values -> [bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                le = 'le="%s"' % _number(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {_number(series[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, key)} {series[-1]}')
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+_COLLECTORS: List[Callable[[], None]] = []
+
+
+def add_collector(fn: Callable[[], None]) -> None:
+    """Register a callback that refreshes gauges right before rendering"""
+    _COLLECTORS.append(fn)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)"""
+    for collect in list(_COLLECTORS):
+        try:
+            collect()
+        except Exception:
+            pass
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def dump(path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(render())
+
+
+# Adapter-layer metrics, shared by the gateway, the GUI and the CLI
+UPSTREAM_LATENCY = Histogram(
+    'mail_upstream_operation_seconds', 'Latency of adapter operations', ('service', 'operation'))
+UPSTREAM_ERRORS = Counter(
+    'mail_upstream_errors_total', 'Failed adapter operations by error type', ('service', 'operation', 'error'))
+UPSTREAM_IN_FLIGHT = Gauge(
+    'mail_upstream_in_flight', 'Adapter operations currently running', ('service',))
+UPSTREAM_REQUESTS = Counter(
+    'mail_upstream_http_requests_total', 'HTTP requests sent upstream by status', ('service', 'status'))
+UPSTREAM_SLOTS_IN_USE = Gauge(
+    'mail_upstream_slots_in_use', 'Concurrency slots in use per upstream', ('service',))
+UPSTREAM_SLOTS_LIMIT = Gauge(
+    'mail_upstream_slots_limit', 'Concurrency slot limit per upstream', ('service',))
+UPSTREAM_QUEUE_DEPTH = Gauge(
+    'mail_upstream_queue_depth', 'Requests waiting for a rate-limit token or slot', ('service',))
+UPSTREAM_BREAKER_OPEN = Gauge(
+    'mail_upstream_circuit_open', '1 while the circuit breaker is not closed', ('service',))
+
+
+def _collect_upstreams() -> None:
+    # Imported on first collection so this module imports nothing else from the package
+    from .ratelimit import _GOVERNORS
+    from .resilience import _BREAKERS
+
+    for service, governor in list(_GOVERNORS.items()):
+        UPSTREAM_SLOTS_IN_USE.set(governor.in_flight, service)
+        UPSTREAM_SLOTS_LIMIT.set(governor.max_concurrency, service)
+        UPSTREAM_QUEUE_DEPTH.set(governor.waiting, service)
+    for service, breaker in list(_BREAKERS.items()):
+        UPSTREAM_BREAKER_OPEN.set(0 if breaker.state == breaker.CLOSED else 1, service)
+
+
+add_collector(_collect_upstreams)
+
+if os.environ.get('MAIL_METRICS_FILE'):
+    atexit.register(dump, os.environ['MAIL_METRICS_FILE'])
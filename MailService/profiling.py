@@ -0,0 +1,167 @@
+"""Opt-in profiling of gateway endpoints and GUI refresh ticks.
+
+Nothing is installed unless enabled:
+
+    MAIL_PROFILE=/messages,/address     profile these gateway paths ("*" = all)
+    MAIL_PROFILE=gui.refresh            profile the GUI auto-refresh tick
+    MAIL_PROFILE_HEADER=1               also profile requests sent with "X-Profile: 1"
+    MAIL_PROFILE_MODE=sample|cprofile   stack sampler (default) or cProfile
+    MAIL_PROFILE_DIR=profiles           where results are written
+
+The sampler snapshots the profiled thread's stack every
+MAIL_PROFILE_INTERVAL seconds from a watchdog thread. It writes collapsed
+stacks ("a;b;c 12" per line) that flamegraph.pl or speedscope read
+directly. cProfile mode writes a .prof file for pstats/snakeviz instead.
+Both see everything the event loop runs meanwhile, not just the profiled
+request.
+"""
+import cProfile
+import collections
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from typing import Counter, Optional
+
+
+TARGETS = {t.strip() for t in os.environ.get('MAIL_PROFILE', '').split(',') if t.strip()}
+HEADER_TRIGGER = os.environ.get('MAIL_PROFILE_HEADER', '') == '1'
+MODE = os.environ.get('MAIL_PROFILE_MODE', 'sample')
+PROFILE_DIR = os.environ.get('MAIL_PROFILE_DIR', 'profiles')
+INTERVAL = float(os.environ.get('MAIL_PROFILE_INTERVAL', '0.002'))
+
+_sequence = itertools.count(1)
+# Only one cProfile can be active per interpreter; overlapping profiles sample instead
+_cprofile_lock = threading.Lock()
+
+
+def enabled(name: str) -> bool:
+    """Whether the given endpoint path or named section is being profiled"""
+    return '*' in TARGETS or name in TARGETS
+
+
+def gateway_enabled() -> bool:
+    """Whether the gateway needs the profiling middleware at all"""
+    return HEADER_TRIGGER or any(t == '*' or t.startswith('/') for t in TARGETS)
+
+
+def _output_path(name: str, suffix: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_') or 'root'
+    return os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{next(_sequence):04d}-{slug}{suffix}")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter[str] = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(labels))] += 1
+            self.samples += 1
+
+    def start(self) -> 'StackSampler':
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def write_collapsed(self, path: str) -> str:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class Profile:
+    """Profile a block of code (sync or spanning awaits) and write the result on exit."""
+
+    def __init__(self, name: str, mode: str = MODE, path: Optional[str] = None):
+        if mode == 'cprofile' and not _cprofile_lock.acquire(blocking=False):
+            mode = 'sample'
+        self.name = name
+        self.mode = mode
+        self.path = path or _output_path(name, '.prof' if mode == 'cprofile' else '.collapsed')
+        self._sampler: Optional[StackSampler] = None
+        self._profiler: Optional[cProfile.Profile] = None
+
+    def __enter__(self) -> 'Profile':
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler().start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._profiler is not None:
+            self._profiler.disable()
+            _cprofile_lock.release()
+            self._profiler.dump_stats(self.path)
+        else:
+            self._sampler.stop()
+            self._sampler.write_collapsed(self.path)
+        return False
+
+
+async def profiled(name: str, coro):
+    """Await a coroutine under a Profile"""
+    with Profile(name):
+        return await coro
+
+
+def maybe_profiled(name: str, coro):
+    """Return the coroutine itself unless profiling of name is enabled"""
+    return profiled(name, coro) if enabled(name) else coro
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling selected endpoints; adds an X-Profile-File header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        path = scope['path']
+        wanted = enabled(path) or (HEADER_TRIGGER and dict(scope['headers']).get(b'x-profile') == b'1')
+        if not wanted:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(f"{scope['method']}{path}")
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                message = {**message, 'headers': list(message.get('headers', [])) + [
+                    (b'x-profile-file', profile.path.encode())]}
+            await send(message)
+
+        with profile:
+            await self.app(scope, receive, send_wrapper)
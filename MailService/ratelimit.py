@@ -0,0 +1,209 @@
+"""Outbound rate limiting and concurrency caps per upstream service"""
+import asyncio
+import collections
+import threading
+import time
+from typing import Deque, Dict, Optional, Tuple
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a request would wait longer than allowed for an upstream slot."""
+
+    def __init__(self, service: str, retry_after: float):
+        super().__init__(f"{service} is busy (rate limit queue full, retry in {retry_after:.1f}s)")
+        self.service = service
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens/s up to ``burst``.
+
+    Tokens are reserved rather than polled: the balance may go negative and
+    each caller sleeps until its own token is due, so waiters are served in
+    arrival order without a wake-up storm.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Reserve one token; returns the delay before using it, or None if above max_wait"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            delay = max(0.0, (1.0 - self.tokens) / self.rate)
+            if delay > max_wait:
+                return None
+            self.tokens -= 1.0
+            return delay
+
+    def refund(self) -> None:
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1.0)
+
+
+class _Slots:
+    """Counting semaphore shared by every event loop in the process.
+
+    asyncio.Semaphore is bound to one loop; the embedded gateway and the GUI
+    run their own loops against the same upstreams, so the count lives under
+    a thread lock and waiters are woken on their own loop. Waiters are served
+    first come, first served; a released slot goes straight to the next one.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = collections.deque()
+        self._lock = threading.Lock()
+
+    def locked(self) -> bool:
+        with self._lock:
+            return self.used >= self.limit or bool(self._waiters)
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.used < self.limit and not self._waiters:
+                self.used += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except BaseException:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            if not queued and waiter[1].done() and not waiter[1].cancelled():
+                self.release()  # handed a slot just as we gave up; pass it on
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._hand_over, future)
+                    return
+                except RuntimeError:
+                    continue  # its loop is closed
+            self.used -= 1
+
+    def _hand_over(self, future: asyncio.Future) -> None:
+        # Runs on the waiter's loop
+        if future.done():
+            self.release()  # the waiter gave up meanwhile
+        else:
+            future.set_result(None)
+
+
+class ServiceGovernor:
+    """Token bucket plus concurrency cap for one upstream service.
+
+    ``acquire`` takes a token and a concurrency slot, waiting at most
+    ``max_wait`` seconds in total; ``release`` returns the slot. Queue depth
+    and time spent waiting are tracked for reporting.
+    """
+
+    def __init__(self, service: str, rate: float = 10.0, burst: float = 20.0,
+                 max_concurrency: int = 16, max_wait: float = 5.0):
+        self.service = service
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self._slots = _Slots(max_concurrency)
+        self.waiting = 0
+        self.in_flight = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _reject(self, retry_after: float) -> QueueTimeoutError:
+        self.rejected += 1
+        return QueueTimeoutError(self.service, retry_after)
+
+    async def throttle(self, max_wait: Optional[float] = None) -> float:
+        """Wait for a rate-limit token only; returns the time waited"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        delay = self.bucket.reserve(max_wait)
+        if delay is None:
+            raise self._reject(1.0 / self.bucket.rate)
+        if delay:
+            self.waiting += 1
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.bucket.refund()  # cancelled before the token was spent
+                raise
+            finally:
+                self.waiting -= 1
+        return delay
+
+    async def acquire(self, max_wait: Optional[float] = None) -> _Slots:
+        """Wait for a token and a concurrency slot; pass the result to release()"""
+        max_wait = self.max_wait if max_wait is None else min(max_wait, self.max_wait)
+        started = time.monotonic()
+        await self.throttle(max_wait)
+        slots = self._slots
+        remaining = max_wait - (time.monotonic() - started)
+        if slots.locked():
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(slots.acquire(), max(remaining, 0.0))
+            except asyncio.TimeoutError:
+                self.bucket.refund()  # the token was never spent upstream
+                raise self._reject(1.0) from None
+            except asyncio.CancelledError:
+                self.bucket.refund()
+                raise
+            finally:
+                self.waiting -= 1
+        else:
+            await slots.acquire()
+        waited = time.monotonic() - started
+        self.acquired += 1
+        self.in_flight += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        return slots
+
+    def release(self, slots: _Slots) -> None:
+        self.in_flight -= 1
+        slots.release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'queue_depth': self.waiting,
+            'in_flight': self.in_flight,
+            'acquired': self.acquired,
+            'rejected': self.rejected,
+            'avg_wait_ms': round(self.wait_total / self.acquired * 1000, 2) if self.acquired else 0.0,
+            'max_wait_ms': round(self.wait_max * 1000, 2),
+        }
+
+
+_GOVERNORS: Dict[str, ServiceGovernor] = {}
+_registry_lock = threading.Lock()
+
+
+def get_governor(service: str, rate: float = 10.0, burst: float = 20.0,
+                 max_concurrency: int = 16, max_wait: float = 5.0) -> ServiceGovernor:
+    """Return the process-wide governor for a service"""
+    with _registry_lock:
+        governor = _GOVERNORS.get(service)
+        if governor is None:
+            governor = _GOVERNORS[service] = ServiceGovernor(service, rate, burst, max_concurrency, max_wait)
+        return governor
+
+
+def governor_stats() -> Dict[str, Dict[str, float]]:
+    """Queue depth, in-flight count and wait times per service"""
+    return {service: governor.stats() for service, governor in _GOVERNORS.items()}
@@ -0,0 +1,126 @@
+"""Per-upstream circuit breakers and retry budgets for the adapter layer"""
+import random
+import threading
+import time
+from typing import Dict
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, service: str, retry_after: float):
+        super().__init__(f"{service} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.service = service
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    closed -> open after ``failure_threshold`` consecutive failures; open ->
+    half-open once ``reset_timeout`` has passed, letting a single probe
+    through; the probe's outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, service: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def before_request(self) -> None:
+        """Raise CircuitOpenError unless a request may go upstream"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            now = time.monotonic()
+            # A probe that never reported back (cancelled, deadline) expires
+            probe_stale = now - self._probe_started > self.reset_timeout
+            if self.state == self.HALF_OPEN and (not self._probe_in_flight or probe_stale):
+                self._probe_in_flight = True
+                self._probe_started = now
+                return
+            raise CircuitOpenError(self.service, max(remaining, 1.0))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class RetryBudget:
+    """Caps retries to a fraction of recent requests.
+
+    Every request deposits ``ratio`` tokens (up to ``max_tokens``); every retry
+    withdraws one. When an upstream is failing, retries stop well before they
+    multiply its load.
+    """
+
+    def __init__(self, ratio: float = 0.2, initial_tokens: float = 10.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = initial_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+
+def backoff_delay(attempt: int, base: float = 0.1, cap: float = 2.0) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BUDGETS: Dict[str, RetryBudget] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(service: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+    """Return the process-wide breaker for a service"""
+    with _registry_lock:
+        breaker = _BREAKERS.get(service)
+        if breaker is None:
+            breaker = _BREAKERS[service] = CircuitBreaker(service, failure_threshold, reset_timeout)
+        return breaker
+
+
+def get_retry_budget(service: str) -> RetryBudget:
+    """Return the process-wide retry budget for a service"""
+    with _registry_lock:
+        budget = _BUDGETS.get(service)
+        if budget is None:
+            budget = _BUDGETS[service] = RetryBudget()
+        return budget
+
+
+def breaker_states() -> Dict[str, str]:
+    """Current breaker state per service"""
+    return {service: breaker.state for service, breaker in _BREAKERS.items()}
@@ -0,0 +1,332 @@
+"""Consistent-hashing front router for several gateway nodes.
+
+Per-token adapter state (TempMail.lol's message lists, cached bodies,
+snapshots) lives on the gateway node that served the token. This thin
+proxy pins every (service, token) pair to one node on a hash ring with
+virtual nodes, so a node joining or leaving only moves the keys in the
+ranges it owns. Requests without a token (/address, /services, /search,
+...) go to any healthy node. The node owning a new address usually did
+not create it; nodes start tracking a token's expiry when they first see
+it. Nodes failing their /healthz probe leave
+the ring until they recover, and GET/HEAD requests for their keys fall
+through to the next node on the ring; other methods are not replayed.
+
+    GET  /_router/nodes                      ring members, health and per-node counters
+    POST /_router/nodes                      {"add": [url, ...], "remove": [url, ...]}
+    GET  /_router/owner?service=..&token=..  node owning a token
+
+    MAIL_ROUTER_ADMIN_TOKEN=...              bearer token for POST /_router/nodes; unset
+                                             allows membership changes from loopback only
+
+Membership changes decide where mailbox tokens are sent, so they need the
+admin token, or a loopback peer when no token is configured.
+
+Nodes should trust the router's X-Forwarded-For (uvicorn
+--forwarded-allow-ips) so per-client admission still sees client
+addresses. --spawn N starts N local gateway nodes on the ports after
+--port, which is enough to try rebalancing on one machine. With
+MAIL_SNAPSHOT_FILE set, each spawned node snapshots to its own file,
+e.g. mail_snapshot.8001.bin.
+
+Usage:
+    python -m MailService.router --port 8000 --node http://127.0.0.1:8001 --node http://127.0.0.1:8002
+    python -m MailService.router --port 8000 --spawn 3
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import hmac
+import ipaddress
+import itertools
+import logging
+import os
+import subprocess
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+
+VNODES = 160
+HEALTH_INTERVAL = 2.0
+ADMIN_TOKEN = os.environ.get('MAIL_ROUTER_ADMIN_TOKEN', '')
+
+# Not forwarded in either direction (RFC 9110 section 7.6.1) plus what aiohttp recomputes
+_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te', 'trailer',
+    'transfer-encoding', 'upgrade', 'host', 'content-length',
+}
+# Only these fall through to the next node when a node fails mid-request
+_IDEMPOTENT_METHODS = {'GET', 'HEAD'}
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+def shard_key(service: str, token: str) -> str:
+    return f'{service}\x1f{token}'
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes."""
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = VNODES):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self.nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for i in range(self.vnodes):
+            point = _hash(f'{node}#{i}')
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str) -> None:
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        kept = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def nodes_for(self, key: str, count: int = 1) -> List[str]:
+        """The key's owner followed by distinct fallbacks in ring order"""
+        if not self._points:
+            return []
+        found: List[str] = []
+        start = bisect.bisect(self._points, _hash(key))
+        for i in range(len(self._points)):
+            owner = self._owners[(start + i) % len(self._points)]
+            if owner not in found:
+                found.append(owner)
+                if len(found) == count:
+                    break
+        return found
+
+    def node_for(self, key: str) -> Optional[str]:
+        found = self.nodes_for(key)
+        return found[0] if found else None
+
+
+class Router:
+    """aiohttp proxy routing gateway requests over a HashRing of healthy nodes."""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = VNODES, health_interval: float = HEALTH_INTERVAL,
+                 admin_token: str = ADMIN_TOKEN):
+        self.admin_token = admin_token
+        self.members = list(dict.fromkeys(n.rstrip('/') for n in nodes))
+        self.ring = HashRing(self.members, vnodes)
+        self.health_interval = health_interval
+        self.healthy = set(self.members)
+        self.stats: Dict[str, Counter] = {n: Counter() for n in self.members}
+        self._any = itertools.count()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    # -- membership ------------------------------------------------------
+
+    def add_node(self, node: str) -> None:
+        node = node.rstrip('/')
+        if node not in self.members:
+            self.members.append(node)
+            self.stats[node] = Counter()
+        self.healthy.add(node)
+        self.ring.add(node)
+
+    def remove_node(self, node: str) -> None:
+        node = node.rstrip('/')
+        if node in self.members:
+            self.members.remove(node)
+        self.healthy.discard(node)
+        self.ring.remove(node)
+
+    def _set_health(self, node: str, ok: bool) -> None:
+        if ok and node not in self.healthy and node in self.members:
+            logger.info('Node %s is healthy; joining the ring', node)
+            self.healthy.add(node)
+            self.ring.add(node)
+        elif not ok and node in self.healthy:
+            logger.warning('Node %s is down; its keys move to the next nodes on the ring', node)
+            self.healthy.discard(node)
+            self.ring.remove(node)
+
+    async def _probe(self, node: str) -> bool:
+        try:
+            async with self._session.get(f'{node}/healthz', timeout=aiohttp.ClientTimeout(total=2)) as resp:
+                return resp.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    async def _health_loop(self):
+        while True:
+            members = list(self.members)
+            results = await asyncio.gather(*(self._probe(n) for n in members))
+            for node, ok in zip(members, results):
+                self._set_health(node, ok)
+            await asyncio.sleep(self.health_interval)
+
+    # -- routing ---------------------------------------------------------
+
+    def candidates(self, request: web.Request) -> List[str]:
+        service, token = request.query.get('service'), request.query.get('token')
+        if service and token:
+            return self.ring.nodes_for(shard_key(service, token), 2)
+        healthy = self.ring.nodes
+        if not healthy:
+            return []
+        start = next(self._any) % len(healthy)
+        return (healthy[start:] + healthy[:start])[:2]
+
+    async def proxy(self, request: web.Request) -> web.StreamResponse:
+        body = await request.read()
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in _HOP_HEADERS}
+        peer = request.remote or ''
+        forwarded = request.headers.get('X-Forwarded-For')
+        headers['X-Forwarded-For'] = f'{forwarded}, {peer}' if forwarded else peer
+
+        candidates = self.candidates(request)
+        if request.method not in _IDEMPOTENT_METHODS:
+            # The node may have acted before the connection broke, e.g. created an address
+            candidates = candidates[:1]
+        for node in candidates:
+            url = f'{node}{request.rel_url}'
+            try:
+                upstream = await self._session.request(
+                    request.method, url, headers=headers, data=body or None, allow_redirects=False)
+            except aiohttp.ClientConnectionError:
+                self.stats[node]['errors'] += 1
+                self._set_health(node, False)
+                continue
+            self.stats[node]['requests'] += 1
+            async with upstream:
+                response = web.StreamResponse(status=upstream.status, reason=upstream.reason)
+                for key, value in upstream.headers.items():
+                    if key.lower() not in _HOP_HEADERS:
+                        response.headers.add(key, value)
+                if upstream.content_length is not None:
+                    response.content_length = upstream.content_length
+                await response.prepare(request)
+                async for chunk in upstream.content.iter_any():
+                    await response.write(chunk)
+                await response.write_eof()
+                return response
+        return web.json_response({'detail': 'No gateway node available'}, status=502)
+
+    # -- control ---------------------------------------------------------
+
+    async def nodes_view(self, request: web.Request):
+        return web.json_response({
+            node: {'healthy': node in self.healthy, **self.stats.get(node, {})} for node in self.members})
+
+    def _is_admin(self, request: web.Request) -> bool:
+        if self.admin_token:
+            given = request.headers.get('Authorization', '').removeprefix('Bearer ')
+            return hmac.compare_digest(given.encode(), self.admin_token.encode())
+        try:
+            return ipaddress.ip_address(request.remote or '').is_loopback
+        except ValueError:
+            return False
+
+    async def nodes_update(self, request: web.Request):
+        if not self._is_admin(request):
+            return web.json_response({'detail': 'Admin token required'}, status=403)
+        payload = await request.json()
+        for node in payload.get('add', []):
+            self.add_node(node)
+        for node in payload.get('remove', []):
+            self.remove_node(node)
+        return await self.nodes_view(request)
+
+    async def owner(self, request: web.Request):
+        service, token = request.query.get('service'), request.query.get('token')
+        if not service or not token:
+            return web.json_response({'detail': 'service and token are required'}, status=400)
+        key = shard_key(service, token)
+        return web.json_response({'node': self.ring.node_for(key)})
+
+    async def healthz(self, request: web.Request):
+        return web.json_response({'ok': bool(self.ring.nodes), 'nodes': len(self.ring.nodes)},
+                                 status=200 if self.ring.nodes else 503)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/_router/nodes', self.nodes_view)
+        app.router.add_post('/_router/nodes', self.nodes_update)
+        app.router.add_get('/_router/owner', self.owner)
+        app.router.add_get('/_router/healthz', self.healthz)
+        app.router.add_route('*', '/{tail:.*}', self.proxy)
+
+        async def lifecycle(app):
+            # Bodies are passed through untouched, compressed or not
+            self._session = aiohttp.ClientSession(
+                auto_decompress=False, timeout=aiohttp.ClientTimeout(total=None, sock_connect=5))
+            task = asyncio.create_task(self._health_loop())
+            yield
+            task.cancel()
+            await self._session.close()
+
+        app.cleanup_ctx.append(lifecycle)
+        return app
+
+
+def node_snapshot_file(path: str, port: int) -> str:
+    """Per-node snapshot path derived from MAIL_SNAPSHOT_FILE; "" keeps snapshots off"""
+    if not path:
+        return ''
+    stem, ext = os.path.splitext(path)
+    return f'{stem}.{port}{ext}'
+
+
+def spawn_nodes(count: int, first_port: int, host: str = '127.0.0.1') -> List[subprocess.Popen]:
+    """Start local uvicorn gateway nodes on consecutive ports"""
+    procs = []
+    for port in range(first_port, first_port + count):
+        # Nodes sharing one snapshot file would overwrite each other's caches
+        snapshot_file = node_snapshot_file(os.environ.get('MAIL_SNAPSHOT_FILE', ''), port)
+        env = {**os.environ, 'MAIL_SNAPSHOT_FILE': snapshot_file}
+        procs.append(subprocess.Popen([
+            sys.executable, '-m', 'uvicorn', 'MailService.api_server:app', '--host', host, '--port', str(port),
+            '--forwarded-allow-ips', '127.0.0.1', '--log-level', 'warning',
+        ], env=env))
+    return procs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Consistent-hashing router for gateway nodes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--node', action='append', default=[], help='Gateway node base URL (repeatable)')
+    parser.add_argument('--spawn', type=int, default=0, help='Start this many local nodes after --port')
+    parser.add_argument('--vnodes', type=int, default=VNODES, help='Virtual nodes per gateway node')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    procs = spawn_nodes(args.spawn, args.port + 1, args.host) if args.spawn else []
+    nodes = args.node + [f'http://{args.host}:{args.port + 1 + i}' for i in range(args.spawn)]
+    if not nodes:
+        parser.error('give at least one --node or --spawn N')
+    router = Router(nodes, args.vnodes)
+    print(f"Routing {len(nodes)} node(s) on http://{args.host}:{args.port}")
+    try:
+        web.run_app(router.app(), host=args.host, port=args.port, access_log=None, print=None)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
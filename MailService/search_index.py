@@ -0,0 +1,175 @@
+"""Incremental full-text search index (SQLite FTS5) over archived and cached mail"""
+import html
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mails (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    service TEXT,
+    received_at,
+    UNIQUE (email, message_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS mail_fts USING fts5(
+    subject, sender, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+CREATE INDEX IF NOT EXISTS mails_email ON mails (email);
+"""
+
+_SCRIPT_STYLE_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+_SPACE_RE = re.compile(r'\s+')
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def html_to_text(body: str) -> str:
+    """Reduce an HTML (or plain) body to searchable text"""
+    if not body:
+        return ''
+    if '<' in body:
+        body = _SCRIPT_STYLE_RE.sub(' ', body)
+        body = _TAG_RE.sub(' ', body)
+    return _SPACE_RE.sub(' ', html.unescape(body)).strip()
+
+
+def build_match_query(text: str) -> str:
+    """Turn free text into an FTS5 query: all terms must match, the last as a prefix"""
+    terms = [f'"{term}"' for term in _TERM_RE.findall(text or '')]
+    if terms:
+        terms[-1] += '*'  # search-as-you-type
+    return ' '.join(terms)
+
+
+class SearchIndex:
+    """Full-text index over subject, sender and body text.
+
+    Safe to share between threads; each write commits immediately so the
+    index stays current as messages are saved.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def _upsert(self, row: Dict, replace: bool = True) -> bool:
+        email = row.get('email') or ''
+        message_id = str(row.get('message_id'))
+        cur = self._conn.execute(
+            'SELECT id FROM mails WHERE email = ? AND message_id = ?', (email, message_id)
+        )
+        existing = cur.fetchone()
+        if existing is not None:
+            if not replace:
+                return False
+            rowid = existing[0]
+            self._conn.execute(
+                'UPDATE mails SET service = ?, received_at = ? WHERE id = ?',
+                (row.get('service'), row.get('received_at'), rowid),
+            )
+            self._conn.execute('DELETE FROM mail_fts WHERE rowid = ?', (rowid,))
+        else:
+            rowid = self._conn.execute(
+                'INSERT INTO mails (email, message_id, service, received_at) VALUES (?, ?, ?, ?)',
+                (email, message_id, row.get('service'), row.get('received_at')),
+            ).lastrowid
+        self._conn.execute(
+            'INSERT INTO mail_fts (rowid, subject, sender, body) VALUES (?, ?, ?, ?)',
+            (rowid, str(row.get('subject') or ''), str(row.get('sender') or ''),
+             html_to_text(str(row.get('body') or ''))),
+        )
+        return True
+
+    def add(self, email: str, message_id, subject: str = '', sender: str = '', body: str = '',
+            service: Optional[str] = None, received_at=None) -> None:
+        """Index (or re-index) a single message"""
+        row = {
+            'email': email, 'message_id': message_id, 'subject': subject, 'sender': sender,
+            'body': body, 'service': service, 'received_at': received_at,
+        }
+        with self._lock, self._conn:
+            self._upsert(row)
+
+    def add_many(self, rows: Iterable[Dict], replace: bool = True) -> int:
+        """Index many messages in one transaction; returns the number written"""
+        written = 0
+        with self._lock, self._conn:
+            for row in rows:
+                if self._upsert(row, replace=replace):
+                    written += 1
+        return written
+
+    def remove(self, email: str, message_id=None) -> None:
+        """Drop one message, or every message of an address"""
+        with self._lock, self._conn:
+            if message_id is None:
+                ids = self._conn.execute('SELECT id FROM mails WHERE email = ?', (email,)).fetchall()
+            else:
+                ids = self._conn.execute(
+                    'SELECT id FROM mails WHERE email = ? AND message_id = ?', (email, str(message_id))
+                ).fetchall()
+            self._conn.executemany('DELETE FROM mail_fts WHERE rowid = ?', ids)
+            self._conn.executemany('DELETE FROM mails WHERE id = ?', ids)
+
+    def search(self, query: str, email: Optional[str] = None, service: Optional[str] = None,
+               limit: int = 50) -> List[Dict]:
+        """Return matches for a free-text query, newest first.
+
+        Ordering by rowid lets FTS5 stop after ``limit`` hits instead of
+        scoring every match, which keeps broad queries in the ms range.
+        """
+        match = build_match_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT m.email, m.message_id, m.service, m.received_at, f.subject, f.sender, "
+            "snippet(mail_fts, 2, '[', ']', '…', 12) "
+            "FROM mail_fts f JOIN mails m ON m.id = f.rowid WHERE mail_fts MATCH ?"
+        )
+        params: list = [match]
+        if email:
+            sql += ' AND m.email = ?'
+            params.append(email)
+        if service:
+            sql += ' AND m.service = ?'
+            params.append(service)
+        sql += ' ORDER BY f.rowid DESC LIMIT ?'
+        params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {
+                'email': r[0], 'message_id': r[1], 'service': r[2], 'received_at': r[3],
+                'subject': r[4], 'mail_from': r[5], 'snippet': r[6],
+            }
+            for r in rows
+        ]
+
+    def search_ids(self, query: str, email: str) -> Set[str]:
+        """Return the matching message ids of one address (no snippets, unordered)"""
+        match = build_match_query(query)
+        if not match:
+            return set()
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT m.message_id FROM mail_fts f JOIN mails m ON m.id = f.rowid '
+                'WHERE mail_fts MATCH ? AND m.email = ?',
+                (match, email),
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM mails').fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
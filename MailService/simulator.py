@@ -0,0 +1,539 @@
+"""Local simulator of the five upstream mail providers.
+
+Speaks the wire formats the adapters expect, each under /<service key>:
+
+    /guerrillamail/ajax.php      Guerrilla Mail ajax API (f=get_email_address|get_email_list|fetch_email)
+    /mailgw, /mailtm             hydra JSON API (domains, accounts, token, messages)
+    /dropmail/api/graphql/<tok>  DropMail GraphQL (introduceSession, session.mails, session.mail)
+    /tempmaillol                 tempmail.lol (generate[/rush], auth/<token>)
+
+Latency distributions, error rates, HTML error pages and mail arrival are
+configurable per provider, from the command line or a scenario file, and
+can be changed at runtime through the /_sim control endpoints:
+
+    GET  /_sim/stats             request counts per provider and outcome
+    POST /_sim/config            {"<provider>|default": {"latency": ..., "error_rate": ...}}
+    POST /_sim/deliver           {"service": ..., "address": ... (optional), "count": 1, "subject": ...,
+                                  "attachments": [{"filename": ..., "size": bytes, "content_type": ...}]}
+
+Attachments are served by the hydra providers (mail.gw, mail.tm), with
+Range support, at messages/<id>/attachment/<attachment id>.
+
+Point the adapters at it with MAIL_UPSTREAM_BASE=http://127.0.0.1:<port>.
+
+Usage:
+    python -m MailService.simulator --port 8099 --latency lognormal:40,0.5 \\
+        --error-rate 0.01 --html-error-rate 0.005 --arrival 0.2 --initial 3
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+import string
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+
+PROVIDERS = ('guerrillamail', 'mailgw', 'mailtm', 'dropmail', 'tempmaillol')
+
+HYDRA_DOMAINS = {'mailgw': ['sim-gw.test', 'sim-gw2.test'], 'mailtm': ['sim-tm.test']}
+
+_HTML_ERROR = """<!DOCTYPE html>
+<html><head><title>{status} {reason}</title></head>
+<body><center><h1>{status} {reason}</h1></center><hr><center>cloudflare</center></body></html>
+"""
+
+
+def parse_latency(spec: str):
+    """Return a sampler (seconds) for fixed:MS, uniform:MIN,MAX, normal:MEAN,SD or lognormal:MEDIAN,SIGMA"""
+    kind, _, args = spec.partition(':')
+    nums = [float(v) for v in args.split(',')] if args else []
+    if kind in ('', 'none'):
+        return lambda: 0.0
+    if kind == 'fixed':
+        return lambda: nums[0] / 1000
+    if kind == 'uniform':
+        return lambda: random.uniform(nums[0], nums[1]) / 1000
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(nums[0], nums[1])) / 1000
+    if kind == 'lognormal':
+        # MEDIAN in ms, SIGMA is the shape of the underlying normal
+        return lambda: random.lognormvariate(math.log(nums[0]), nums[1]) / 1000
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+@dataclass
+class ProviderConfig:
+    latency: str = 'none'
+    error_rate: float = 0.0  # fraction answered with 429/5xx JSON errors
+    html_error_rate: float = 0.0  # fraction answered with an HTML 502/503 page
+    arrival: float = 0.0  # probability per inbox per tick that a mail arrives
+    initial: int = 0  # mails already in a new inbox
+    body_bytes: int = 2000
+
+    def __post_init__(self):
+        self.sample_latency = parse_latency(self.latency)
+
+    def update(self, values: Dict):
+        for key, value in values.items():
+            if key in self.__dataclass_fields__:
+                setattr(self, key, value)
+        self.sample_latency = parse_latency(self.latency)
+
+
+@dataclass
+class Attachment:
+    id: str
+    filename: str
+    content_type: str
+    data: bytes
+
+
+@dataclass
+class Mail:
+    id: str
+    sender: str
+    subject: str
+    text: str
+    html: str
+    created: float = field(default_factory=time.time)
+    attachments: List[Attachment] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return len(self.html.encode('utf-8'))
+
+    @property
+    def iso_date(self) -> str:
+        return datetime.fromtimestamp(self.created, timezone.utc).isoformat(timespec='seconds')
+
+
+@dataclass
+class Inbox:
+    service: str
+    address: str
+    token: str
+    mails: List[Mail] = field(default_factory=list)
+    password: Optional[str] = None
+
+
+# -- provider wire formats (list entries as each API returns them) -----------
+
+def guerrilla_item(m: Mail) -> Dict:
+    return {
+        'mail_id': m.id, 'mail_from': m.sender, 'mail_subject': m.subject,
+        'mail_excerpt': m.text[:80], 'mail_timestamp': str(int(m.created)), 'mail_read': '0',
+        'mail_date': time.strftime('%H:%M:%S', time.localtime(m.created)),
+    }
+
+
+def hydra_item(m: Mail, address: str) -> Dict:
+    return {
+        'id': m.id, 'from': {'address': m.sender, 'name': ''}, 'to': [{'address': address, 'name': ''}],
+        'subject': m.subject, 'intro': m.text[:100], 'seen': False, 'hasAttachments': bool(m.attachments),
+        'size': m.size, 'createdAt': m.iso_date,
+    }
+
+
+def hydra_attachment(m: Mail, a: Attachment) -> Dict:
+    return {
+        'id': a.id, 'filename': a.filename, 'contentType': a.content_type, 'disposition': 'attachment',
+        'transferEncoding': 'base64', 'related': False, 'size': len(a.data),
+        'downloadUrl': f'/messages/{m.id}/attachment/{a.id}',
+    }
+
+
+def gql_mail(m: Mail) -> Dict:
+    return {'id': m.id, 'fromAddr': m.sender, 'headerSubject': m.subject, 'text': m.text,
+            'html': m.html, 'receivedAt': m.iso_date, 'size': m.size}
+
+
+def tempmaillol_item(m: Mail, address: str) -> Dict:
+    return {'from': m.sender, 'to': address, 'subject': m.subject, 'body': m.text, 'html': m.html,
+            'date': int(m.created * 1000)}
+
+
+def _rand(n: int = 10) -> str:
+    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=n))
+
+
+class Simulator:
+    """Provider state plus the aiohttp application serving it."""
+
+    def __init__(self, default: Optional[ProviderConfig] = None, tick: float = 1.0, seed: Optional[int] = None):
+        self.default = default or ProviderConfig()
+        self.providers: Dict[str, ProviderConfig] = {}
+        self.tick = tick
+        self.random = random.Random(seed)
+        self.inboxes: Dict[str, Dict[str, Inbox]] = {p: {} for p in PROVIDERS}  # service -> token -> inbox
+        self.by_address: Dict[str, Inbox] = {}
+        self.stats: Counter = Counter()
+        self._ids = itertools.count(1)
+        self._script: List[Dict] = []
+
+    # -- configuration ---------------------------------------------------
+
+    def config(self, service: str) -> ProviderConfig:
+        return self.providers.get(service, self.default)
+
+    def configure(self, values: Dict[str, Dict]):
+        for name, settings in values.items():
+            if name == 'default':
+                self.default.update(settings)
+            else:
+                config = self.providers.get(name)
+                if config is None:
+                    config = self.providers[name] = ProviderConfig(**{
+                        k: getattr(self.default, k) for k in self.default.__dataclass_fields__})
+                config.update(settings)
+
+    def load_scenario(self, path: str):
+        """Scenario file: {"providers": {...}, "script": [{"at": s, "service": ..., "count": n}, ...]}"""
+        with open(path, encoding='utf-8') as f:
+            scenario = json.load(f)
+        self.configure(scenario.get('providers', {}))
+        self._script = sorted(scenario.get('script', []), key=lambda e: e.get('at', 0))
+
+    # -- mail ----------------------------------------------------------------
+
+    def make_mail(self, service: str, subject: Optional[str] = None, sender: Optional[str] = None,
+                  text: Optional[str] = None, attachments: Optional[List[Dict]] = None) -> Mail:
+        n = next(self._ids)
+        code = self.random.randint(100000, 999999)
+        subject = subject or f'Your verification code is {code}'
+        sender = sender or f'no-reply@sender{n % 7}.test'
+        filler = (' Lorem ipsum dolor sit amet, consectetur adipiscing elit.' *
+                  max(1, self.config(service).body_bytes // 56))
+        text = text or f'Your code is {code}. Confirm at https://example.test/verify?c={code}.{filler}'
+        html = f'<html><body><p>{text}</p><a href="https://example.test/verify?c={code}">Verify</a></body></html>'
+        if service in ('mailgw', 'mailtm'):
+            mail_id = uuid.uuid4().hex[:24]
+        elif service == 'dropmail':
+            mail_id = f'U{_rand(20)}'
+        else:
+            mail_id = str(n)
+        files = [
+            Attachment(f'ATTACH{i:06d}', spec.get('filename', f'file{i}.bin'),
+                       spec.get('content_type', 'application/octet-stream'),
+                       self.random.randbytes(int(spec.get('size', 1024))))
+            for i, spec in enumerate(attachments or (), 1)
+        ]
+        return Mail(mail_id, sender, subject, text, html, attachments=files)
+
+    def deliver(self, service: Optional[str] = None, address: Optional[str] = None, count: int = 1,
+                **fields) -> int:
+        if address:
+            targets = [self.by_address[address]] if address in self.by_address else []
+        else:
+            services = [service] if service else PROVIDERS
+            targets = [box for s in services for box in self.inboxes[s].values()]
+        for box in targets:
+            for _ in range(count):
+                box.mails.append(self.make_mail(box.service, **fields))
+        return len(targets) * count
+
+    def _new_inbox(self, service: str, address: str, token: str) -> Inbox:
+        box = Inbox(service, address, token)
+        self.inboxes[service][token] = box
+        self.by_address[address] = box
+        for _ in range(self.config(service).initial):
+            box.mails.append(self.make_mail(service))
+        return box
+
+    async def _arrivals(self):
+        started = time.monotonic()
+        script = list(self._script)
+        while True:
+            await asyncio.sleep(self.tick)
+            elapsed = time.monotonic() - started
+            while script and script[0].get('at', 0) <= elapsed:
+                event = script.pop(0)
+                fields = {k: event[k] for k in ('subject', 'sender', 'text', 'attachments') if k in event}
+                self.deliver(event.get('service'), event.get('address'), event.get('count', 1), **fields)
+            for service in PROVIDERS:
+                rate = self.config(service).arrival
+                if rate <= 0:
+                    continue
+                for box in list(self.inboxes[service].values()):
+                    if self.random.random() < rate:
+                        box.mails.append(self.make_mail(service))
+
+    # -- fault injection -----------------------------------------------------
+
+    @web.middleware
+    async def _faults(self, request: web.Request, handler):
+        service = request.path.strip('/').split('/', 1)[0]
+        if service not in self.inboxes:
+            return await handler(request)
+        config = self.config(service)
+        delay = config.sample_latency()
+        if delay:
+            await asyncio.sleep(delay)
+        roll = self.random.random()
+        if roll < config.html_error_rate:
+            status = self.random.choice((502, 503))
+            self.stats[f'{service} html_{status}'] += 1
+            reason = 'Bad Gateway' if status == 502 else 'Service Unavailable'
+            return web.Response(status=status, text=_HTML_ERROR.format(status=status, reason=reason),
+                                content_type='text/html')
+        if roll < config.html_error_rate + config.error_rate:
+            status = self.random.choice((429, 500, 503))
+            self.stats[f'{service} {status}'] += 1
+            headers = {'Retry-After': '1'} if status == 429 else None
+            return web.json_response({'error': 'simulated failure'}, status=status, headers=headers)
+        response = await handler(request)
+        self.stats[f'{service} {response.status}'] += 1
+        return response
+
+    # -- Guerrilla Mail ------------------------------------------------------
+
+    async def guerrilla(self, request: web.Request):
+        q = request.query
+        boxes = self.inboxes['guerrillamail']
+        f = q.get('f')
+        if f == 'get_email_address':
+            token = _rand(26)
+            address = f"{_rand(8)}@{self.random.choice(['grr.la', 'sharklasers.com'])}"
+            self._new_inbox('guerrillamail', address, token)
+            return web.json_response({'email_addr': address, 'email_timestamp': int(time.time()),
+                                      'alias': address.split('@')[0], 'sid_token': token})
+        box = boxes.get(q.get('sid_token', ''))
+        if box is None:
+            return web.json_response({'auth': {'success': False, 'error_codes': ['auth-session-not-initialized']}})
+        if f == 'get_email_list':
+            offset = int(q.get('offset', '0') or 0)
+            mails = box.mails[offset:]
+            return web.json_response({'list': [guerrilla_item(m) for m in reversed(mails)],
+                                      'count': str(len(box.mails)), 'email': box.address})
+        if f == 'fetch_email':
+            for m in box.mails:
+                if m.id == q.get('email_id'):
+                    return web.json_response({
+                        'mail_id': m.id, 'mail_from': m.sender, 'mail_subject': m.subject, 'mail_body': m.html,
+                        'mail_timestamp': str(int(m.created)), 'mail_size': str(m.size),
+                    })
+            return web.json_response(False)
+        return web.json_response({'error': f'unknown function {f}'}, status=400)
+
+    # -- mail.gw / mail.tm (hydra) -------------------------------------------
+
+    def _hydra(self, members: List[Dict]) -> web.Response:
+        body = {'hydra:member': members, 'hydra:totalItems': len(members)}
+        return web.Response(text=json.dumps(body), content_type='application/ld+json')
+
+    def _bearer(self, service: str, request: web.Request) -> Optional[Inbox]:
+        auth = request.headers.get('Authorization', '')
+        return self.inboxes[service].get(auth[7:]) if auth.startswith('Bearer ') else None
+
+    async def hydra(self, request: web.Request):
+        service = request.match_info['service']
+        rest = request.match_info['rest']
+        if rest == 'domains':
+            return self._hydra([{'id': uuid.uuid4().hex[:24], 'domain': d, 'isActive': True, 'isPrivate': False}
+                                for d in HYDRA_DOMAINS[service]])
+        if rest == 'accounts' and request.method == 'POST':
+            payload = await request.json()
+            if payload.get('address') in self.by_address:
+                return web.json_response({'detail': 'address: This value is already used.'}, status=422)
+            token = _rand(40)
+            box = self._new_inbox(service, payload['address'], token)
+            box.password = payload.get('password')
+            return web.json_response({'id': uuid.uuid4().hex[:24], 'address': box.address}, status=201)
+        if rest == 'token' and request.method == 'POST':
+            payload = await request.json()
+            box = self.by_address.get(payload.get('address'))
+            if box is None or getattr(box, 'password', None) != payload.get('password'):
+                return web.json_response({'code': 401, 'message': 'Invalid credentials.'}, status=401)
+            return web.json_response({'id': uuid.uuid4().hex[:24], 'token': box.token})
+        box = self._bearer(service, request)
+        if box is None:
+            return web.json_response({'code': 401, 'message': 'JWT Token not found'}, status=401)
+        if rest == 'messages':
+            return self._hydra([hydra_item(m, box.address) for m in reversed(box.mails)])
+        match = re.fullmatch(r'messages/([^/]+)/attachment/([^/]+)', rest)
+        if match:
+            return self._hydra_attachment(request, box, *match.groups())
+        if rest.startswith('messages/'):
+            mail_id = rest.split('/', 1)[1]
+            for m in box.mails:
+                if m.id == mail_id:
+                    body = {
+                        'id': m.id, 'from': {'address': m.sender, 'name': ''},
+                        'to': [{'address': box.address, 'name': ''}], 'subject': m.subject,
+                        'text': m.text, 'html': [m.html], 'hasAttachments': bool(m.attachments),
+                        'attachments': [hydra_attachment(m, a) for a in m.attachments],
+                        'size': m.size, 'createdAt': m.iso_date,
+                    }
+                    return web.Response(text=json.dumps(body), content_type='application/ld+json')
+            return web.json_response({'code': 404, 'message': 'Not Found'}, status=404)
+        return web.json_response({'code': 404, 'message': 'Not Found'}, status=404)
+
+    def _hydra_attachment(self, request: web.Request, box: Inbox, mail_id: str, attachment_id: str):
+        found = [a for m in box.mails if m.id == mail_id for a in m.attachments if a.id == attachment_id]
+        if not found:
+            return web.json_response({'code': 404, 'message': 'Not Found'}, status=404)
+        data = found[0].data
+        headers = {'Accept-Ranges': 'bytes',
+                   'Content-Disposition': f'attachment; filename="{found[0].filename}"'}
+        try:
+            window = request.http_range
+        except ValueError:
+            window = slice(None)
+        if window.start is None and window.stop is None:
+            return web.Response(body=data, content_type=found[0].content_type, headers=headers)
+        start, stop, _ = window.indices(len(data))
+        if start >= stop:
+            return web.Response(status=416, headers={'Content-Range': f'bytes */{len(data)}'})
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{len(data)}'
+        return web.Response(status=206, body=data[start:stop], content_type=found[0].content_type,
+                            headers=headers)
+
+    # -- DropMail GraphQL ----------------------------------------------------
+
+    async def dropmail(self, request: web.Request):
+        payload = await request.json()
+        query = payload.get('query', '')
+        variables = payload.get('variables') or {}
+        boxes = self.inboxes['dropmail']
+        if 'introduceSession' in query:
+            session_id = f'U2Vzc2lvbjo{_rand(16)}'
+            address = f'{_rand(8)}@dropmail.me'
+            self._new_inbox('dropmail', address, session_id)
+            expires = datetime.fromtimestamp(time.time() + 600, timezone.utc).isoformat(timespec='seconds')
+            return web.json_response({'data': {'introduceSession': {
+                'id': session_id, 'expiresAt': expires, 'addresses': [{'address': address}]}}})
+        box = boxes.get(variables.get('id', ''))
+        if box is None:
+            return web.json_response({'data': {'session': None}})
+
+        if re.search(r'\bmail\s*\(', query):
+            mail = next((gql_mail(m) for m in box.mails if m.id == variables.get('mailId')), None)
+            return web.json_response({'data': {'session': {'mail': mail}}})
+        return web.json_response({'data': {'session': {'mails': [gql_mail(m) for m in box.mails]}}})
+
+    # -- tempmail.lol --------------------------------------------------------
+
+    async def tempmaillol_generate(self, request: web.Request):
+        token = _rand(40)
+        address = f'{_rand(10)}@{self.random.choice(["sim-lol.test", "sim-lol2.test"])}'
+        self._new_inbox('tempmaillol', address, token)
+        return web.json_response({'address': address, 'token': token})
+
+    async def tempmaillol_auth(self, request: web.Request):
+        box = self.inboxes['tempmaillol'].get(request.match_info['token'])
+        if box is None:
+            return web.json_response({'email': [], 'token': 'invalid'})
+        return web.json_response({'email': [tempmaillol_item(m, box.address) for m in box.mails],
+                                  'token': box.token})
+
+    # -- control -------------------------------------------------------------
+
+    async def sim_stats(self, request: web.Request):
+        return web.json_response({
+            'requests': dict(self.stats),
+            'inboxes': {s: len(b) for s, b in self.inboxes.items()},
+            'mails': {s: sum(len(box.mails) for box in b.values()) for s, b in self.inboxes.items()},
+        })
+
+    async def sim_config(self, request: web.Request):
+        self.configure(await request.json())
+        return web.json_response({'ok': True})
+
+    async def sim_deliver(self, request: web.Request):
+        payload = await request.json()
+        fields = {k: payload[k] for k in ('subject', 'sender', 'text', 'attachments') if k in payload}
+        delivered = self.deliver(payload.get('service'), payload.get('address'), payload.get('count', 1), **fields)
+        return web.json_response({'delivered': delivered})
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._faults])
+        app.router.add_get('/guerrillamail/ajax.php', self.guerrilla)
+        app.router.add_route('*', r'/{service:mailgw|mailtm}/{rest:.*}', self.hydra)
+        app.router.add_post('/dropmail/api/graphql/{token}', self.dropmail)
+        app.router.add_get('/tempmaillol/generate', self.tempmaillol_generate)
+        app.router.add_get('/tempmaillol/generate/rush', self.tempmaillol_generate)
+        app.router.add_get('/tempmaillol/auth/{token}', self.tempmaillol_auth)
+        app.router.add_get('/_sim/stats', self.sim_stats)
+        app.router.add_post('/_sim/config', self.sim_config)
+        app.router.add_post('/_sim/deliver', self.sim_deliver)
+
+        async def arrivals(app):
+            task = asyncio.create_task(self._arrivals())
+            yield
+            task.cancel()
+
+        app.cleanup_ctx.append(arrivals)
+        return app
+
+
+async def start(sim: Simulator, host: str = '127.0.0.1', port: int = 0) -> web.AppRunner:
+    """Serve the simulator on the running loop; returns the runner (see .addresses)"""
+    runner = web.AppRunner(sim.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def run_in_thread(sim: Simulator, host: str = '127.0.0.1', port: int = 0) -> str:
+    """Serve the simulator from a daemon thread; returns its base URL"""
+    ready = threading.Event()
+    result = {}
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        runner = loop.run_until_complete(start(sim, host, port))
+        result['url'] = 'http://%s:%d' % runner.addresses[0][:2]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, name='upstream-simulator', daemon=True).start()
+    ready.wait()
+    return result['url']
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Local simulator of the upstream mail providers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', default='none',
+                        help='fixed:MS | uniform:MIN,MAX | normal:MEAN,SD | lognormal:MEDIAN_MS,SIGMA')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 429/5xx JSON errors')
+    parser.add_argument('--html-error-rate', type=float, default=0.0, help='Fraction of HTML 502/503 pages')
+    parser.add_argument('--arrival', type=float, default=0.0, help='Per-inbox mail probability per tick')
+    parser.add_argument('--initial', type=int, default=0, help='Mails in each new inbox')
+    parser.add_argument('--body-bytes', type=int, default=2000, help='Approximate mail body size')
+    parser.add_argument('--tick', type=float, default=1.0, help='Arrival tick in seconds')
+    parser.add_argument('--scenario', help='JSON scenario with per-provider settings and a delivery script')
+    parser.add_argument('--seed', type=int)
+    return parser
+
+
+def simulator_from_args(args) -> Simulator:
+    default = ProviderConfig(args.latency, args.error_rate, args.html_error_rate,
+                             args.arrival, args.initial, args.body_bytes)
+    sim = Simulator(default, tick=args.tick, seed=args.seed)
+    if args.scenario:
+        sim.load_scenario(args.scenario)
+    return sim
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sim = simulator_from_args(args)
+    print(f"Simulating {', '.join(PROVIDERS)} on http://{args.host}:{args.port}")
+    print(f"export MAIL_UPSTREAM_BASE=http://{args.host}:{args.port}")
+    web.run_app(sim.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Warm restarts for the gateway: periodic on-disk snapshots of its caches.
+
+Snapshots are opt-in. With MAIL_SNAPSHOT_FILE set, the gateway writes
+its in-memory caches (message bodies, per-token adapter state) and
+registered extras such as the domain catalog to that file every
+MAIL_SNAPSHOT_INTERVAL seconds. It writes once more on shutdown. At
+startup the snapshot is loaded before the gateway reports ready, so
+pollers keep hitting warm caches across reloads and deploys.
+
+    MAIL_SNAPSHOT_FILE=mail_snapshot.bin   snapshot path (unset or "" disables snapshots, the default)
+    MAIL_SNAPSHOT_INTERVAL=60              seconds between snapshots
+    MAIL_SNAPSHOT_MAX_AGE=86400            older snapshots are ignored at startup
+
+The file is a short magic header followed by zlib-compressed JSON. Bytes,
+tuples and dicts with non-string keys are tagged, so cache entries come
+back as they went in, and loading a file can never run code. Snapshotted
+values must be built from JSON types, bytes and tuples. Caches on a
+shared backend (MAIL_STATE=sqlite) already persist and are skipped.
+"""
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from . import state
+
+
+SNAPSHOT_FILE = os.environ.get('MAIL_SNAPSHOT_FILE', '')
+INTERVAL = float(os.environ.get('MAIL_SNAPSHOT_INTERVAL', '60'))
+MAX_AGE = float(os.environ.get('MAIL_SNAPSHOT_MAX_AGE', '86400'))
+
+MAGIC = b'MAILSNAP2\n'
+
+logger = logging.getLogger(__name__)
+
+# name -> (dump, load) for state kept outside state.cache()
+_EXTRAS: Dict[str, Tuple[Callable[[], Any], Callable[[Any], None]]] = {}
+
+
+def enabled() -> bool:
+    return bool(SNAPSHOT_FILE)
+
+
+def register(name: str, dump: Callable[[], Any], load: Callable[[Any], None]) -> None:
+    """Include extra state in snapshots; dump() runs on the event loop"""
+    _EXTRAS[name] = (dump, load)
+
+
+def collect() -> Dict:
+    """Copy everything to snapshot; cheap enough to run on the event loop"""
+    caches = {}
+    if not state.shared():
+        caches = {name: {'maxsize': c.maxsize, 'items': c.items()} for name, c in state.caches().items()}
+    return {
+        'saved_at': time.time(),
+        'caches': caches,
+        'extras': {name: dump() for name, (dump, _) in _EXTRAS.items()},
+    }
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return {'$b': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, tuple):
+        return {'$t': [_encode(v) for v in value]}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        if any(not isinstance(k, str) or k.startswith('$') for k in value):
+            return {'$d': [[_encode(k), _encode(v)] for k, v in value.items()]}
+        return {k: _encode(v) for k, v in value.items()}
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        if len(value) == 1:
+            (tag, inner), = value.items()
+            if tag == '$b':
+                return base64.b64decode(inner)
+            if tag == '$t':
+                return tuple(_decode(v) for v in inner)
+            if tag == '$d':
+                return {_decode(k): _decode(v) for k, v in inner}
+        return {k: _decode(v) for k, v in value.items()}
+    return value
+
+
+def pack(value: Any) -> bytes:
+    """Serialize one value with the snapshot codec; the SQLite state backend stores these"""
+    return json.dumps(_encode(value), separators=(',', ':')).encode('utf-8')
+
+
+def unpack(blob: bytes) -> Any:
+    """Inverse of pack(); raises ValueError on anything else"""
+    return _decode(json.loads(blob))
+
+
+def dumps(data: Dict) -> bytes:
+    return MAGIC + zlib.compress(pack(data), 6)
+
+
+def loads(blob: bytes) -> Dict:
+    if not blob.startswith(MAGIC):
+        raise ValueError('not a gateway snapshot')
+    return unpack(zlib.decompress(blob[len(MAGIC):]))
+
+
+def write(data: Dict, path: str = SNAPSHOT_FILE) -> int:
+    """Serialize a collected snapshot atomically; returns its size in bytes"""
+    blob = dumps(data)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(blob)
+    os.replace(tmp, path)
+    return len(blob)
+
+
+def save(path: str = SNAPSHOT_FILE) -> int:
+    return write(collect(), path)
+
+
+def restore(path: str = SNAPSHOT_FILE, max_age: float = MAX_AGE) -> Dict[str, int]:
+    """Load a snapshot into the caches; returns entries restored per cache or extra"""
+    try:
+        with open(path, 'rb') as f:
+            blob = f.read()
+    except FileNotFoundError:
+        return {}
+    try:
+        data = loads(blob)
+    except Exception as e:
+        logger.warning('Ignoring unreadable snapshot %s: %r', path, e)
+        return {}
+    age = time.time() - data.get('saved_at', 0)
+    if age > max_age:
+        logger.info('Ignoring snapshot %s, %.0f s old', path, age)
+        return {}
+
+    restored = {}
+    for name, dumped in data.get('caches', {}).items():
+        cache = state.cache(name, dumped['maxsize'])
+        for key, value in dumped['items']:
+            cache.put(key, value)
+        restored[name] = len(dumped['items'])
+    for name, value in data.get('extras', {}).items():
+        if name in _EXTRAS:
+            _EXTRAS[name][1](value)
+            restored[name] = len(value) if hasattr(value, '__len__') else 1
+    return restored
+
+
+async def run_periodic(path: str = SNAPSHOT_FILE, interval: float = INTERVAL):
+    """Snapshot every interval seconds; serialization runs off the event loop"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            size = await asyncio.to_thread(write, collect(), path)
+            logger.debug('Wrote %d byte snapshot to %s', size, path)
+        except Exception as e:
+            logger.warning('Snapshot to %s failed: %r', path, e)
+
+
+def start_periodic() -> Optional[asyncio.Task]:
+    if not enabled():
+        return None
+    return asyncio.get_running_loop().create_task(run_periodic())
@@ -0,0 +1,223 @@
+"""Pluggable backend for gateway caches and per-token adapter state.
+
+By default every cache is an in-process LRUCache, which is right for the
+GUI, the CLI and a single gateway worker. With several uvicorn workers,
+each would see its own disjoint cache; pointing them at one SQLite
+database (WAL mode, so readers never block the writer) gives every
+worker on the host the same view:
+
+    MAIL_STATE=memory|sqlite                   backend (default memory)
+    MAIL_STATE_FILE=mail_state.sqlite3         database for the sqlite backend
+    MAIL_WORKERS=1                             gateway worker processes sharing the host
+
+Caches are requested by name with cache(name, maxsize) and expose the
+LRUCache interface (get/put/pop/pop_prefix/items/len plus hit and miss
+counters). Values are stored with the snapshot codec, so they must be
+built from JSON types, bytes and tuples, and reading the database can never
+run code. Values are copies: mutate a value, then put() it back to share
+the change. The SQLite backend may wait on another
+worker's write lock, so async code calls caches through offload(), which
+moves that I/O to a worker thread.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from . import snapshot
+from .cache import LRUCache
+
+
+BACKEND = os.environ.get('MAIL_STATE', 'memory')
+STATE_FILE = os.environ.get('MAIL_STATE_FILE', 'mail_state.sqlite3')
+# Processes sharing per-host limits, e.g. uvicorn --workers N
+WORKERS = max(1, int(os.environ.get('MAIL_WORKERS', '1')))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    touched REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_touched ON entries (ns, touched);
+"""
+
+# Recency is only rewritten when older than this, so hot reads stay reads
+_TOUCH_GRANULARITY = 1.0
+
+# Sorts after every character of an encoded key: keys are ASCII-only JSON
+_KEY_END = '\x7f'
+
+
+def _encode_key(key: Hashable) -> str:
+    return json.dumps(list(key) if isinstance(key, tuple) else key)
+
+
+def _decode_key(raw: str) -> Hashable:
+    key = json.loads(raw)
+    return tuple(key) if isinstance(key, list) else key
+
+
+_UNREADABLE = object()
+
+
+def _load(blob: bytes) -> Any:
+    # Rows from older releases (pickled) or foreign writers read as missing
+    try:
+        return snapshot.unpack(blob)
+    except ValueError:
+        return _UNREADABLE
+
+
+class _Database:
+    """One SQLite connection per process, shared by all caches in it."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class SQLiteCache:
+    """LRUCache-compatible cache stored in a SQLite database shared between processes."""
+
+    def __init__(self, db: _Database, name: str, maxsize: int = 1024):
+        self.db = db
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._trim_every = max(1, maxsize // 20)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.time()
+        raw_key = _encode_key(key)
+        with self.db.lock:
+            row = self.db.conn.execute(
+                'SELECT value, touched FROM entries WHERE ns = ? AND key = ?', (self.name, raw_key)
+            ).fetchone()
+            if row is not None and now - row[1] > _TOUCH_GRANULARITY:
+                self.db.conn.execute(
+                    'UPDATE entries SET touched = ? WHERE ns = ? AND key = ?', (now, self.name, raw_key))
+            value = _UNREADABLE if row is None else _load(row[0])
+            if value is _UNREADABLE:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        blob = snapshot.pack(value)
+        with self.db.lock:
+            self.db.conn.execute(
+                'INSERT OR REPLACE INTO entries (ns, key, value, touched) VALUES (?, ?, ?, ?)',
+                (self.name, _encode_key(key), blob, time.time()),
+            )
+            self._puts += 1
+            if self._puts % self._trim_every == 0:
+                self._trim()
+
+    def _trim(self):
+        # Caller holds the lock; evicts the least recently used beyond maxsize
+        self.db.conn.execute(
+            'DELETE FROM entries WHERE ns = ? AND key IN ('
+            ' SELECT key FROM entries WHERE ns = ? ORDER BY touched DESC LIMIT -1 OFFSET ?)',
+            (self.name, self.name, self.maxsize),
+        )
+
+    def pop(self, key: Hashable, default: Any = None) -> Optional[Any]:
+        raw_key = _encode_key(key)
+        with self.db.lock:
+            row = self.db.conn.execute(
+                'DELETE FROM entries WHERE ns = ? AND key = ? RETURNING value', (self.name, raw_key)
+            ).fetchone()
+        value = _UNREADABLE if row is None else _load(row[0])
+        return default if value is _UNREADABLE else value
+
+    def pop_prefix(self, prefix: Tuple) -> int:
+        """Drop every tuple key starting with prefix without loading values; returns the count"""
+        # ("a", "b") encodes as '["a", "b"]'; its extensions start with '["a", "b", '
+        start = _encode_key(prefix)[:-1] + ', '
+        with self.db.lock:
+            return self.db.conn.execute(
+                'DELETE FROM entries WHERE ns = ? AND key >= ? AND key < ?',
+                (self.name, start, start + _KEY_END),
+            ).rowcount
+
+    def clear(self) -> None:
+        with self.db.lock:
+            self.db.conn.execute('DELETE FROM entries WHERE ns = ?', (self.name,))
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Entries from least to most recently used, like LRUCache.items()"""
+        with self.db.lock:
+            rows = self.db.conn.execute(
+                'SELECT key, value FROM entries WHERE ns = ? ORDER BY touched', (self.name,)
+            ).fetchall()
+        items = [(_decode_key(k), _load(v)) for k, v in rows]
+        return [(k, v) for k, v in items if v is not _UNREADABLE]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.db.lock:
+            return self.db.conn.execute(
+                'SELECT 1 FROM entries WHERE ns = ? AND key = ?', (self.name, _encode_key(key))
+            ).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self.db.lock:
+            return self.db.conn.execute('SELECT COUNT(*) FROM entries WHERE ns = ?', (self.name,)).fetchone()[0]
+
+
+_CACHES: Dict[str, Any] = {}
+_DATABASE: Optional[_Database] = None
+_LOCK = threading.Lock()
+
+
+def cache(name: str, maxsize: int = 1024):
+    """Process-wide cache called name on the configured backend"""
+    global _DATABASE
+    with _LOCK:
+        existing = _CACHES.get(name)
+        if existing is not None:
+            return existing
+        if BACKEND == 'sqlite':
+            if _DATABASE is None:
+                _DATABASE = _Database(STATE_FILE)
+            created = SQLiteCache(_DATABASE, name, maxsize)
+        elif BACKEND == 'memory':
+            created = LRUCache(maxsize=maxsize)
+        else:
+            raise ValueError(f"Unknown MAIL_STATE backend '{BACKEND}'")
+        _CACHES[name] = created
+        return created
+
+
+def caches() -> Dict[str, Any]:
+    """Every cache created so far, by name"""
+    with _LOCK:
+        return dict(_CACHES)
+
+
+def shared() -> bool:
+    """Whether caches are visible to other processes"""
+    return BACKEND != 'memory'
+
+
+async def offload(fn: Callable[..., Any], *args) -> Any:
+    """Call a cache method from async code; database I/O runs in a worker thread"""
+    if BACKEND == 'memory':
+        return fn(*args)  # in-process dict work; a thread hop would cost more
+    return await asyncio.to_thread(fn, *args)
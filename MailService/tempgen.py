@@ -10,19 +10,25 @@ from pathlib import Path
 from typing import Dict, List, Optional
 from time import time  # Added for timers
 import re  # For URL detection
-import sys
 from PyQt6.QtCore import Qt, QPoint
 from PyQt6 import QtWidgets, QtCore, QtGui
 from PyQt6.QtWidgets import QApplication
-import qasync
-import aiohttp
 
-# Import all our API classes
-from temp_mail_apis import SERVICE_REGISTRY, GuerrillaMailAPI
+# Make the MailService package importable when run as a script from this directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Adapter classes are resolved lazily through the registry
+from MailService.temp_mail_apis import SERVICE_REGISTRY
+from MailService.search_index import SearchIndex
+from MailService.archive import open_archive
+from MailService.profiling import maybe_profiled
+from MailService import lifecycle, looplag
 
 # Configuration file path
 CONFIG_FILE = Path('tempmail_config.json')
 MESSAGES_FILE = Path('tempmail_messages.json')  # For persisting messages
+INDEX_FILE = Path('tempmail_index.sqlite3')  # Full-text index over cached messages
+ARCHIVE_DIR = Path('mails')  # Mails of expired addresses, same layout as MailClient's
 
 # Add this import
 import warnings
@@ -169,6 +175,48 @@ QLabel#settings-header {
 # Set logging level to warn to remove INFO outputs
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def _index_rows(addr: str, service: Optional[str], msgs: List[Dict]):
+    """Map cached message dicts to search index rows"""
+    for msg in msgs:
+        yield {
+            'email': addr,
+            'message_id': msg.get('mail_id'),
+            'subject': msg.get('subject', ''),
+            'sender': msg.get('mail_from', ''),
+            'body': msg.get('mail_body', ''),
+            'service': service,
+            'received_at': msg.get('receive_time'),
+        }
+
+def _archive_messages(addr: str, service: Optional[str], msgs: List[Dict]) -> int:
+    """Save cached messages to the mail archive; returns how many"""
+    archive = open_archive(str(ARCHIVE_DIR))
+    saved = []
+    for msg in msgs:
+        received = msg.get('receive_time')
+        meta = {
+            'subject': msg.get('subject'),
+            'from': msg.get('mail_from'),
+            'service': service,
+            'received_at': (datetime.fromtimestamp(received).strftime('%Y-%m-%d %H:%M:%S')
+                            if isinstance(received, (int, float)) else msg.get('mail_date')),
+        }
+        body = msg.get('mail_body', '')
+        saved.append((archive.save(addr, msg.get('mail_id'), meta, body, index=False), body))
+    archive.index_many(saved)
+    return len(saved)
+
+def _merge_new_messages(cached: List[Dict], msgs: List[Dict]) -> List[Dict]:
+    """Append copies of messages not yet cached (by mail_id); return the new ones"""
+    added = []
+    for msg in msgs:
+        # Check if message already in cache by ID
+        if not any(cached_msg.get('mail_id') == msg.get('mail_id')
+                  for cached_msg in cached):
+            cached.append(msg.copy())
+            added.append(msg)
+    return added
+
 class DummyCard:
     """Dummy card class to handle compatibility with old config."""
     def update_message_count(self, count):
@@ -351,10 +399,10 @@ class CompactToolbar(QtWidgets.QWidget):
         layout.setContentsMargins(6, 4, 6, 4)
         layout.setSpacing(6)
         
-        # Service selector - use class SERVICE_NAME constant without instantiation
+        # Service selector - display names come from the registry, no adapter import
         self.service_combo = QtWidgets.QComboBox()
-        for key, api_class in SERVICE_REGISTRY.items():
-            self.service_combo.addItem(api_class.SERVICE_NAME, key)
+        for key in SERVICE_REGISTRY:
+            self.service_combo.addItem(SERVICE_REGISTRY.service_name(key), key)
         layout.addWidget(self.service_combo)
         
         # Create button
@@ -480,6 +528,7 @@ class TempMailApp(QtWidgets.QMainWindow):
         self.setWindowFlag(QtCore.Qt.WindowType.FramelessWindowHint)
         self.setMinimumSize(500, 400)  # Smaller minimum size
         self.apis: Dict[str, any] = {}  # Store API instances
+        self.closed = asyncio.Event()  # Set once the window is closed; main() then shuts down
         self.addresses: Dict[str, Dict] = {}
         self.current_address: Optional[str] = None
         self.refresh_timer = None
@@ -488,6 +537,8 @@ class TempMailApp(QtWidgets.QMainWindow):
         self.refresh_interval = 3  # Default 3 seconds
         self.message_cache: Dict[str, List[Dict]] = {}  # Cache for messages
         self.recently_updated = set()  # Track addresses with new messages
+        self.search_index = SearchIndex(str(INDEX_FILE))
+        self.expiry = lifecycle.index()  # When each address stops being polled
         self._drag_pos = None
         self._setup_auto_refresh()
         
@@ -547,7 +598,13 @@ class TempMailApp(QtWidgets.QMainWindow):
         refresh_inbox_btn = QtWidgets.QPushButton('🗘')
         refresh_inbox_btn.clicked.connect(lambda: asyncio.create_task(self._refresh_messages()))
         header_layout.addWidget(refresh_inbox_btn)
-        header_layout.addStretch()
+
+        # Filter box - full-text search over subject, sender and body
+        self.search_box = QtWidgets.QLineEdit()
+        self.search_box.setPlaceholderText('Filter…')
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self._on_filter_changed)
+        header_layout.addWidget(self.search_box, 1)
         
         vi.addLayout(header_layout)
 
@@ -661,10 +718,8 @@ class TempMailApp(QtWidgets.QMainWindow):
             return
         
         try:
-            # Create new API instance - no need to close sessions as they're created/closed per method call now
-            api_class = type(api)
-            api = self.apis[service_key] = api_class()
-            
+            # The adapter (and its connection pool) is shared with refreshes of earlier
+            # addresses; pools are closed once, on exit
             resp = await api.create_address(self.current_domain)
             addr = resp.get('email')
             token = resp.get('token')
@@ -680,6 +735,7 @@ class TempMailApp(QtWidgets.QMainWindow):
                 'created_at': time(),  # Add creation timestamp
                 'last_updated': time()  # Track last update time
             }
+            self.expiry.track(addr, service_key, self.addresses[addr]['created_at'])
             self.unread_counts[addr] = 0
             self.current_address = addr
             self.message_cache[addr] = []  # Initialize cache for this address
@@ -699,7 +755,9 @@ class TempMailApp(QtWidgets.QMainWindow):
 
     def _auto_refresh_messages(self):
         """Automatically check for new messages and update timers."""
-        asyncio.create_task(self._async_refresh_all())
+        self._expire_addresses()
+        # Profiled only when MAIL_PROFILE includes gui.refresh
+        asyncio.create_task(maybe_profiled('gui.refresh', self._async_refresh_all()))
         
         # Also trigger timer updates for all email items
         for i in range(self.addr_list.count()):
@@ -718,8 +776,8 @@ class TempMailApp(QtWidgets.QMainWindow):
         self.recently_updated = set()  # Reset recently updated addresses
         
         for addr in address_list:
-            if addr not in self.addresses:
-                continue  # Skip if address was removed during iteration
+            if addr not in self.addresses or self.expiry.is_expired(addr):
+                continue  # Skip if address was removed or expired during iteration
                 
             data = self.addresses[addr]
             try:
@@ -739,13 +797,8 @@ class TempMailApp(QtWidgets.QMainWindow):
                 old_count = len(self.message_cache.get(addr, []))
                 
                 # Add new messages to cache
-                new_messages_added = False
-                for msg in msgs:
-                    # Check if message already in cache by ID
-                    if not any(cached_msg.get('mail_id') == msg.get('mail_id') 
-                              for cached_msg in self.message_cache[addr]):
-                        self.message_cache[addr].append(msg.copy())
-                        new_messages_added = True
+                added = _merge_new_messages(self.message_cache[addr], msgs)
+                self._index_messages(addr, added)
                 
                 # Use cached messages
                 cached_msgs = self.message_cache[addr]
@@ -806,14 +859,35 @@ class TempMailApp(QtWidgets.QMainWindow):
         self._show_message_page()
         asyncio.create_task(self._show_message(mail_id))
 
+    def _expire_addresses(self):
+        """Stop polling expired addresses, archive their mails and drop them."""
+        for addr, _ in self.expiry.pop_expired():
+            if addr not in self.addresses:
+                continue
+            service = self.addresses[addr].get('service')
+            msgs = self.message_cache.get(addr, [])
+            self._delete_address(addr)
+            asyncio.create_task(self._archive_expired(addr, service, msgs))
+
+    async def _archive_expired(self, addr: str, service: Optional[str], msgs: List[Dict]):
+        """Archive an expired address's mails off the event loop."""
+        try:
+            count = await asyncio.to_thread(_archive_messages, addr, service, msgs)
+            mails = f'{count} mail' if count == 1 else f'{count} mails'
+            self.statusBar().showMessage(f'⌛ {addr} expired; {mails} archived to {ARCHIVE_DIR}/', 5000)
+        except Exception as e:
+            logging.error(f'Error archiving {addr}: {e}')
+
     def _delete_address(self, addr: str):
         """Delete a specific address."""
         if addr and addr in self.addresses:
             del self.addresses[addr]
+            self.expiry.discard(addr)
             if addr in self.unread_counts:
                 del self.unread_counts[addr]
             if addr in self.message_cache:
                 del self.message_cache[addr]
+            self.search_index.remove(addr)
             
             if addr == self.current_address:
                 self.current_address = None
@@ -828,22 +902,6 @@ class TempMailApp(QtWidgets.QMainWindow):
         clipboard.setText(email)
         self.statusBar().showMessage(f'   🗐 Copied: {email}', 3000)
 
-    def _get_service_expiry(self, service_key: str) -> int:
-        """Get the expiration time in seconds for a service."""
-        api = self._get_api(service_key)
-        if api and hasattr(api, 'expiration_seconds'):
-            return api.expiration_seconds
-        
-        # Default expiration times if the API doesn't have the property
-        expiry_map = {
-            'guerrillamail': 3600,    # 1 hour
-            'mailgw': 600,          # 10 minutes
-            'dropmail': 600,         # 10 minutes
-            'mailtm': 604800,          # 7 days
-            'tempmaillol': 3600       # 1 hour
-        }
-        return expiry_map.get(service_key, 3600)  # Default to 1 hour if service not found
-
     def _update_address_list(self):
         """Update the address list with custom widgets, sort with recent emails at top."""
         self.addr_list.clear()
@@ -871,7 +929,7 @@ class TempMailApp(QtWidgets.QMainWindow):
             
             # Get creation time and expiry period
             created_at = data.get('created_at')
-            expiry_seconds = self._get_service_expiry(service_key)
+            expiry_seconds = lifecycle.ttl(service_key)
             
             item = QtWidgets.QListWidgetItem()
             item.setSizeHint(QtCore.QSize(0, 46))  # Slightly taller for service badge
@@ -889,7 +947,10 @@ class TempMailApp(QtWidgets.QMainWindow):
             return
             
         self.msg_list.clear()
+        matching_ids = self._matching_ids()
         for msg in reversed(messages):
+            if matching_ids is not None and str(msg.get('mail_id')) not in matching_ids:
+                continue
             subj = msg.get('subject', 'No Subject')
             sender = msg.get('mail_from', 'Unknown')
             date = self._fmt(ts=msg.get('mail_date'))
@@ -904,6 +965,32 @@ class TempMailApp(QtWidgets.QMainWindow):
             
             self.msg_list.addItem(item)
 
+    def _matching_ids(self):
+        """Return mail ids matching the filter box, or None when no filter is set"""
+        text = self.search_box.text().strip() if hasattr(self, 'search_box') else ''
+        if not text or not self.current_address:
+            return None
+        try:
+            return self.search_index.search_ids(text, email=self.current_address)
+        except Exception as e:
+            logging.error(f"Search failed: {e}")
+            return None
+
+    def _on_filter_changed(self, _text: str):
+        """Re-render the inbox with the current filter"""
+        if self.current_address in self.message_cache:
+            self._update_message_list(self.message_cache[self.current_address])
+
+    def _index_messages(self, addr: str, msgs: List[Dict]):
+        """Add messages to the full-text index"""
+        if not msgs:
+            return
+        service = self.addresses.get(addr, {}).get('service')
+        try:
+            self.search_index.add_many(_index_rows(addr, service, msgs))
+        except Exception as e:
+            logging.error(f"Error indexing messages: {e}")
+
     def _fmt(self, ts):
         """Format timestamp to readable date."""
         try:
@@ -974,6 +1061,7 @@ class TempMailApp(QtWidgets.QMainWindow):
                     # Add to message cache if not already there
                     if self.current_address in self.message_cache:
                         self.message_cache[self.current_address].append(cached_msg)
+                    self._index_messages(self.current_address, [dict(cached_msg, mail_id=mail_id)])
                     self._save_messages()
             
             # If cached message doesn't have body content, fetch it again
@@ -986,6 +1074,7 @@ class TempMailApp(QtWidgets.QMainWindow):
                     for key in ['mail_date', 'mail_size']:
                         if key in fresh_msg and fresh_msg[key]:
                             cached_msg[key] = fresh_msg[key]
+                    self._index_messages(self.current_address, [cached_msg])
                     self._save_messages()
             
             html = cached_msg.get('mail_body', '')
@@ -1090,12 +1179,8 @@ class TempMailApp(QtWidgets.QMainWindow):
             old_count = len(self.message_cache.get(self.current_address, []))
             
             # Add new messages to cache
-            has_new_messages = False
-            for msg in msgs:
-                if not any(cached_msg.get('mail_id') == msg.get('mail_id') 
-                          for cached_msg in self.message_cache[self.current_address]):
-                    self.message_cache[self.current_address].append(msg.copy())
-                    has_new_messages = True
+            added = _merge_new_messages(self.message_cache[self.current_address], msgs)
+            self._index_messages(self.current_address, added)
             
             # Use cached messages
             cached_msgs = self.message_cache[self.current_address]
@@ -1105,7 +1190,7 @@ class TempMailApp(QtWidgets.QMainWindow):
             self._update_message_list(cached_msgs)
             
             # If we have new messages, update last_updated time
-            if has_new_messages:
+            if added:
                 data['last_updated'] = time()
                 # Add to recently updated set
                 self.recently_updated.add(self.current_address)
@@ -1130,6 +1215,9 @@ class TempMailApp(QtWidgets.QMainWindow):
                     for addr, data in self.addresses.items():
                         if 'last_updated' not in data:
                             data['last_updated'] = data.get('created_at', time())
+                        # Addresses that expired while the app was closed go on the first tick
+                        self.expiry.track(addr, data.get('service', 'guerrillamail'),
+                                          data.get('created_at') or data['last_updated'])
                     
                     if self.addresses:
                         self.current_address = next(iter(self.addresses))
@@ -1144,6 +1232,10 @@ class TempMailApp(QtWidgets.QMainWindow):
             try:
                 with open(MESSAGES_FILE) as f:
                     self.message_cache = json.load(f)
+                # Index anything cached before the index existed
+                for addr, msgs in self.message_cache.items():
+                    service = self.addresses.get(addr, {}).get('service')
+                    self.search_index.add_many(_index_rows(addr, service, msgs), replace=False)
             except Exception as e:
                 logging.error(f"Error loading messages: {e}")
                 self.message_cache = {}
@@ -1171,21 +1263,32 @@ class TempMailApp(QtWidgets.QMainWindow):
         except Exception as e:
             logging.error(e)
         
-        # No need to close sessions as they're created and closed per method now
+        self.closed.set()
         event.accept()
 
+    async def close_apis(self):
+        """Close every adapter's connection pools"""
+        await asyncio.gather(*(api.close() for api in self.apis.values()), return_exceptions=True)
+
 async def main():
     """Main entry point."""
     try:
-        app = QtWidgets.QApplication(sys.argv)
+        # qasync.run already created the application; a second one would be torn down on return
+        app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+        # Quit from here instead, after the adapters' connection pools are closed
+        app.setQuitOnLastWindowClosed(False)
         window = TempMailApp()
         window.show()
-        await asyncio.Future()
+        # Logs UI stalls (MAIL_LOOP_LAG=0 disables)
+        looplag.install('gui')
+        await window.closed.wait()
+        await window.close_apis()
     except Exception as e:
         logging.error(f"Error starting application: {e}")
         sys.exit(1)
 
 if __name__ == '__main__':
+    import qasync  # only needed to run the GUI event loop
     try:
         qasync.run(main())
     except Exception as e:
@@ -0,0 +1,528 @@
+"""Sampled tracing of gateway requests and their upstream HTTP calls.
+
+TracingMiddleware opens a server span for each gateway request and keeps
+its trace context in a contextvar. An incoming W3C traceparent header is
+continued, sampling decision included; otherwise a new trace starts at
+the sample rate. The response carries a traceparent naming the request's
+span.
+
+Upstream calls are traced via aiohttp TraceConfig. Each becomes one flat
+span holding its phase timings (pool wait, DNS, connect, TTFB, body
+download, JSON decode), payload sizes, status and retry attempt. Made
+while a gateway request is served, it joins that request's trace as a
+child of its span and sends the matching traceparent upstream. Spans are
+exported from a background thread to a JSONL file and/or an OTLP/HTTP
+JSON endpoint.
+
+Tracing is off unless configured:
+
+    MAIL_TRACE_FILE=spans.jsonl          append spans to a JSONL file
+    MAIL_TRACE_OTLP=http://host:4318     POST spans to <url>/v1/traces
+    MAIL_TRACE_SAMPLE=0.1                fraction of requests to trace (default 1)
+
+connect_ms includes the TLS handshake for https upstreams; aiohttp does not
+signal the two separately.
+
+A stand-in collector and a summary report are included:
+
+    python -m MailService.tracing collect --port 4318 --out spans.jsonl
+    python -m MailService.tracing summary spans.jsonl
+"""
+import argparse
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import aiohttp  # imported lazily: the gateway itself must not load it
+
+
+SAMPLE_RATE = float(os.environ.get('MAIL_TRACE_SAMPLE', '1'))
+TRACE_FILE = os.environ.get('MAIL_TRACE_FILE')
+OTLP_ENDPOINT = os.environ.get('MAIL_TRACE_OTLP')
+
+# Path segments this long are tokens or message ids; keep them out of spans
+_ID_SEGMENT = re.compile(r'/[^/]{16,}')
+
+_TRACEPARENT = re.compile(r'([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?')
+
+# (trace_id, span_id, sampled) of the gateway request being served, if any
+_current: contextvars.ContextVar[Optional[Tuple[str, str, bool]]] = contextvars.ContextVar(
+    'mail_trace', default=None)
+
+
+class SpanExporter:
+    """Batches finished spans on a daemon thread so the event loop never blocks on I/O."""
+
+    def __init__(self, path: Optional[str] = None, otlp_endpoint: Optional[str] = None,
+                 batch_size: int = 256, interval: float = 1.0):
+        self.path = path
+        self.otlp_url = otlp_endpoint.rstrip('/') + '/v1/traces' if otlp_endpoint else None
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: 'queue.Queue[Optional[Dict]]' = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, span: Dict) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch: List[Dict] = []
+            deadline = time.monotonic() + self.interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stop = True
+                    break
+                batch.append(span)
+            if batch:
+                self._export(batch)
+            if stop:
+                return
+
+    def _export(self, batch: List[Dict]):
+        if self.path:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(span, separators=(',', ':')) + '\n' for span in batch)
+        if self.otlp_url:
+            import urllib.request
+            body = json.dumps(to_otlp(batch)).encode('utf-8')
+            req = urllib.request.Request(self.otlp_url, data=body, headers={'Content-Type': 'application/json'})
+            try:
+                urllib.request.urlopen(req, timeout=5).close()
+            except OSError:
+                self.dropped += len(batch)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans: List[Dict]) -> Dict:
+    """Wrap flat spans in an OTLP/HTTP JSON ExportTraceServiceRequest"""
+    reserved = ('trace_id', 'span_id', 'parent_id', 'kind', 'name', 'start_ns', 'end_ns')
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            'traceId': span['trace_id'],
+            'spanId': span['span_id'],
+            'name': span['name'],
+            'kind': 2 if span.get('kind') == 'server' else 3,  # SPAN_KIND_SERVER / SPAN_KIND_CLIENT
+            'startTimeUnixNano': str(span['start_ns']),
+            'endTimeUnixNano': str(span['end_ns']),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in span.items() if k not in reserved],
+            'status': {'code': 2 if 'error' in span or span.get('status', 0) >= 500 else 1},
+        }
+        if span.get('parent_id'):
+            otlp_span['parentSpanId'] = span['parent_id']
+        otlp_spans.append(otlp_span)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'mail-adapters'}}]},
+        'scopeSpans': [{'scope': {'name': 'MailService.tracing'}, 'spans': otlp_spans}],
+    }]}
+
+
+def from_otlp(payload: Dict) -> List[Dict]:
+    """Flatten an OTLP/HTTP JSON request back into flat spans"""
+    spans = []
+    for resource in payload.get('resourceSpans', []):
+        for scope in resource.get('scopeSpans', []):
+            for s in scope.get('spans', []):
+                span = {
+                    'trace_id': s.get('traceId'), 'span_id': s.get('spanId'), 'name': s.get('name'),
+                    'kind': 'server' if s.get('kind') == 2 else 'client',
+                    'start_ns': int(s.get('startTimeUnixNano', 0)), 'end_ns': int(s.get('endTimeUnixNano', 0)),
+                }
+                if s.get('parentSpanId'):
+                    span['parent_id'] = s['parentSpanId']
+                for attr in s.get('attributes', []):
+                    value = attr.get('value', {})
+                    if 'intValue' in value:
+                        span[attr['key']] = int(value['intValue'])
+                    else:
+                        span[attr['key']] = next(iter(value.values()), None)
+                spans.append(span)
+    return spans
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent span_id, sampled) from a W3C traceparent header, if valid"""
+    match = _TRACEPARENT.fullmatch((value or '').strip())
+    if not match:
+        return None
+    version, trace_id, span_id, flags, extra = match.groups()
+    if version == 'ff' or (version == '00' and extra) or not int(trace_id, 16) or not int(span_id, 16):
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+def current() -> Optional[Tuple[str, str, bool]]:
+    """Trace context of the gateway request being served, if any"""
+    return _current.get()
+
+
+@functools.lru_cache(maxsize=None)
+def response_class():
+    """ClientResponse subclass that times JSON decoding separately from the download"""
+    import aiohttp
+
+    class TracedResponse(aiohttp.ClientResponse):
+        async def json(self, *args, **kwargs):
+            await self.read()
+            started = time.perf_counter()
+            try:
+                return await super().json(*args, **kwargs)
+            finally:
+                span = getattr(self, '_mail_span', None)
+                if span is not None:
+                    span['json_decode_ms'] = _ms(time.perf_counter() - started)
+
+    return TracedResponse
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def _phase(ctx, name: str, started_attr: str):
+    started = getattr(ctx, started_attr, None)
+    if ctx.span is not None and started is not None:
+        ctx.span[name] = _ms(time.perf_counter() - started)
+
+
+class Tracer:
+    """Builds the TraceConfig that turns sampled requests into spans."""
+
+    def __init__(self, exporter: SpanExporter, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def trace_config(self) -> 'aiohttp.TraceConfig':
+        import aiohttp
+
+        config = aiohttp.TraceConfig()
+        config.on_request_start.append(self._on_request_start)
+        config.on_connection_queued_start.append(self._mark('queued_at'))
+        config.on_connection_queued_end.append(self._end('pool_wait_ms', 'queued_at'))
+        config.on_dns_resolvehost_start.append(self._mark('dns_at'))
+        config.on_dns_resolvehost_end.append(self._end('dns_ms', 'dns_at'))
+        config.on_dns_cache_hit.append(self._flag('dns_cached'))
+        config.on_connection_create_start.append(self._mark('connect_at'))
+        config.on_connection_create_end.append(self._end('connect_ms', 'connect_at'))
+        config.on_connection_reuseconn.append(self._flag('reused_connection'))
+        config.on_request_headers_sent.append(self._mark('sent_at'))
+        config.on_request_chunk_sent.append(self._on_chunk_sent)
+        config.on_request_end.append(self._on_request_end)
+        config.on_response_chunk_received.append(self._on_chunk_received)
+        config.on_request_exception.append(self._on_request_exception)
+        return config
+
+    async def _on_request_start(self, session, ctx, params):
+        parent = _current.get()
+        sampled = parent[2] if parent is not None else random.random() < self.sample_rate
+        if not sampled:
+            ctx.span = None
+            return
+        info = ctx.trace_request_ctx if isinstance(ctx.trace_request_ctx, dict) else {}
+        url = params.url
+        trace_id = parent[0] if parent is not None else os.urandom(16).hex()
+        span_id = os.urandom(8).hex()
+        params.headers['traceparent'] = format_traceparent(trace_id, span_id, True)
+        ctx.started = time.perf_counter()
+        ctx.span = {
+            'trace_id': trace_id,
+            'span_id': span_id,
+            'parent_id': parent[1] if parent is not None else None,
+            'kind': 'client',
+            'name': f"{params.method} {url.host}",
+            'start_ns': time.time_ns(),
+            'service': info.get('service', ''),
+            'attempt': info.get('attempt', 0),
+            'method': params.method,
+            'host': url.host or '',
+            'path': _ID_SEGMENT.sub('/:id', url.path),
+            'request_bytes': 0,
+            'response_bytes': 0,
+        }
+
+    @staticmethod
+    def _mark(attr: str):
+        async def handler(session, ctx, params):
+            if getattr(ctx, 'span', None) is not None:
+                setattr(ctx, attr, time.perf_counter())
+        return handler
+
+    @staticmethod
+    def _end(name: str, started_attr: str):
+        async def handler(session, ctx, params):
+            if getattr(ctx, 'span', None) is not None:
+                _phase(ctx, name, started_attr)
+        return handler
+
+    @staticmethod
+    def _flag(name: str):
+        async def handler(session, ctx, params):
+            if getattr(ctx, 'span', None) is not None:
+                ctx.span[name] = True
+        return handler
+
+    async def _on_chunk_sent(self, session, ctx, params):
+        if getattr(ctx, 'span', None) is not None:
+            ctx.span['request_bytes'] += len(params.chunk)
+
+    async def _on_request_end(self, session, ctx, params):
+        if getattr(ctx, 'span', None) is None:
+            return
+        ctx.headers_at = time.perf_counter()
+        ctx.span['ttfb_ms'] = _ms(ctx.headers_at - getattr(ctx, 'sent_at', ctx.started))
+        ctx.span['status'] = params.response.status
+        # Finished by finish() once the caller is done with the body
+        params.response._mail_span = ctx.span
+        params.response._mail_trace = ctx
+
+    async def _on_chunk_received(self, session, ctx, params):
+        if getattr(ctx, 'span', None) is not None:
+            ctx.span['response_bytes'] += len(params.chunk)
+            ctx.last_chunk_at = time.perf_counter()
+
+    async def _on_request_exception(self, session, ctx, params):
+        if getattr(ctx, 'span', None) is None:
+            return
+        ctx.span['error'] = type(params.exception).__name__
+        self._finish(ctx)
+
+    def _finish(self, ctx):
+        span, ctx.span = ctx.span, None
+        if span is None:
+            return
+        now = time.perf_counter()
+        if getattr(ctx, 'last_chunk_at', None) and getattr(ctx, 'headers_at', None):
+            span['body_ms'] = _ms(ctx.last_chunk_at - ctx.headers_at)
+        span['total_ms'] = _ms(now - ctx.started)
+        span['end_ns'] = span['start_ns'] + int((now - ctx.started) * 1e9)
+        self.exporter.emit(span)
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def configure(sample_rate: float = 1.0, path: Optional[str] = None,
+              otlp_endpoint: Optional[str] = None) -> Optional[Tracer]:
+    """Enable tracing for sessions created from now on; no sinks disables it"""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is not None:
+            _tracer.exporter.close()
+        _tracer = None
+        if (path or otlp_endpoint) and sample_rate > 0:
+            _tracer = Tracer(SpanExporter(path, otlp_endpoint), sample_rate)
+        return _tracer
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def trace_configs() -> Optional[List['aiohttp.TraceConfig']]:
+    """TraceConfigs for a new ClientSession, or None while tracing is off"""
+    return [_tracer.trace_config()] if _tracer is not None else None
+
+
+def request_context(service: str, attempt: int) -> Optional[Dict]:
+    return {'service': service, 'attempt': attempt} if _tracer is not None else None
+
+
+def finish(response: Optional['aiohttp.ClientResponse']) -> None:
+    """Close the span of a response whose body the caller has finished with"""
+    ctx = getattr(response, '_mail_trace', None)
+    if ctx is not None and _tracer is not None:
+        response._mail_trace = None
+        _tracer._finish(ctx)
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per gateway request.
+
+    Upstream spans started while the request is handled share its trace
+    and name its span as their parent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        tracer = _tracer
+        if scope['type'] != 'http' or tracer is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get('headers') or [])
+        parent = parse_traceparent(headers.get(b'traceparent', b'').decode('latin-1'))
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id, sampled = os.urandom(16).hex(), None, random.random() < tracer.sample_rate
+        span_id = os.urandom(8).hex()
+        traceparent = format_traceparent(trace_id, span_id, sampled).encode('latin-1')
+        span = {
+            'trace_id': trace_id,
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'kind': 'server',
+            'name': f"{scope['method']} {_ID_SEGMENT.sub('/:id', scope['path'])}",
+            'start_ns': time.time_ns(),
+            'service': 'gateway',
+            'method': scope['method'],
+            'path': _ID_SEGMENT.sub('/:id', scope['path']),
+        }
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                span['status'] = message['status']
+                message = {**message, 'headers': [*message.get('headers', []), (b'traceparent', traceparent)]}
+            await send(message)
+
+        started = time.perf_counter()
+        token = _current.set((trace_id, span_id, sampled))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            span['error'] = type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            if sampled:
+                elapsed = time.perf_counter() - started
+                span['total_ms'] = _ms(elapsed)
+                span['end_ns'] = span['start_ns'] + int(elapsed * 1e9)
+                tracer.exporter.emit(span)
+
+
+if TRACE_FILE or OTLP_ENDPOINT:
+    configure(SAMPLE_RATE, TRACE_FILE, OTLP_ENDPOINT)
+
+
+def collect(port: int, out: str) -> None:
+    """Minimal OTLP/HTTP JSON collector writing flat spans to a JSONL file"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/v1/traces':
+                self.send_error(404)
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                spans = from_otlp(json.loads(self.rfile.read(length)))
+            except ValueError:
+                self.send_error(400, 'OTLP JSON expected')
+                return
+            with lock, open(out, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(span, separators=(',', ':')) + '\n' for span in spans)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    print(f"Collecting spans on http://127.0.0.1:{port}/v1/traces -> {out}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def summarize(path: str) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Per-service p50/p95 of each phase in a span file"""
+    phases = ('total_ms', 'pool_wait_ms', 'dns_ms', 'connect_ms', 'ttfb_ms', 'body_ms', 'json_decode_ms',
+              'request_bytes', 'response_bytes')
+    by_service: Dict[str, Dict[str, List[float]]] = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            span = json.loads(line)
+            series = by_service.setdefault(span.get('service') or span.get('host', '?'), {})
+            for phase in phases:
+                if phase in span:
+                    series.setdefault(phase, []).append(float(span[phase]))
+            series.setdefault('errors', []).append(1.0 if 'error' in span else 0.0)
+    return {
+        service: {
+            phase: {'n': len(v), 'p50': _percentile(v, 50), 'p95': _percentile(v, 95)}
+            if phase != 'errors' else {'n': len(v), 'rate': sum(v) / len(v)}
+            for phase, v in series.items()
+        }
+        for service, series in by_service.items()
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Upstream trace tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_collect = sub.add_parser('collect', help='Run a stand-in OTLP/HTTP collector')
+    p_collect.add_argument('--port', type=int, default=4318)
+    p_collect.add_argument('--out', default='spans.jsonl')
+    p_summary = sub.add_parser('summary', help='Per-service phase percentiles of a span file')
+    p_summary.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'collect':
+        collect(args.port, args.out)
+        return 0
+    for service, phases in sorted(summarize(args.path).items()):
+        print(service)
+        for phase, stats in phases.items():
+            if phase == 'errors':
+                print(f"  {'error rate':<15} {stats['rate']:.1%} of {stats['n']}")
+            else:
+                print(f"  {phase:<15} p50 {stats['p50']:10.2f}  p95 {stats['p95']:10.2f}  (n={stats['n']})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
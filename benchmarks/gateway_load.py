@@ -0,0 +1,253 @@
+"""Gateway throughput and tail-latency benchmark against the upstream simulator.
+
+Starts the simulator and a uvicorn gateway as subprocesses (the gateway
+pointed at the simulator via MAIL_UPSTREAM_BASE). It then creates a few
+addresses per service and drives a mix of GET /messages and
+GET /messages/{id} from concurrent clients for a fixed duration, after a
+warm-up. Reported:
+
+  * requests/s and p50/p95/p99/max latency per operation and overall
+  * status code counts
+  * upstream calls per client request (from the simulator's counters)
+  * gateway RSS at start, end and peak
+
+Usage:
+    python benchmarks/gateway_load.py [--concurrency 32] [--duration 20] [--json results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List
+
+import aiohttp
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICES = ['guerrillamail', 'mailgw', 'mailtm', 'dropmail', 'tempmaillol']
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_bytes(pid: int) -> int:
+    """Resident set size of a process (psutil if available, else /proc)"""
+    try:
+        import psutil
+    except ImportError:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return 0
+    return psutil.Process(pid).memory_info().rss
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def latency_summary(samples: List[float], seconds: float) -> Dict[str, float]:
+    return {
+        'requests': len(samples),
+        'rps': round(len(samples) / seconds, 1) if seconds else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 95) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        'max_ms': round(max(samples) * 1000, 2) if samples else 0.0,
+    }
+
+
+async def wait_ready(session: aiohttp.ClientSession, url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(url) as r:
+                if r.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f'{url} not ready after {timeout}s')
+
+
+async def sim_requests(session: aiohttp.ClientSession, sim_url: str) -> int:
+    async with session.get(f'{sim_url}/_sim/stats') as r:
+        stats = await r.json()
+    return sum(stats['requests'].values())
+
+
+class LoadRun:
+    def __init__(self, gateway: str, addresses: List[Dict], mix: Dict[str, int]):
+        self.gateway = gateway
+        self.addresses = addresses
+        self.ops = [op for op, weight in mix.items() for _ in range(weight)]
+        self.latencies: Dict[str, List[float]] = {op: [] for op in mix}
+        self.statuses: Counter = Counter()
+        self.recording = False
+        self.message_ids: Dict[str, List[str]] = {}
+
+    async def one(self, session: aiohttp.ClientSession):
+        addr = random.choice(self.addresses)
+        op = random.choice(self.ops)
+        params = {'service': addr['service'], 'token': addr['token']}
+        ids = self.message_ids.get(addr['token'])
+        if op == 'fetch' and ids:
+            url = f"{self.gateway}/messages/{random.choice(ids)}"
+        else:
+            op, url = 'messages', f'{self.gateway}/messages'
+        started = time.perf_counter()
+        try:
+            async with session.get(url, params=params) as r:
+                body = await r.read()
+                status = r.status
+        except aiohttp.ClientError as e:
+            status, body = type(e).__name__, b''
+        elapsed = time.perf_counter() - started
+        if op == 'messages' and status == 200:
+            self.message_ids[addr['token']] = [str(m['mail_id']) for m in json.loads(body)]
+        if self.recording:
+            self.latencies[op].append(elapsed)
+            self.statuses[str(status)] += 1
+
+    async def worker(self, session: aiohttp.ClientSession, stop_at: float):
+        while time.monotonic() < stop_at:
+            await self.one(session)
+
+
+async def run(args) -> Dict:
+    sim_port, gw_port = free_port(), free_port()
+    sim_url, gw_url = f'http://127.0.0.1:{sim_port}', f'http://127.0.0.1:{gw_port}'
+    env = {
+        **os.environ,
+        'PYTHONPATH': ROOT,
+        'MAIL_UPSTREAM_BASE': sim_url,
+        # Measure the gateway, not the admission or upstream limits
+        'MAIL_CLIENT_RATE': '1000000', 'MAIL_CLIENT_BURST': '1000000',
+        'MAIL_CLIENT_CONCURRENCY': str(args.concurrency * 2),
+        'MAIL_ARCHIVE_DIR': tempfile.mkdtemp(prefix='gateway-load-'),
+    }
+    if not args.keep_limits:
+        env['MAIL_UPSTREAM_LIMITS'] = 'off'
+    sim_cmd = [sys.executable, '-m', 'MailService.simulator', '--port', str(sim_port),
+               '--latency', args.latency, '--error-rate', str(args.error_rate),
+               '--initial', str(args.initial), '--arrival', str(args.arrival), '--seed', '1']
+    gw_cmd = [sys.executable, '-m', 'uvicorn', 'MailService.api_server:app', '--port', str(gw_port),
+              '--log-level', 'warning', '--workers', str(args.workers), '--no-access-log']
+    procs = [subprocess.Popen(sim_cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)]
+    try:
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await wait_ready(session, f'{sim_url}/_sim/stats')
+            procs.append(subprocess.Popen(gw_cmd, cwd=ROOT, env=env))
+            gw_pid = procs[-1].pid
+            await wait_ready(session, f'{gw_url}/readyz')
+            rss_start = rss_bytes(gw_pid)
+
+            services = args.services.split(',')
+            created = await asyncio.gather(*(
+                session.post(f'{gw_url}/address', json={'service': s}) for s in services for _ in range(args.addresses)
+            ))
+            addresses = []
+            for r in created:
+                if r.status == 200:
+                    addresses.append(await r.json())
+                r.release()
+            if not addresses:
+                raise RuntimeError('No addresses could be created')
+
+            mix = dict(part.split('=') for part in args.mix.split(','))
+            load = LoadRun(gw_url, addresses, {op: int(w) for op, w in mix.items()})
+
+            warm_stop = time.monotonic() + args.warmup
+            await asyncio.gather(*(load.worker(session, warm_stop) for _ in range(args.concurrency)))
+
+            upstream_before = await sim_requests(session, sim_url)
+            load.recording = True
+            rss_peak = rss_bytes(gw_pid)
+            started = time.monotonic()
+            stop_at = started + args.duration
+
+            async def sample_rss():
+                nonlocal rss_peak
+                while time.monotonic() < stop_at:
+                    rss_peak = max(rss_peak, rss_bytes(gw_pid))
+                    await asyncio.sleep(0.25)
+
+            await asyncio.gather(sample_rss(), *(load.worker(session, stop_at) for _ in range(args.concurrency)))
+            elapsed = time.monotonic() - started
+            load.recording = False
+            upstream_calls = await sim_requests(session, sim_url) - upstream_before
+            rss_end = rss_bytes(gw_pid)
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    all_samples = [s for samples in load.latencies.values() for s in samples]
+    return {
+        'config': {k: v for k, v in vars(args).items() if k != 'json'},
+        'duration_s': round(elapsed, 2),
+        'overall': latency_summary(all_samples, elapsed),
+        'operations': {op: latency_summary(s, elapsed) for op, s in load.latencies.items()},
+        'statuses': dict(load.statuses),
+        'upstream_calls_per_request': round(upstream_calls / len(all_samples), 3) if all_samples else None,
+        'rss_mb': {k: round(v / 2 ** 20, 1) for k, v in
+                   (('start', rss_start), ('end', rss_end), ('peak', rss_peak))},
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent client connections')
+    parser.add_argument('--duration', type=float, default=20, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='Unmeasured warm-up seconds')
+    parser.add_argument('--services', default=','.join(SERVICES), help='Comma-separated service keys')
+    parser.add_argument('--addresses', type=int, default=4, help='Addresses per service')
+    parser.add_argument('--mix', default='messages=3,fetch=2', help='Operation weights')
+    parser.add_argument('--latency', default='lognormal:40,0.5', help='Simulated upstream latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Simulated upstream error rate')
+    parser.add_argument('--initial', type=int, default=5, help='Mails per new inbox')
+    parser.add_argument('--arrival', type=float, default=0.05, help='Mail arrival probability per second')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--keep-limits', action='store_true', help='Keep per-service upstream rate limits')
+    parser.add_argument('--json', help='Write machine-readable results here')
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    overall = results['overall']
+    print(f"{overall['requests']} requests in {results['duration_s']} s: {overall['rps']} req/s")
+    for name, stats in [('overall', overall)] + sorted(results['operations'].items()):
+        print(f"  {name:<10} n={stats['requests']:<7} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms"
+              f"  p99 {stats['p99_ms']:8.2f} ms  max {stats['max_ms']:8.2f} ms")
+    print(f"  statuses   {results['statuses']}")
+    print(f"  upstream calls per request: {results['upstream_calls_per_request']}")
+    rss = results['rss_mb']
+    print(f"  gateway RSS: start {rss['start']} MB, end {rss['end']} MB, peak {rss['peak']} MB")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
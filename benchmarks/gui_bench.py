@@ -0,0 +1,291 @@
+"""Headless benchmark for the TempMail GUI at increasing inbox sizes.
+
+Runs TempMailApp on Qt's offscreen platform against the upstream
+simulator (started as a subprocess). For each scale it builds a synthetic
+tempmail_config.json and tempmail_messages.json in a scratch directory,
+fetching the messages through the real adapters so they match what the
+app caches. It then times:
+
+  * startup     TempMailApp() construction until the window's first paint
+  * addresses   _update_address_list()
+  * messages    _update_message_list() on the current address's inbox
+  * show        _show_message() of a large HTML mail (cached, no network)
+  * refresh     one _async_refresh_all() tick, with new mail for some inboxes
+
+A 16 ms QTimer runs alongside every operation. The gaps between its ticks
+are the frame times the UI would get; gaps over --stall-ms are reported
+as event-loop stalls.
+
+Usage:
+    python benchmarks/gui_bench.py [--scales 10x10,100x100,500x100] [--json results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('MAIL_UPSTREAM_LIMITS', 'off')
+
+from gateway_load import free_port, percentile  # noqa: E402
+
+
+class FrameMonitor:
+    """Ticks a QTimer every interval_ms and records the gaps between ticks."""
+
+    def __init__(self, interval_ms: int = 16):
+        from PyQt6 import QtCore
+        self.timer = QtCore.QTimer()
+        self.timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self._tick)
+        self.gaps: List[float] = []
+        self._last = None
+
+    def _tick(self):
+        now = time.perf_counter()
+        if self._last is not None:
+            self.gaps.append(now - self._last)
+        self._last = now
+
+    def __enter__(self) -> 'FrameMonitor':
+        self.gaps = []
+        self._last = time.perf_counter()
+        self.timer.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._tick()
+        self.timer.stop()
+        return False
+
+    def summary(self, stall_ms: float) -> Dict[str, float]:
+        gaps_ms = [g * 1000 for g in self.gaps]
+        stalls = [g for g in gaps_ms if g > stall_ms]
+        return {
+            'frames': len(gaps_ms),
+            'frame_p50_ms': round(percentile(gaps_ms, 50), 1),
+            'frame_p95_ms': round(percentile(gaps_ms, 95), 1),
+            'frame_max_ms': round(max(gaps_ms, default=0.0), 1),
+            'stalls': len(stalls),
+            'stalled_ms': round(sum(stalls), 1),
+        }
+
+
+class PaintWatcher:
+    """Event filter resolving a future on the watched widget's first paint."""
+
+    def __init__(self, widget):
+        from PyQt6 import QtCore
+
+        class _Filter(QtCore.QObject):
+            def eventFilter(inner, obj, event):
+                if event.type() == QtCore.QEvent.Type.Paint and not self.painted.done():
+                    self.painted.set_result(time.perf_counter())
+                return False
+
+        self.painted = asyncio.get_event_loop().create_future()
+        self._filter = _Filter()
+        widget.installEventFilter(self._filter)
+
+
+def large_html(kib: int) -> str:
+    """A mail body of roughly kib KiB with paragraphs, plain URLs and anchors"""
+    block = ('<p>Dear customer, your order #{n} has shipped. Track it at https://track.example.test/{n} '
+             'or read <a href="https://example.test/help/{n}">the help page</a>. '
+             'Questions? Visit www.example.test/support/{n} anytime.</p>\n')
+    parts, n, size = [], 0, 0
+    while size < kib * 1024:
+        part = block.format(n=n)
+        parts.append(part)
+        size += len(part)
+        n += 1
+    return f"<html><body>{''.join(parts)}</body></html>"
+
+
+async def build_fixture(workdir: str, sim_url: str, addresses: int, per_inbox: int, html_kib: int) -> Dict:
+    """Create inboxes on the simulator and write the app's config/messages files"""
+    import aiohttp
+    from MailService.simulator import PROVIDERS
+    from MailService.temp_mail_apis import SERVICE_REGISTRY
+
+    apis = {s: SERVICE_REGISTRY[s]() for s in PROVIDERS}
+    config = {'addresses': {}, 'unread_counts': {}}
+    cache: Dict[str, List[Dict]] = {}
+    now = time.time()
+    async with aiohttp.ClientSession() as control:
+        for i in range(addresses):
+            service = PROVIDERS[i % len(PROVIDERS)]
+            created = await apis[service].create_address()
+            addr = created['email']
+            async with control.post(f'{sim_url}/_sim/deliver', json={'address': addr, 'count': per_inbox}):
+                pass
+            msgs = await apis[service].get_messages(created['token'])
+            cache[addr] = msgs
+            config['addresses'][addr] = {
+                'token': created['token'], 'messages': [], 'service': service,
+                # Fresh, so the 10-minute services don't expire mid-run
+                'created_at': now, 'last_updated': now - i,
+            }
+            config['unread_counts'][addr] = len(msgs)
+    for api in apis.values():
+        await api.close()
+
+    first = next(iter(config['addresses']))
+    cache[first].append({
+        'mail_id': 'bench-large', 'subject': 'Large HTML mail', 'mail_from': 'bench@example.test',
+        'mail_date': '2024-01-01 00:00:00', 'mail_body': large_html(html_kib), 'mail_size': html_kib * 1024,
+        'receive_time': now, 'full_content': True,
+    })
+    with open(os.path.join(workdir, 'tempmail_config.json'), 'w') as f:
+        json.dump(config, f, indent=2)
+    with open(os.path.join(workdir, 'tempmail_messages.json'), 'w') as f:
+        json.dump(cache, f, indent=2)
+    return {'addresses': list(config['addresses']), 'messages': sum(len(m) for m in cache.values()),
+            'messages_file_kib': round(os.path.getsize(os.path.join(workdir, 'tempmail_messages.json')) / 1024)}
+
+
+async def run_scale(sim_url: str, addresses: int, per_inbox: int, args) -> Dict:
+    from MailService import tempgen
+
+    workdir = tempfile.mkdtemp(prefix='gui-bench-')
+    os.chdir(workdir)
+    fixture = await build_fixture(workdir, sim_url, addresses, per_inbox, args.html_kib)
+    results: Dict = {'scale': f'{addresses}x{per_inbox}', 'messages': fixture['messages'],
+                     'messages_file_kib': fixture['messages_file_kib'], 'operations': {}}
+    ops = results['operations']
+    monitor = FrameMonitor()
+
+    async def timed(name: str, fn, repeat: int = 1):
+        durations = []
+        with monitor:
+            await asyncio.sleep(0.05)
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = fn()
+                if asyncio.iscoroutine(result):
+                    await result
+                durations.append(time.perf_counter() - started)
+                await asyncio.sleep(0.02)
+            await asyncio.sleep(0.05)
+        ops[name] = {'ms': round(statistics.median(durations) * 1000, 1), 'runs': repeat,
+                     **monitor.summary(args.stall_ms)}
+
+    # Startup to first paint
+    with monitor:
+        started = time.perf_counter()
+        window = tempgen.TempMailApp()
+        constructed = time.perf_counter()
+        window.refresh_timer.stop()  # ticks are driven explicitly below
+        watcher = PaintWatcher(window)
+        window.resize(520, 640)
+        window.show()
+        painted = await asyncio.wait_for(watcher.painted, 30)
+        await asyncio.sleep(0.05)
+    ops['startup'] = {'ms': round((painted - started) * 1000, 1),
+                      'construct_ms': round((constructed - started) * 1000, 1),
+                      **monitor.summary(args.stall_ms)}
+
+    current = fixture['addresses'][0]
+    window.current_address = current
+    await timed('addresses', window._update_address_list, args.repeat)
+    window.stacked.setCurrentIndex(1)
+    await timed('messages', lambda: window._update_message_list(window.message_cache[current]), args.repeat)
+    window.stacked.setCurrentIndex(2)
+    await timed('show', lambda: window._show_message('bench-large'), args.repeat)
+    window.stacked.setCurrentIndex(0)
+
+    # One auto-refresh tick with new mail waiting in a fraction of the inboxes
+    import aiohttp
+    step = max(1, round(1 / args.new_fraction)) if args.new_fraction > 0 else 0
+    targets = fixture['addresses'][::step] if step else []
+    async with aiohttp.ClientSession() as control:
+        for addr in targets:
+            async with control.post(f'{sim_url}/_sim/deliver', json={'address': addr, 'count': 1}):
+                pass
+    await timed('refresh', window._async_refresh_all)
+    ops['refresh']['inboxes_with_new_mail'] = len(targets)
+
+    for api in window.apis.values():
+        await api.close()
+    window.close()
+    window.search_index.close()
+    window.deleteLater()
+    os.chdir(ROOT)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default='10x10,100x100,500x100',
+                        help='Comma-separated ADDRESSESxMESSAGES_PER_INBOX')
+    parser.add_argument('--html-kib', type=int, default=512, help='Size of the large HTML mail')
+    parser.add_argument('--body-bytes', type=int, default=500, help='Approximate simulated mail body size')
+    parser.add_argument('--new-fraction', type=float, default=0.1,
+                        help='Fraction of inboxes receiving a new mail before the refresh tick')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of each synchronous operation')
+    parser.add_argument('--stall-ms', type=float, default=50.0, help='Frame gap counted as a stall')
+    parser.add_argument('--json', help='Write machine-readable results here')
+    args = parser.parse_args(argv)
+
+    port = free_port()
+    sim_url = f'http://127.0.0.1:{port}'
+    os.environ['MAIL_UPSTREAM_BASE'] = sim_url
+    sim = subprocess.Popen([sys.executable, '-m', 'MailService.simulator', '--port', str(port),
+                            '--body-bytes', str(args.body_bytes), '--seed', '1'],
+                           cwd=ROOT, env={**os.environ, 'PYTHONPATH': ROOT}, stdout=subprocess.DEVNULL)
+    json_path = os.path.abspath(args.json) if args.json else None
+    try:
+        import qasync
+        from PyQt6 import QtWidgets
+
+        app = QtWidgets.QApplication(sys.argv[:1])
+        app.setQuitOnLastWindowClosed(False)  # windows are closed between scales
+        loop = qasync.QEventLoop(app)
+        asyncio.set_event_loop(loop)
+
+        async def run_all():
+            import aiohttp
+            async with aiohttp.ClientSession() as session:
+                for _ in range(100):
+                    try:
+                        async with session.get(f'{sim_url}/_sim/stats'):
+                            break
+                    except aiohttp.ClientError:
+                        await asyncio.sleep(0.1)
+            out = []
+            for scale in args.scales.split(','):
+                addresses, per_inbox = (int(v) for v in scale.lower().split('x'))
+                out.append(await run_scale(sim_url, addresses, per_inbox, args))
+            return out
+
+        with loop:
+            results = loop.run_until_complete(run_all())
+    finally:
+        sim.terminate()
+        sim.wait(timeout=10)
+
+    print(f"{'scale':<10} {'op':<10} {'ms':>9} {'frame p95':>10} {'frame max':>10} {'stalls':>7} {'stalled ms':>11}")
+    for r in results:
+        for name, op in r['operations'].items():
+            print(f"{r['scale']:<10} {name:<10} {op['ms']:>9.1f} {op['frame_p95_ms']:>10.1f} "
+                  f"{op['frame_max_ms']:>10.1f} {op['stalls']:>7} {op['stalled_ms']:>11.1f}")
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
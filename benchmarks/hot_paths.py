@@ -0,0 +1,279 @@
+"""Microbenchmarks for the per-message hot paths run on every poll.
+
+Covers each adapter's get_messages/fetch_message normalization (fed canned
+payloads in the provider's own wire format, so no network is involved),
+the gateway's api_server._coerce_message and the GUI's cache merge
+(tempgen._merge_new_messages, as run by _async_refresh_all). Each case
+runs on synthetic inboxes of 10, 1k and 50k messages and reports the time
+per call and per message. A separate run under tracemalloc gives peak
+and retained allocations.
+
+Cases whose cost grows too fast are skipped once the extrapolated time
+for a single call exceeds --max-call, and the estimate is reported.
+
+Usage:
+    python benchmarks/hot_paths.py [--sizes 10,1000,50000] [--only mailtm,merge] [--json results.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from MailService import simulator  # noqa: E402
+from MailService.temp_mail_apis import SERVICE_REGISTRY  # noqa: E402
+
+
+class _CannedResponse:
+    status = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    async def json(self, **kwargs):
+        return self.payload
+
+    async def text(self):
+        return json.dumps(self.payload)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _CannedSession:
+    """Stands in for the adapter's guarded session; answers every call with one payload."""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def get(self, url, **kwargs):
+        return _CannedResponse(self.payload)
+
+    post = get
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def canned(service: str, payload):
+    """A fresh adapter instance whose upstream always answers with payload"""
+    api = SERVICE_REGISTRY[service]()
+    api._session = lambda: _CannedSession(payload)
+    return api
+
+
+class Inbox:
+    """N synthetic mails plus their raw list/fetch payloads for every provider."""
+
+    def __init__(self, size: int, body_bytes: int):
+        sim = simulator.Simulator(simulator.ProviderConfig(body_bytes=body_bytes), seed=size)
+        self.size = size
+        self.address = 'bench@example.test'
+        self.mails = {s: [sim.make_mail(s) for _ in range(size)] for s in simulator.PROVIDERS}
+
+    def list_payload(self, service: str):
+        mails = self.mails[service]
+        if service == 'guerrillamail':
+            return {'list': [simulator.guerrilla_item(m) for m in mails], 'count': str(len(mails))}
+        if service in ('mailgw', 'mailtm'):
+            return {'hydra:member': [simulator.hydra_item(m, self.address) for m in mails]}
+        if service == 'dropmail':
+            return {'data': {'session': {'mails': [simulator.gql_mail(m) for m in mails]}}}
+        return {'email': [simulator.tempmaillol_item(m, self.address) for m in mails]}
+
+    def fetch_payload(self, service: str, m: simulator.Mail):
+        if service == 'guerrillamail':
+            return {'mail_id': m.id, 'mail_from': m.sender, 'mail_subject': m.subject, 'mail_body': m.html,
+                    'mail_timestamp': str(int(m.created)), 'mail_size': str(m.size)}
+        if service in ('mailgw', 'mailtm'):
+            return {**simulator.hydra_item(m, self.address), 'text': m.text, 'html': [m.html]}
+        if service == 'dropmail':
+            return {'data': {'session': {'mail': simulator.gql_mail(m)}}}
+        return self.list_payload(service)
+
+    def token(self, service: str) -> str:
+        return 'bench|session' if service == 'dropmail' else 'bench'
+
+
+class Case:
+    """One benchmark: setup() builds fresh state outside the timing, run(state) is timed."""
+
+    def __init__(self, name: str, setup: Callable, run: Callable, is_async: bool = True):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.is_async = is_async
+
+
+def adapter_cases(service: str, inbox: Inbox) -> List[Case]:
+    token = inbox.token(service)
+    list_payload = inbox.list_payload(service)
+
+    async def get_messages(api):
+        return await api.get_messages(token)
+
+    def fetch_setup():
+        # One adapter per message, each answering with that message
+        if service == 'tempmaillol':
+            api = canned(service, list_payload)
+            return [(api, str(i)) for i in range(inbox.size)]
+        return [(canned(service, inbox.fetch_payload(service, m)), m.id) for m in inbox.mails[service]]
+
+    async def fetch_all(pairs):
+        for api, mail_id in pairs:
+            await api.fetch_message(token, mail_id)
+
+    return [
+        Case(f'{service}.get_messages', lambda: canned(service, list_payload), get_messages),
+        Case(f'{service}.fetch_message', fetch_setup, fetch_all),
+    ]
+
+
+def coerce_case(inbox: Inbox) -> Case:
+    from MailService.api_server import _coerce_message
+    m = inbox.mails['mailtm']
+    bodies = [{'mail_body': [x.html], 'mail_from': x.sender, 'subject': x.subject, 'mail_date': x.iso_date,
+               'mail_size': str(x.size), 'receive_time': x.created} for x in m]
+
+    def run(messages):
+        for data in messages:
+            _coerce_message(data)
+
+    return Case('api_server._coerce_message', lambda: [dict(b) for b in bodies], run, is_async=False)
+
+
+def merge_case(inbox: Inbox) -> Case:
+    from MailService.tempgen import _merge_new_messages
+    # Steady-state poll: everything but the newest 1% is already cached
+    polled = [{'mail_id': m.id, 'subject': m.subject, 'mail_from': m.sender, 'receive_time': m.created}
+              for m in inbox.mails['mailgw']]
+    known = polled[max(1, inbox.size // 100):]
+
+    def run(cache):
+        _merge_new_messages(cache, polled)
+
+    return Case('tempgen._merge_new_messages', lambda: [dict(m) for m in known], run, is_async=False)
+
+
+def call(case: Case, state, loop: asyncio.AbstractEventLoop) -> float:
+    """Time one call of the case on prepared state"""
+    if not case.is_async:
+        started = time.perf_counter()
+        case.run(state)
+        return time.perf_counter() - started
+
+    async def timed():
+        started = time.perf_counter()
+        await case.run(state)
+        return time.perf_counter() - started
+
+    return loop.run_until_complete(timed())
+
+
+def measure(case: Case, size: int, loop, min_time: float, max_repeat: int) -> Dict:
+    samples = [call(case, case.setup(), loop)]  # first call also warms up
+    repeat = min(max_repeat, max(3, int(min_time / max(samples[0], 1e-9))))
+    samples = [call(case, case.setup(), loop) for _ in range(repeat)]
+
+    state = case.setup()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    call(case, state, loop)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diff = after.compare_to(before, 'filename')
+    retained_bytes = sum(d.size_diff for d in diff)
+    retained_blocks = sum(d.count_diff for d in diff)
+
+    best = min(samples)
+    return {
+        'case': case.name,
+        'size': size,
+        'repeat': len(samples),
+        'best_ms': round(best * 1000, 4),
+        'median_ms': round(statistics.median(samples) * 1000, 4),
+        'per_message_us': round(best / size * 1e6, 3),
+        'peak_kib': round(peak / 1024, 1),
+        'peak_bytes_per_message': round(peak / size, 1),
+        'retained_kib': round(retained_bytes / 1024, 1),
+        'retained_blocks': retained_blocks,
+    }
+
+
+def extrapolate(history: List[Dict], size: int) -> Optional[float]:
+    """Seconds one call would take at size, fitted from the two previous sizes.
+
+    Fixed per-call overhead flattens the fit at small sizes, so anything
+    clearly superlinear is treated as the nested loop it almost always is.
+    """
+    if len(history) < 2:
+        return None
+    (n1, t1), (n2, t2) = [(h['size'], h['best_ms'] / 1000) for h in history[-2:]]
+    if t1 <= 0 or n1 == n2:
+        return None
+    exponent = math.log(t2 / t1) / math.log(n2 / n1)
+    exponent = 2.0 if exponent > 1.2 else max(1.0, exponent)
+    return t2 * (size / n2) ** exponent
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,1000,50000', help='Inbox sizes (messages)')
+    parser.add_argument('--only', default='', help='Comma-separated substrings of case names to run')
+    parser.add_argument('--body-bytes', type=int, default=500, help='Approximate body size per message')
+    parser.add_argument('--min-time', type=float, default=0.5, help='Seconds of timed repeats per case')
+    parser.add_argument('--max-repeat', type=int, default=200, help='Upper bound on timed repeats')
+    parser.add_argument('--max-call', type=float, default=20.0,
+                        help='Skip a case when one call is extrapolated to take longer (seconds)')
+    parser.add_argument('--json', help='Write machine-readable results here')
+    args = parser.parse_args(argv)
+
+    sizes = sorted(int(s) for s in args.sizes.split(','))
+    only = [s for s in args.only.split(',') if s]
+    loop = asyncio.new_event_loop()
+    results, history = [], {}
+    print(f"{'case':<28} {'size':>6} {'best ms':>11} {'us/msg':>9} {'peak KiB':>10} {'B/msg':>8} {'kept blk':>9}")
+    for size in sizes:
+        inbox = Inbox(size, args.body_bytes)
+        cases = [c for s in simulator.PROVIDERS for c in adapter_cases(s, inbox)]
+        cases += [coerce_case(inbox), merge_case(inbox)]
+        for case in cases:
+            if only and not any(o in case.name for o in only):
+                continue
+            past = history.setdefault(case.name, [])
+            estimate = extrapolate(past, size)
+            if estimate is not None and estimate > args.max_call:
+                results.append({'case': case.name, 'size': size, 'skipped': True, 'estimated_s': round(estimate, 1)})
+                print(f"{case.name:<28} {size:>6}   skipped, one call estimated at {estimate:.1f} s")
+                continue
+            r = measure(case, size, loop, args.min_time, args.max_repeat)
+            past.append(r)
+            results.append(r)
+            print(f"{r['case']:<28} {size:>6} {r['best_ms']:>11.3f} {r['per_message_us']:>9.2f} "
+                  f"{r['peak_kib']:>10.1f} {r['peak_bytes_per_message']:>8.0f} {r['retained_blocks']:>9}")
+    loop.close()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Import-time budget check for the gateway worker and the CLI.
+
+Runs ``python -X importtime -c "import <module>"`` in fresh interpreters,
+takes the best of several runs and fails if a target exceeds its budget or
+pulls in modules it must not import.
+
+Usage:
+    python benchmarks/import_budget.py [--runs 5] [--json results.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (module, budget in ms, modules that must not be imported)
+TARGETS: Dict[str, Tuple[str, float, List[str]]] = {
+    'gateway': ('MailService.api_server', 600.0, ['aiohttp', 'requests', 'MailService.adapters']),
+    'cli': ('MailClient', 200.0, ['fastapi', 'aiohttp', 'PyQt6', 'MailService.adapters']),
+    'registry': ('MailService.temp_mail_apis', 20.0, ['aiohttp', 'requests', 'MailService.adapters']),
+}
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Return (module, self_us, cumulative_us) rows from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        head, cumulative, name = line.split('|', 2)
+        rows.append((name.strip(), int(head.split(':', 1)[1]), int(cumulative)))
+    return rows
+
+
+def measure(module: str) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """Import module in a fresh interpreter; returns (ms, rows)"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True,
+        env={**os.environ, 'PYTHONPATH': ROOT},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = parse_importtime(proc.stderr)
+    total_us = next(cum for name, _, cum in rows if name == module)
+    return total_us / 1000.0, rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Runs per target (best is kept)')
+    parser.add_argument('--top', type=int, default=8, help='Heaviest modules to list')
+    parser.add_argument('--json', help='Write machine-readable results here')
+    args = parser.parse_args(argv)
+
+    failed = False
+    results = {}
+    for name, (module, budget_ms, forbidden) in TARGETS.items():
+        best_ms, best_rows = min((measure(module) for _ in range(args.runs)), key=lambda r: r[0])
+        imported = {row[0] for row in best_rows}
+        leaked = sorted(m for m in imported if any(m == f or m.startswith(f + '.') for f in forbidden))
+        ok = best_ms <= budget_ms and not leaked
+        failed |= not ok
+        results[name] = {'module': module, 'ms': round(best_ms, 1), 'budget_ms': budget_ms, 'forbidden_imported': leaked}
+
+        print(f"{'OK ' if ok else 'FAIL'} {name:<9} {module:<28} {best_ms:7.1f} ms (budget {budget_ms:.0f} ms)")
+        for row in sorted(best_rows, key=lambda r: r[1], reverse=True)[:args.top]:
+            print(f"       self {row[1] / 1000:7.1f} ms  {row[0]}")
+        if leaked:
+            print(f"       forbidden imports: {', '.join(leaked)}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,14 +22,14 @@ source "$VENV_DIR/bin/activate"
 "$VENV_DIR/bin/python3" -m uvicorn MailService.api_server:app --host 127.0.0.1 --port 8000 --reload &
 API_PID=$!
 
-# Wait for API to be ready
+# Wait for API to be ready (adapters warm, domain catalog loaded)
 echo "Waiting for API to become ready..."
-for i in {1..30}; do
-  if curl -fsS http://127.0.0.1:8000/ >/dev/null; then
+for i in {1..300}; do
+  if curl -fsS http://127.0.0.1:8000/readyz >/dev/null 2>&1; then
     echo "API is ready."
     break
   fi
-  sleep 1
+  sleep 0.1
 done
 
 # Run MailClient example CLI
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from MailService.adapters.mailtm import MailTmAPI
+from MailService.resilience import CircuitOpenError, get_breaker
+
+
+async def session_of(api):
+    return api._get_http()
+
+
+def test_session_of_a_finished_loop_is_closed_when_replaced():
+    api = MailTmAPI()
+    first = asyncio.run(session_of(api))
+
+    async def main():
+        second = api._get_http()
+        await asyncio.sleep(0)
+        await api.close()
+        return second
+
+    second = asyncio.run(main())
+    assert first is not second and first.closed and second.closed
+    assert api._http == {}
+
+
+def test_each_running_loop_keeps_its_own_session():
+    api = MailTmAPI()
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+    thread.start()
+    try:
+        theirs = asyncio.run_coroutine_threadsafe(session_of(api), other).result(5)
+
+        async def main():
+            ours = api._get_http()
+            assert api._get_http() is ours and not theirs.closed
+            await api.close()
+            return ours
+
+        ours = asyncio.run(main())
+        assert ours is not theirs and ours.closed and theirs.closed
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        thread.join(5)
+        other.close()
+
+
+def serve_html(status, exercise):
+    async def handler(request):
+        return web.Response(status=status, text="<html>maintenance</html>", content_type="text/html")
+
+    async def main():
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            return await exercise(f"http://127.0.0.1:{port}")
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+class _HtmlMailTm(MailTmAPI):
+    SERVICE_KEY = "mailtm-html"
+    BREAKER_FAILURES = 2
+
+
+def test_unparseable_200_bodies_open_the_breaker():
+    async def exercise(base_url):
+        api = _HtmlMailTm()
+        api.BASE_URL = base_url
+        try:
+            for _ in range(2):
+                with pytest.raises(aiohttp.ContentTypeError):
+                    await api.get_messages("t")
+            with pytest.raises(CircuitOpenError):
+                await api.get_messages("t")
+        finally:
+            await api.close()
+
+    serve_html(200, exercise)
+    assert get_breaker(_HtmlMailTm.SERVICE_KEY).state == "open"
+
+
+class _RejectedMailTm(MailTmAPI):
+    SERVICE_KEY = "mailtm-rejected"
+    BREAKER_FAILURES = 2
+
+
+def test_client_errors_leave_the_breaker_alone():
+    async def exercise(base_url):
+        api = _RejectedMailTm()
+        api.BASE_URL = base_url
+        try:
+            for _ in range(3):
+                with pytest.raises(aiohttp.ContentTypeError):
+                    await api.get_messages("bad token")
+        finally:
+            await api.close()
+
+    serve_html(401, exercise)
+    breaker = get_breaker(_RejectedMailTm.SERVICE_KEY)
+    assert breaker.state == "closed" and breaker.failures == 0
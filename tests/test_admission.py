@@ -0,0 +1,61 @@
+import asyncio
+
+from MailService.admission import AdmissionMiddleware
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def scope(host="127.0.0.1", **headers):
+    return {
+        "type": "http",
+        "path": "/messages",
+        "client": (host, 50000),
+        "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()],
+    }
+
+
+def call(admission, request_scope):
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    asyncio.run(admission(request_scope, None, send))
+    return statuses[0]
+
+
+def test_client_ids_on_one_host_get_their_own_buckets():
+    admission = AdmissionMiddleware(ok_app, rate=0.01, burst=1)
+    assert call(admission, scope(x_client_id="gui")) == 200
+    assert call(admission, scope(x_client_id="gui")) == 429
+    assert call(admission, scope(x_client_id="script")) == 200
+    assert call(admission, scope()) == 200  # no id: the per-address bucket
+    assert call(admission, scope()) == 429
+
+
+def test_client_id_is_scoped_to_the_peer_address():
+    admission = AdmissionMiddleware(ok_app)
+    assert admission.client_key(scope(x_client_id="gui")) == "id:127.0.0.1/gui"
+    assert admission.client_key(scope("10.0.0.2", x_client_id="gui")) == "id:10.0.0.2/gui"
+    assert admission.client_key(scope(x_api_key="k", x_client_id="gui")) == "id:127.0.0.1/gui"
+    admission = AdmissionMiddleware(ok_app, api_keys={"k"})
+    assert admission.client_key(scope(x_api_key="k", x_client_id="gui")) == "key:k"
+
+
+def test_random_api_keys_share_the_address_limit():
+    admission = AdmissionMiddleware(ok_app, rate=0.01, burst=1, api_keys={"known"})
+    assert call(admission, scope(x_api_key="random-1")) == 200
+    assert call(admission, scope(x_api_key="random-2")) == 429
+    assert call(admission, scope(x_api_key="known")) == 200
+    assert len(admission.clients) == 2
+
+
+def test_minting_client_ids_falls_back_to_the_address_bucket():
+    admission = AdmissionMiddleware(ok_app, ids_per_address=2)
+    keys = [admission.client_key(scope(x_client_id=f"c{i}")) for i in range(4)]
+    assert keys == ["id:127.0.0.1/c0", "id:127.0.0.1/c1", "ip:127.0.0.1", "ip:127.0.0.1"]
+    assert admission.client_key(scope(x_client_id="c0")) == "id:127.0.0.1/c0"
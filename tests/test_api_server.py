@@ -0,0 +1,86 @@
+"""Gateway endpoint behaviour that needs no upstream"""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from MailService import api_server, lifecycle, state
+from MailService.adapters.mailtm import MailTmAPI
+from MailService.resilience import get_breaker
+
+
+@pytest.fixture
+def client():
+    # No lifespan: nothing is prewarmed or restored
+    return TestClient(api_server.app)
+
+
+@pytest.fixture
+def open_mailtm_breaker():
+    breaker = get_breaker(MailTmAPI.SERVICE_KEY, MailTmAPI.BREAKER_FAILURES, MailTmAPI.BREAKER_RESET)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    yield breaker
+    breaker.record_success()
+
+
+def test_fetch_message_with_open_breaker_is_503(client, open_mailtm_breaker):
+    resp = client.get("/messages/abc", params={"service": "mailtm", "token": "t"})
+    assert resp.status_code == 503
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert "circuit open" in resp.json()["detail"]
+
+
+def test_get_messages_with_open_breaker_is_503(client, open_mailtm_breaker):
+    resp = client.get("/messages", params={"service": "mailtm", "token": "t"})
+    assert resp.status_code == 503
+
+
+def test_metrics_export_startup_phases(client):
+    body = client.get("/metrics").text
+    for phase in api_server.STARTUP_TIMINGS:
+        assert f'mail_gateway_startup_seconds{{phase="{phase}"}}' in body
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/export", {}),
+    ("/search", {"q": "x"}),
+])
+def test_archive_endpoints_reject_path_like_emails(client, path, params):
+    for email in ("../secret", "a/b", ".."):
+        assert client.get(path, params={**params, "email": email}).status_code == 400
+
+
+def test_addresses_created_by_another_worker_expire_here(client, tmp_path, monkeypatch):
+    db = state._Database(str(tmp_path / "state.sqlite3"))
+    shared = state.SQLiteCache(db, "expiry")
+    monkeypatch.setattr(api_server, "SHARED_EXPIRY", shared)
+    expiry = lifecycle.index()
+    try:
+        # What the creating worker published
+        shared.put(("mailtm", "gone"), {"expires_at": time.time() - 3600, "email": "a@b.c"})
+        shared.put(("mailtm", "alive"), {"expires_at": time.time() + 3600, "email": "d@b.c"})
+        assert client.get("/messages", params={"service": "mailtm", "token": "gone"}).status_code == 410
+        assert [key for key, _ in expiry.pop_expired()] == [("mailtm", "gone")]
+        asyncio.run(api_server._ensure_alive("mailtm", "alive"))
+        assert expiry.expires_at(("mailtm", "alive")) > time.time()
+    finally:
+        expiry.discard(("mailtm", "alive"))
+        db.close()
+
+
+def test_tokens_created_elsewhere_are_tracked_from_first_sight():
+    key = ("mailtm", "created-on-another-node")
+    expiry = lifecycle.index()
+    try:
+        asyncio.run(api_server._ensure_alive(*key))
+        assert expiry.expires_at(key) == pytest.approx(time.time() + lifecycle.ttl("mailtm"), abs=5)
+    finally:
+        expiry.discard(key)
+
+
+def test_running_totals_are_exported_as_counters(client):
+    body = client.get("/metrics").text
+    for name in ("mail_cache_hits_total", "mail_cache_misses_total", "mail_gateway_shed_total"):
+        assert f"# TYPE {name} counter" in body
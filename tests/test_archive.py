@@ -0,0 +1,59 @@
+import io
+
+import pytest
+
+from MailService.archive import MailArchive, path_component
+from MailService.export import import_records, iter_mbox, mbox_chunks
+
+
+@pytest.mark.parametrize("name", ["", ".", "..", "../x", "a/b", "a\\b", "x\x00"])
+def test_path_component_rejects_names_leaving_the_directory(name):
+    with pytest.raises(ValueError):
+        path_component(name)
+
+
+def test_path_component_accepts_plain_names():
+    assert path_component("user@mail.tm") == "user@mail.tm"
+    assert path_component(42) == "42"
+
+
+def test_archive_stays_inside_its_directory(tmp_path):
+    (tmp_path / "outside").mkdir()
+    (tmp_path / "outside" / "secret.json").write_text('{"s": 1}')
+    archive = MailArchive(str(tmp_path / "archive"), indexed=False)
+    with pytest.raises(ValueError):
+        list(archive.iter_records("../outside"))
+    with pytest.raises(ValueError):
+        archive.save("../outside", "m1", {}, "body")
+    assert archive.load("../outside", "secret") is None
+
+
+def test_import_skips_records_with_unsafe_names(tmp_path):
+    archive = MailArchive(str(tmp_path / "archive"), indexed=False)
+    records = [{"email": "../escape", "message_id": "1", "body": "x"},
+               {"email": "a@b.c", "message_id": "../../x", "body": "x"},
+               {"email": "a@b.c", "message_id": "2", "body": "x"}]
+    assert import_records(archive, records) == 1
+    assert not (tmp_path / "escape").exists()
+    assert [r["message_id"] for r in archive.iter_records("a@b.c")] == ["2"]
+
+
+def test_mbox_round_trip_keeps_bodies_and_dates():
+    bodies = [
+        ">From the start",
+        "line\nFrom the middle\n>>From deeper\n",
+        "trailing spaces   ",
+        "trailing newlines\n\n",
+        "",
+    ]
+    records = [
+        {"email": "a@b.c", "message_id": str(i), "subject": f"s{i}", "from": "x@y.z",
+         "service": "mailtm", "received_at": "2024-03-05 06:07:08", "body": body}
+        for i, body in enumerate(bodies)
+    ]
+    data = b"".join(mbox_chunks(records))
+    assert data.startswith(b"From x@y.z Tue Mar  5 06:07:08 2024\n")
+    back = list(iter_mbox(io.BytesIO(data)))
+    assert [r["body"] for r in back] == bodies
+    assert [r["message_id"] for r in back] == [str(i) for i in range(len(bodies))]
+    assert back[0]["received_at"] == "2024-03-05 06:07:08"
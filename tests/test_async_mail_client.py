@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from AsyncMailClient import AsyncMailClient, retry_after
+
+
+@pytest.mark.parametrize("value, expected", [("2", 2.0), ("0", 0.0), (None, 1.0), ("soon", 1.0)])
+def test_retry_after(value, expected):
+    assert retry_after(value) == expected
+
+
+def serve(handler, exercise):
+    async def main():
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with AsyncMailClient(f"http://127.0.0.1:{port}", max_retries=2) as client:
+                return await exercise(client)
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+def test_429_is_retried_after_retry_after():
+    seen = []
+
+    async def handler(request):
+        seen.append((time.monotonic(), request.headers.get("X-Client-Id")))
+        if len(seen) == 1:
+            return web.json_response({"detail": "Too many requests"}, status=429, headers={"Retry-After": "1"})
+        return web.json_response({"email": "a@b.c", "service": "mailtm", "token": "t"})
+
+    created = serve(handler, lambda client: client.create_address("mailtm"))
+    assert created["email"] == "a@b.c"
+    assert len(seen) == 2 and seen[1][0] - seen[0][0] >= 0.95
+    assert seen[0][1] and seen[0][1] == seen[1][1]
+
+
+def test_429_is_raised_once_retries_run_out():
+    calls = []
+
+    async def handler(request):
+        calls.append(1)
+        return web.json_response({"detail": "Too many requests"}, status=429, headers={"Retry-After": "0"})
+
+    with pytest.raises(aiohttp.ClientResponseError) as exc:
+        serve(handler, lambda client: client.list_messages("mailtm", "t"))
+    assert exc.value.status == 429 and len(calls) == 3
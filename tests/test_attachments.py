@@ -0,0 +1,35 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from MailService import api_server
+from MailService.attachments import RangeNotSatisfiable, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-199", (100, 199)),
+    ("bytes=900-5000", (900, 999)),  # last byte clamped to the size
+    ("bytes=900-", (900, 999)),  # open-ended
+    ("bytes=-100", (900, 999)),  # suffix
+    ("bytes=-5000", (0, 999)),  # suffix longer than the body
+    (None, None),
+    ("", None),
+    ("bytes=-", None),
+    ("bytes=0-1,5-9", None),  # multiple ranges: whole body
+    ("items=0-9", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1000-1200", "bytes=500-400", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000)
+
+
+def test_service_without_attachments_is_404():
+    resp = TestClient(api_server.app).get(
+        "/messages/1/attachments/a", params={"service": "guerrillamail", "token": "t"})
+    assert resp.status_code == 404
+    assert "has no attachments" in resp.json()["detail"]
@@ -0,0 +1,45 @@
+from MailService.lifecycle import ExpiryIndex
+
+
+def test_pop_expired_in_expiry_order_with_grace():
+    expiry = ExpiryIndex(grace=5)
+    expiry.add("c", 300, service="mailtm")
+    expiry.add("a", 100, service="mailgw")
+    expiry.add("b", 200)
+    assert expiry.next_expiry() == 105
+    assert expiry.pop_expired(now=104) == []
+    assert expiry.pop_expired(now=250) == [("a", {"service": "mailgw"}), ("b", {})]
+    assert len(expiry) == 1 and "c" in expiry
+    assert expiry.next_expiry() == 305
+
+
+def test_replaced_and_discarded_keys_are_skipped():
+    expiry = ExpiryIndex(grace=0)
+    expiry.add("a", 100)
+    expiry.add("a", 400)  # extended: the old heap entry is stale
+    expiry.add("b", 150)
+    expiry.discard("b")
+    assert expiry.pop_expired(now=200) == []
+    assert expiry.next_expiry() == 400
+    assert [key for key, _ in expiry.pop_expired(now=400)] == ["a"]
+    assert expiry.next_expiry() is None
+
+
+def test_expired_keys_are_remembered_until_tracked_again():
+    expiry = ExpiryIndex(grace=10, remember=2)
+    expiry.add("a", 100)
+    assert not expiry.is_expired("a", now=105)
+    assert expiry.is_expired("a", now=110)
+    expiry.pop_expired(now=110)
+    assert "a" not in expiry and expiry.is_expired("a")
+    expiry.add("a", 1e12)
+    assert not expiry.is_expired("a")
+    assert not expiry.is_expired("never tracked")
+
+
+def test_heap_is_compacted_after_many_replacements():
+    expiry = ExpiryIndex(grace=0)
+    for i in range(1000):
+        expiry.add("a", 100 + i)
+    assert len(expiry._heap) <= 65
+    assert expiry.pop_expired(now=1099) == [("a", {})]
@@ -0,0 +1,31 @@
+import pytest
+import requests
+
+import MailClient
+from MailService import embedded
+
+
+def http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} Client Error", response=response)
+
+
+def test_is_gone_only_for_410_responses():
+    assert MailClient.is_gone(http_error(410))
+    assert not MailClient.is_gone(http_error(404))
+    assert not MailClient.is_gone(requests.HTTPError("410: looks like a status"))
+    assert not MailClient.is_gone(ValueError("410 in the message"))
+
+
+def test_embedded_errors_carry_the_status_code(monkeypatch):
+    class Gateway:
+        def list_messages(self, service, token):
+            raise embedded.GatewayError(410, "Address expired")
+
+    monkeypatch.setattr(embedded, "get_gateway", lambda: Gateway())
+    with pytest.raises(requests.HTTPError) as info:
+        MailClient._embedded("list_messages", "mailtm", "t")
+    assert info.value.response.status_code == 410
+    assert info.value.response.json() == {"detail": "Address expired"}
+    assert MailClient.is_gone(info.value)
@@ -0,0 +1,147 @@
+import asyncio
+import threading
+
+import pytest
+from aiohttp import web
+
+from MailService.adapters.guerrillamail import GuerrillaMailAPI
+from MailService.ratelimit import QueueTimeoutError, ServiceGovernor, TokenBucket
+
+
+def test_bucket_serves_a_burst_then_spaces_tokens_out():
+    bucket = TokenBucket(rate=10.0, burst=3)
+    assert [bucket.reserve(1.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve(1.0) == pytest.approx(0.1, abs=0.01)
+    # Reservations queue up: the next caller waits behind the previous one
+    assert bucket.reserve(1.0) == pytest.approx(0.2, abs=0.01)
+
+
+def test_bucket_refuses_waits_beyond_max_wait():
+    bucket = TokenBucket(rate=1.0, burst=1)
+    assert bucket.reserve(0.0) == 0.0
+    assert bucket.reserve(0.5) is None
+    assert bucket.tokens == pytest.approx(0.0, abs=0.01)  # a refusal takes nothing
+
+
+def test_refund_is_capped_at_burst():
+    bucket = TokenBucket(rate=1.0, burst=2)
+    bucket.refund()
+    assert bucket.tokens == 2
+
+
+def test_governor_caps_concurrency_and_times_out():
+    async def main():
+        governor = ServiceGovernor("test", rate=1000.0, burst=1000, max_concurrency=1, max_wait=0.05)
+        slots = await governor.acquire()
+        with pytest.raises(QueueTimeoutError):
+            await governor.acquire()
+        governor.release(slots)
+        governor.release(await governor.acquire())
+        return governor.stats()
+
+    stats = asyncio.run(main())
+    assert stats["in_flight"] == 0 and stats["acquired"] == 2 and stats["rejected"] == 1
+
+
+def test_cancelled_waiters_get_their_token_back():
+    async def main():
+        governor = ServiceGovernor("test", rate=1.0, burst=1, max_concurrency=1, max_wait=5.0)
+        slots = await governor.acquire()
+        tokens = governor.bucket.tokens
+        for waiter in (governor.acquire(), governor.throttle()):
+            # One waits for the slot, the other for the rate limit
+            task = asyncio.create_task(waiter)
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        governor.release(slots)
+        return tokens, governor.bucket.tokens, governor.waiting
+
+    before, after, waiting = asyncio.run(main())
+    assert after == pytest.approx(before, abs=0.2) and waiting == 0
+
+
+class _OneSlotGuerrilla(GuerrillaMailAPI):
+    SERVICE_KEY = "guerrillamail-one-slot"
+    MAX_CONCURRENCY = 1
+    MAX_QUEUE_WAIT = 1.0
+
+
+def test_guerrilla_fallback_does_not_wait_on_its_own_slot():
+    calls = []
+
+    async def handler(request):
+        calls.append(dict(request.query))
+        if "t" in request.query:
+            return web.Response(text="<html>busy</html>", content_type="text/html")
+        return web.json_response({"email_addr": "x@sharklasers.com", "sid_token": "sid"})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/ajax.php", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        api = _OneSlotGuerrilla()
+        api.BASE_URL = f"http://127.0.0.1:{port}/ajax.php"
+        try:
+            return await asyncio.wait_for(api.create_address(), 0.9)
+        finally:
+            await api.close()
+            await runner.cleanup()
+
+    assert asyncio.run(main()) == {"email": "x@sharklasers.com", "token": "sid"}
+    assert len(calls) == 2
+
+
+def test_concurrency_cap_holds_across_event_loops():
+    governor = ServiceGovernor("test", rate=1000.0, burst=1000, max_concurrency=1, max_wait=5.0)
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+    thread.start()
+    try:
+        # Another loop (say, the embedded gateway) holds the only slot
+        held = asyncio.run_coroutine_threadsafe(governor.acquire(), other).result(5)
+
+        async def main():
+            with pytest.raises(QueueTimeoutError):
+                await governor.acquire(0.05)
+            waiter = asyncio.create_task(governor.acquire())
+            await asyncio.sleep(0.05)
+            assert not waiter.done()
+            other.call_soon_threadsafe(governor.release, held)
+            governor.release(await asyncio.wait_for(waiter, 1))
+
+        asyncio.run(main())
+        # The slot is free again, for either loop
+        governor.release(asyncio.run_coroutine_threadsafe(governor.acquire(0.05), other).result(5))
+        assert governor.stats()["in_flight"] == 0 and governor._slots.used == 0
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        thread.join(5)
+        other.close()
+
+
+@pytest.mark.parametrize("release_first", [False, True])
+def test_waiter_that_gives_up_passes_its_slot_on(release_first):
+    async def main():
+        governor = ServiceGovernor("test", rate=1000.0, burst=1000, max_concurrency=1, max_wait=5.0)
+        held = await governor.acquire()
+        first = asyncio.create_task(governor.acquire())
+        second = asyncio.create_task(governor.acquire())
+        await asyncio.sleep(0.01)
+        if release_first:
+            governor.release(held)  # hands the slot to first, which then gives up
+            first.cancel()
+        else:
+            first.cancel()
+            governor.release(held)
+        governor.release(await asyncio.wait_for(second, 1))
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return governor._slots.used
+
+    assert asyncio.run(main()) == 0
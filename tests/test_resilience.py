@@ -0,0 +1,87 @@
+import pytest
+
+from MailService import resilience
+from MailService.resilience import CircuitBreaker, CircuitOpenError, RetryBudget, backoff_delay
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("svc", failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    breaker.record_success()  # a success resets the count
+    for _ in range(3):
+        breaker.before_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 10
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.before_request()
+    assert exc.value.retry_after == pytest.approx(20)
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.before_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_request()
+
+
+def test_failed_probe_reopens_the_circuit(clock):
+    breaker = CircuitBreaker("svc", failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 31
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opened_at == clock.now
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_probe_that_never_reports_back_expires(clock):
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.before_request()  # probe cancelled: no success or failure recorded
+    clock.now += 31
+    breaker.before_request()
+
+
+def test_retry_budget_is_a_fraction_of_requests():
+    budget = RetryBudget(ratio=0.5, initial_tokens=1.0, max_tokens=2.0)
+    assert budget.withdraw() and not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2.0
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    for attempt in range(8):
+        delays = [backoff_delay(attempt, base=0.1, cap=1.0) for _ in range(50)]
+        assert all(0 <= d <= min(1.0, 0.1 * 2 ** attempt) for d in delays)
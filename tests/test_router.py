@@ -0,0 +1,136 @@
+import asyncio
+import itertools
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer, make_mocked_request
+
+from MailService.router import HashRing, Router, node_snapshot_file, shard_key
+
+NODES = ["http://127.0.0.1:8001", "http://127.0.0.1:8002", "http://127.0.0.1:8003"]
+KEYS = [shard_key("mailtm", f"token-{i}") for i in range(10000)]
+
+
+def owners(ring):
+    return {key: ring.node_for(key) for key in KEYS}
+
+
+def test_keys_spread_over_all_nodes():
+    counts = Counter(owners(HashRing(NODES)).values())
+    assert set(counts) == set(NODES)
+    for node in NODES:
+        assert 0.2 < counts[node] / len(KEYS) < 0.47
+
+
+def test_adding_a_node_only_moves_keys_to_it():
+    ring = HashRing(NODES)
+    before = owners(ring)
+    ring.add("http://127.0.0.1:8004")
+    after = owners(ring)
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == "http://127.0.0.1:8004" for key in moved)
+    assert 0.1 < len(moved) / len(KEYS) < 0.4
+
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(NODES)
+    before = owners(ring)
+    ring.remove(NODES[0])
+    after = owners(ring)
+    assert all(after[key] == before[key] for key in KEYS if before[key] != NODES[0])
+    assert NODES[0] not in after.values()
+
+
+def test_nodes_for_returns_distinct_fallbacks_in_order():
+    ring = HashRing(NODES)
+    key = shard_key("mailgw", "abc")
+    found = ring.nodes_for(key, 3)
+    assert found[0] == ring.node_for(key)
+    assert sorted(found) == sorted(NODES)
+    assert ring.nodes_for(key, 5) == found
+    assert HashRing().nodes_for(key) == [] and HashRing().node_for(key) is None
+
+
+def test_adding_the_same_node_twice_is_a_no_op():
+    ring = HashRing(NODES)
+    before = owners(ring)
+    ring.add(NODES[1])
+    assert owners(ring) == before and len(ring._points) == len(NODES) * ring.vnodes
+
+
+def test_node_snapshot_file_is_per_port():
+    assert node_snapshot_file("mail_snapshot.bin", 8001) == "mail_snapshot.8001.bin"
+    assert node_snapshot_file("/var/lib/mail/snap", 8002) == "/var/lib/mail/snap.8002"
+    assert node_snapshot_file("", 8001) == ""
+
+
+def test_membership_changes_need_the_admin_token():
+    router = Router(NODES, admin_token="secret")
+    request = make_mocked_request("POST", "/_router/nodes")
+    assert not router._is_admin(request)
+    assert not router._is_admin(make_mocked_request("POST", "/", headers={"Authorization": "Bearer nope"}))
+    assert router._is_admin(make_mocked_request("POST", "/", headers={"Authorization": "Bearer secret"}))
+
+
+def test_without_a_token_only_loopback_may_change_membership():
+    router = Router(NODES, admin_token="")
+    request = make_mocked_request("POST", "/_router/nodes")
+    assert router._is_admin(request.clone(remote="127.0.0.1"))
+    assert router._is_admin(request.clone(remote="::1"))
+    assert not router._is_admin(request.clone(remote="10.0.0.5"))
+
+    async def update():
+        response = await router.nodes_update(request.clone(remote="10.0.0.5"))
+        return response.status
+
+    assert asyncio.run(update()) == 403
+    assert router.members == NODES
+
+
+def test_only_get_and_head_fall_through_to_the_next_node():
+    hits = []
+
+    async def node(request):
+        hits.append(request.method)
+        return web.json_response({"ok": True})
+
+    async def main():
+        live = TestServer(web.Application())
+        live.app.router.add_route("*", "/{tail:.*}", node)
+        await live.start_server()
+        dead = TestServer(web.Application())
+        await dead.start_server()
+        dead_url = str(dead.make_url("")).rstrip("/")
+        await dead.close()  # connections to it are now refused
+
+        router = Router([dead_url, str(live.make_url("")).rstrip("/")], health_interval=3600)
+        router._session = aiohttp.ClientSession()
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", router.proxy)
+        try:
+            async with TestClient(TestServer(app)) as client:
+                statuses = []
+                for method in ("POST", "GET"):
+                    router._set_health(dead_url, True)
+                    router._any = itertools.count()  # the dead node comes first
+                    resp = await client.request(method, "/address")
+                    statuses.append(resp.status)
+                return statuses
+        finally:
+            await router._session.close()
+            await live.close()
+
+    assert asyncio.run(main()) == [502, 200]
+    assert hits == ["GET"]
+
+
+def test_owner_needs_service_and_token():
+    router = Router(NODES)
+
+    async def owner(query):
+        response = await router.owner(make_mocked_request("GET", f"/_router/owner?{query}"))
+        return response.status
+
+    assert [asyncio.run(owner(q)) for q in ("", "service=mailtm", "token=t")] == [400, 400, 400]
+    assert asyncio.run(owner("service=mailtm&token=t")) == 200
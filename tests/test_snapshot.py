@@ -0,0 +1,40 @@
+import os
+import pickle
+import zlib
+
+import pytest
+
+from MailService import snapshot
+
+
+def test_round_trip_keeps_bytes_tuples_and_keys():
+    data = {
+        "saved_at": 1.5,
+        "caches": {"body": {"maxsize": 512, "items": [
+            (("mailtm", "tok", "m1"), {"payload": b"{}", "encoded": {"gzip": b"\x1f\x8b\x00"}}),
+        ]}},
+        "extras": {
+            "expiry": [(("mailtm", "tok"), 1e9, {"service": "mailtm", "email": "a@b.c"})],
+            "odd": {1: "int key", ("a", 1): "tuple key", "$b": "looks like a tag"},
+        },
+    }
+    assert snapshot.loads(snapshot.dumps(data)) == data
+
+
+def test_pickled_snapshot_is_refused(tmp_path):
+    class Boom:
+        def __reduce__(self):
+            return os.system, ("echo pwned",)
+
+    path = tmp_path / "mail_snapshot.bin"
+    path.write_bytes(b"MAILSNAP1\n" + zlib.compress(pickle.dumps({"saved_at": 0, "x": Boom()})))
+    assert snapshot.restore(str(path)) == {}
+    # Even behind the current header, the payload is parsed as JSON only
+    path.write_bytes(snapshot.MAGIC + zlib.compress(pickle.dumps({"x": Boom()})))
+    with pytest.raises(ValueError):
+        snapshot.loads(path.read_bytes())
+
+
+def test_snapshots_are_opt_in():
+    if "MAIL_SNAPSHOT_FILE" not in os.environ:
+        assert not snapshot.enabled()
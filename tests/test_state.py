@@ -0,0 +1,79 @@
+import asyncio
+import pickle
+import threading
+
+import pytest
+
+from MailService import state
+from MailService.cache import LRUCache
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = state._Database(str(tmp_path / "state.sqlite3"))
+    yield database
+    database.close()
+
+
+def test_sqlite_cache_round_trip(db):
+    cache = state.SQLiteCache(db, "body", maxsize=10)
+    entry = {"payload": b"{}", "encoded": {"gzip": b"\x1f\x8b"}}
+    cache.put(("mailtm", "tok", "m1"), entry)
+    assert cache.get(("mailtm", "tok", "m1")) == entry
+    assert ("mailtm", "tok", "m1") in cache
+    assert cache.get(("mailtm", "tok", "missing")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.items() == [(("mailtm", "tok", "m1"), entry)]
+    assert cache.pop(("mailtm", "tok", "m1")) == entry
+    assert len(cache) == 0
+
+
+def test_sqlite_cache_never_unpickles(db, tmp_path):
+    class Boom:
+        def __reduce__(self):
+            return open, (str(tmp_path / "pwned"), "w")
+
+    db.conn.execute("INSERT INTO entries VALUES ('body', '\"k\"', ?, 0)", (pickle.dumps(Boom()),))
+    cache = state.SQLiteCache(db, "body")
+    assert cache.get("k", "miss") == "miss" and cache.items() == [] and cache.pop("k") is None
+    assert not (tmp_path / "pwned").exists()
+
+
+def test_sqlite_caches_share_a_database_by_name(db):
+    state.SQLiteCache(db, "a").put("k", 1)
+    assert state.SQLiteCache(db, "a").get("k") == 1
+    assert state.SQLiteCache(db, "b").get("k") is None
+
+
+def test_sqlite_cache_evicts_least_recently_used(db):
+    cache = state.SQLiteCache(db, "small", maxsize=2)
+    for i in range(4):
+        cache.put(i, i)
+        cache._trim()
+    assert sorted(k for k, _ in cache.items()) == [2, 3]
+
+
+@pytest.mark.parametrize("make", [lambda db: state.SQLiteCache(db, "body"), lambda db: LRUCache(10)])
+def test_pop_prefix_drops_only_matching_keys(db, make):
+    cache = make(db)
+    for key in [("mailtm", "tok", "1"), ("mailtm", "tok", "2"), ("mailtm", "tok2", "1"),
+                ("mailgw", "tok", "1"), "mailtm"]:
+        cache.put(key, "v")
+    assert cache.pop_prefix(("mailtm", "tok")) == 2
+    assert sorted(map(str, (k for k, _ in cache.items()))) == sorted(
+        map(str, [("mailtm", "tok2", "1"), ("mailgw", "tok", "1"), "mailtm"]))
+
+
+def test_offload_runs_database_calls_in_a_thread(db, monkeypatch):
+    cache = state.SQLiteCache(db, "body")
+    cache.put("k", "v")
+    monkeypatch.setattr(state, "BACKEND", "sqlite")
+
+    def lookup():
+        return cache.get("k"), threading.get_ident()
+
+    async def main():
+        value, thread = await state.offload(lookup)
+        return value, thread != threading.get_ident()
+
+    assert asyncio.run(main()) == ("v", True)
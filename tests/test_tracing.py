@@ -0,0 +1,29 @@
+from MailService import tracing
+
+
+def test_traceparent_round_trip():
+    header = tracing.format_traceparent("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True)
+    assert header == "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    assert tracing.parse_traceparent(header) == ("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True)
+
+
+def test_traceparent_rejects_invalid_headers():
+    for value in (None, "", "garbage",
+                  "ff-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01",
+                  "00-00000000000000000000000000000000-00f067aa0ba902b7-01",
+                  "00-4bf92f3577b34da6a3ce929d0e0e4736-0000000000000000-01",
+                  "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01-extra"):
+        assert tracing.parse_traceparent(value) is None
+
+
+def test_unsampled_traceparent_keeps_decision():
+    parsed = tracing.parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00")
+    assert parsed[2] is False
+
+
+def test_otlp_round_trip_keeps_parent_and_kind():
+    span = {"trace_id": "a" * 32, "span_id": "b" * 16, "parent_id": "c" * 16, "kind": "server",
+            "name": "GET /messages", "start_ns": 1, "end_ns": 2, "status": 200}
+    otlp = tracing.to_otlp([span])["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert otlp["parentSpanId"] == "c" * 16 and otlp["kind"] == 2
+    assert tracing.from_otlp(tracing.to_otlp([span])) == [span]